@@ -0,0 +1,452 @@
+"""
+Synthetic plates and benchmarks for TECANWellAnalyzer.
+
+The generator writes TECAN exports in the format read by Analyzer.load_OD600(),
+for any of the plate sizes in PLATE_FORMATS and any number of cycles, with
+logistic growth curves, drop artifacts at the start and measurement noise.
+
+The benchmark times each stage of the analysis (load_OD600, findBase,
+findDoublingTimes and saveToFile) separately on synthetic plates and reports
+the throughput and the peak memory of each. Each plate is analyzed in a fresh
+process so the memory numbers of one plate do not carry over to the next, and
+the peak memory is started over before each stage where the system allows it.
+
+The accuracy check compares the regressions of RegressionSums with
+scipy.stats.linregress on windows spread along a plate, long synthetic ones
+included, where rounding in running sums would show up first.
+
+	python TECANBenchmark.py generate plate.txt --wells 384 --cycles 5000
+	python TECANBenchmark.py run --wells 96 384 1536 --cycles 1000 10000 --save bench.json
+	python TECANBenchmark.py run --compare bench.json
+	python TECANBenchmark.py imports --max-seconds 0.2
+	python TECANBenchmark.py accuracy --wells 96 --cycles 20000
+	python TECANBenchmark.py accuracy --export EXAMPLE/OD600_Values.txt --labels EXAMPLE/well-labels_7-14-11.txt
+
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy
+
+import TECANWellAnalyzer
+from TECANWellAnalyzer import PLATE_FORMATS
+
+
+#The stages that are timed, in the order they are run
+BENCHMARK_STAGES = ["load_OD600", "findBase", "findDoublingTimes", "saveToFile"]
+
+#Modules that importing TECANWellAnalyzer should not import, because they are slow to import
+LAZY_MODULES = ["matplotlib", "scipy"]
+
+#Run in a fresh interpreter to time the import of TECANWellAnalyzer
+IMPORT_TIMER = """
+import json, sys, time
+startTime = time.time()
+import TECANWellAnalyzer
+seconds = time.time() - startTime
+print json.dumps({"seconds": seconds, "modules": sorted(name for name in sys.modules if name.split(".")[0] in %r)})
+""" % (LAZY_MODULES,)
+
+
+#Returns the labels of all of the wells of a plate with numWells wells, in A1 to H12 order
+def wellLabels(numWells):
+	numRows, numColumns = PLATE_FORMATS[numWells]
+
+	rowNames = []
+	for row in range(numRows):
+		if row < 26:
+			rowNames.append(chr(ord('A') + row))
+		else:
+			rowNames.append("A" + chr(ord('A') + row - 26))
+
+	return [rowName + str(column + 1) for rowName in rowNames for column in range(numColumns)]
+
+
+#Writes a synthetic export to odFileName and the matching well label file to labelFileName.
+#
+#Every well follows a logistic curve on top of a base OD, with a random growth rate, lag and
+#carrying capacity. A fraction dropFraction of the wells start with a drop artifact: the OD
+#climbs for a few cycles and then falls back to the curve. Gaussian noise with a standard
+#deviation of noise is added to every measurement. Measurements are taken every interval seconds.
+#
+#The wells are labelled with one of numStrains strains and one of four dilutions. Returns the
+#true starting timepoint of every well (the cycle after the drop, or 0), which is also written
+#to startFileName in the format read by Analyzer.loadStartTimepoints() if it is given
+def writeSyntheticExport(odFileName, labelFileName, numWells = 96, numCycles = 400, interval = 300.0,
+		dropFraction = 0.5, noise = 0.001, numStrains = 4, startFileName = None, seed = 0):
+
+	random = numpy.random.RandomState(seed)
+	labels = wellLabels(numWells)
+	timesSecs = numpy.arange(numCycles) * interval
+	timesHrs = timesSecs / 3600
+
+	#The growth curves
+	bases = random.uniform(0.085, 0.1, numWells)
+	capacities = random.uniform(0.3, 1.0, numWells)
+	rates = random.uniform(0.3, 1.2, numWells)
+	midpoints = random.uniform(0.2, 0.6, numWells) * max(numCycles * interval / 3600, 1.0)
+	measurements = bases[:, numpy.newaxis] + capacities[:, numpy.newaxis] / (1 + numpy.exp(-rates[:, numpy.newaxis] * (timesHrs - midpoints[:, numpy.newaxis])))
+
+	#The drop artifacts, a climb of 0.1 to 0.25 OD over the first few cycles that ends with a sudden drop
+	starts = numpy.zeros(numWells, dtype = int)
+	hasDrop = random.uniform(size = numWells) < dropFraction
+	starts[hasDrop] = random.randint(3, 26, hasDrop.sum())
+	starts = numpy.minimum(starts, max(numCycles - 1, 0))
+	peaks = random.uniform(0.1, 0.25, numWells)
+
+	cycles = numpy.arange(numCycles)
+	inArtifact = cycles < starts[:, numpy.newaxis]
+	climb = peaks[:, numpy.newaxis] * (cycles + 1) / numpy.maximum(starts, 1)[:, numpy.newaxis]
+	measurements = measurements + numpy.where(inArtifact, climb, 0.0)
+
+	measurements += random.normal(0, noise, measurements.shape)
+	temperatures = 37 + random.normal(0, 0.1, numCycles)
+
+	#Write the export
+	f = open(odFileName, "w")
+	f.write("OD600" + "\t" * numCycles + "\n")
+	f.write("Cycle Nr.\t" + "\t".join([str(n + 1) for n in range(numCycles)]) + "\n")
+	f.write("Time [s]\t" + "\t".join(["%.1f" % t for t in timesSecs]) + "\n")
+	f.write("Temp. [C]\t" + "\t".join(["%.1f" % t for t in temperatures]) + "\n")
+
+	rowFormat = "\t".join(["%.9f"] * numCycles)
+	for label, row in zip(labels, measurements):
+		f.write(label + "\t" + rowFormat % tuple(row.tolist()) + "\n")
+	f.close()
+
+	#Write the labels
+	dilutions = ["0.002", "0.0005", "0.0001", "0"]
+	f = open(labelFileName, "w")
+	for n, label in enumerate(labels):
+		f.write(label + "\tstrain" + str(n % numStrains) + "\t" + dilutions[(n // numStrains) % len(dilutions)] + "\n")
+	f.close()
+
+	if startFileName is not None:
+		f = open(startFileName, "w")
+		f.write("".join([label + "\t" + str(start) + "\n" for label, start in zip(labels, starts.tolist())]))
+		f.close()
+
+	return starts
+
+
+#Sets the peak resident memory of this process back to what it uses now, so that peakMemory()
+#gives the peak of what runs after. Returns False where the system does not allow it (anywhere
+#but Linux), and peakMemory() then keeps giving the peak of the whole process
+def resetPeakMemory():
+	try:
+		f = open("/proc/self/clear_refs", "w")
+		try:
+			f.write("5")
+		finally:
+			f.close()
+		return True
+	except (IOError, OSError):
+		return False
+
+
+#Returns the peak resident memory of this process since resetPeakMemory() (or since it started),
+#in megabytes
+def peakMemory():
+	try:
+		f = open("/proc/self/status")
+		try:
+			for line in f:
+				if line.startswith("VmHWM:"):
+					return int(line.split()[1]) / 1e3
+		finally:
+			f.close()
+	except (IOError, OSError):
+		pass
+
+	peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	if sys.platform == "darwin":
+		return peak / 1e6
+	return peak / 1e3
+
+
+#Times each stage of the analysis of the plate in odFileName, and finds the peak memory of each
+#while it runs. Returns a dictionary with (seconds, peak megabytes) for each of BENCHMARK_STAGES
+def benchmarkStages(odFileName, labelFileName, startFileName, outputFileName, windowSize):
+
+	#The analysis prints a line per well, which is not what is being measured
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, "w")
+	try:
+		stageTimes = {}
+
+		resetPeakMemory()
+		startTime = time.time()
+		a = TECANWellAnalyzer.Analyzer(odFileName, labelFileName)
+		stageTimes["load_OD600"] = (time.time() - startTime, peakMemory())
+
+		a.loadStartTimepoints(startFileName)
+
+		resetPeakMemory()
+		startTime = time.time()
+		a.findBase()
+		stageTimes["findBase"] = (time.time() - startTime, peakMemory())
+
+		resetPeakMemory()
+		startTime = time.time()
+		a.findDoublingTimes(windowSize)
+		stageTimes["findDoublingTimes"] = (time.time() - startTime, peakMemory())
+
+		resetPeakMemory()
+		startTime = time.time()
+		a.saveToFile(outputFileName, windowSize)
+		stageTimes["saveToFile"] = (time.time() - startTime, peakMemory())
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+	return stageTimes
+
+
+#Times each stage of the analysis of one synthetic plate. Returns a dictionary with the plate
+#size, and for each stage its time in seconds, its throughput and the peak memory while it ran
+#(in megabytes). The plate is written by this process and analyzed in a fresh one, so that the
+#memory of neither writing it nor of earlier plates is counted
+def benchmarkPlate(numWells, numCycles, windowSize = 40, directory = None):
+	workDirectory = tempfile.mkdtemp(dir = directory)
+	odFileName = os.path.join(workDirectory, "plate.txt")
+	labelFileName = os.path.join(workDirectory, "labels.txt")
+	startFileName = os.path.join(workDirectory, "starts.txt")
+	outputFileName = os.path.join(workDirectory, "doubling.txt")
+
+	try:
+		writeSyntheticExport(odFileName, labelFileName, numWells, numCycles, startFileName = startFileName)
+		numWindows = max(numCycles - windowSize, 0)
+		result = {"wells": numWells, "cycles": numCycles, "windowSize": windowSize, "fileMB": os.path.getsize(odFileName) / 1e6}
+
+		pool = multiprocessing.Pool(1)
+		try:
+			stageTimes = pool.apply(benchmarkStages, (odFileName, labelFileName, startFileName, outputFileName, windowSize))
+		finally:
+			pool.close()
+			pool.join()
+
+		#What each stage gets through: measurements, wells or windows
+		amounts = {"load_OD600": (numWells * numCycles, "measurements"), "findBase": (numWells, "wells"),
+			"findDoublingTimes": (numWells * numWindows, "windows"), "saveToFile": (numWells * numWindows, "windows")}
+
+		for stage in BENCHMARK_STAGES:
+			seconds, memory = stageTimes[stage]
+			amount, unit = amounts[stage]
+			result[stage] = {"seconds": seconds, "perSecond": amount / max(seconds, 1e-9), "unit": unit, "peakMB": memory}
+		return result
+
+	finally:
+		shutil.rmtree(workDirectory, ignore_errors = True)
+
+
+#Times the import of TECANWellAnalyzer in numRuns fresh interpreters. Returns the fastest time in
+#seconds and the list of LAZY_MODULES that the import pulled in
+def timeImport(numRuns = 5):
+	directory = os.path.dirname(os.path.abspath(TECANWellAnalyzer.__file__))
+	times = []
+	modules = []
+	for n in range(numRuns):
+		output = subprocess.check_output([sys.executable, "-c", IMPORT_TIMER], cwd = directory)
+		result = json.loads(output.strip().splitlines()[-1])
+		times.append(result["seconds"])
+		modules = result["modules"]
+	return min(times), modules
+
+
+#Compares the slope, standard error and R squared of windowSize timepoints read off the RegressionSums
+#of the plate in odFileName with scipy.stats.linregress, on numChecks randomly chosen windows and the
+#last window of every well. Returns a dictionary with the number of windows checked and, for each, the
+#largest difference: of the slopes relative to their size plus their standard error, of the standard
+#errors relative to their size, and of R squared. streamed is the largest difference of the slopes when
+#the timepoints are added to the sums a few at a time instead, as StreamingAnalyzer does, which should be 0
+def checkAccuracy(odFileName, labelFileName, windowSize = 40, numChecks = 2000, seed = 0):
+	from scipy import stats
+
+	stdout = sys.stdout
+	sys.stdout = open(os.devnull, "w")
+	try:
+		a = TECANWellAnalyzer.Analyzer(odFileName, labelFileName)
+		a.findBase()
+		logMeasurements = a.getLogMeasurements()
+		slopes, intercepts, rs, stderrs = a.getRegressionSums().regress(windowSize)
+	finally:
+		sys.stdout.close()
+		sys.stdout = stdout
+
+	numWells, numWindows = slopes.shape
+	result = {"wells": numWells, "cycles": len(a.timesHrs), "windowSize": windowSize, "windows": 0, "slope": 0.0, "stderr": 0.0, "rSquared": 0.0,
+		"streamed": 0.0}
+
+	#Steps that do not line up with the blocks of the sums
+	step = windowSize + 7
+	streamedSums = TECANWellAnalyzer.RegressionSums(a.timesHrs[:step], logMeasurements[:, :step])
+	for firstNew in range(step, len(a.timesHrs), step):
+		streamedSums.extend(a.timesHrs[firstNew:(firstNew + step)], logMeasurements[:, firstNew:(firstNew + step)])
+	streamedSlopes = streamedSums.regress(windowSize)[0]
+	if numpy.any(numpy.isnan(streamedSlopes) != numpy.isnan(slopes)):
+		result["streamed"] = numpy.inf
+	elif slopes.size > 0:
+		result["streamed"] = numpy.nanmax(numpy.abs(streamedSlopes - slopes))
+
+	if numWindows == 0:
+		return result
+
+	random = numpy.random.RandomState(seed)
+	wells = numpy.concatenate((random.randint(0, numWells, numChecks), numpy.arange(numWells)))
+	windows = numpy.concatenate((random.randint(0, numWindows, numChecks), numpy.zeros(numWells, dtype = int) + numWindows - 1))
+
+	for well, window in zip(wells.tolist(), windows.tolist()):
+		y = logMeasurements[well, window:(window + windowSize)]
+		if not numpy.all(numpy.isfinite(y)):
+			continue
+
+		slope, intercept, r, p, stderr = stats.linregress(a.timesHrs[window:(window + windowSize)], y)
+		result["windows"] += 1
+		result["slope"] = max(result["slope"], abs(slopes[well, window] - slope) / max(abs(slope) + stderr, 1e-300))
+		result["stderr"] = max(result["stderr"], abs(stderrs[well, window] - stderr) / max(stderr, 1e-300))
+		result["rSquared"] = max(result["rSquared"], abs(rs[well, window] ** 2 - r ** 2))
+	return result
+
+
+#Prints the results of benchmarkPlate() as a table
+def printResults(results):
+	print "%6s %7s  %-18s %9s %14s %-12s %9s" % ("wells", "cycles", "stage", "seconds", "per second", "", "peak MB")
+	for result in results:
+		for stage in BENCHMARK_STAGES:
+			currStage = result[stage]
+			print "%6d %7d  %-18s %9.3f %14.0f %-12s %9.1f" % (result["wells"], result["cycles"], stage,
+				currStage["seconds"], currStage["perSecond"], currStage["unit"], currStage["peakMB"])
+
+
+#Compares results with earlier results (i.e. loaded from a file saved with --save). Returns a list
+#of messages for each stage of each plate size that is more than tolerance (a fraction) slower
+def findRegressions(results, previousResults, tolerance):
+	previous = dict(((result["wells"], result["cycles"], result["windowSize"]), result) for result in previousResults)
+
+	regressions = []
+	for result in results:
+		previousResult = previous.get((result["wells"], result["cycles"], result["windowSize"]))
+		if previousResult is None:
+			continue
+
+		for stage in BENCHMARK_STAGES:
+			before = previousResult[stage]["seconds"]
+			after = result[stage]["seconds"]
+			if after > before * (1 + tolerance) and after - before > 0.01:
+				regressions.append("%s on %d wells x %d cycles: %.3f s, was %.3f s" % (stage, result["wells"], result["cycles"], after, before))
+	return regressions
+
+
+#The command line entry point. Run with -h for the options
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Synthetic TECAN plates and benchmarks of the analysis")
+	commands = parser.add_subparsers(dest = "command")
+
+	generate = commands.add_parser("generate", help = "write a synthetic export, label file and start file")
+	generate.add_argument("export", help = "file name of the export, the label and start files are written next to it")
+	generate.add_argument("--wells", type = int, default = 96, choices = sorted(PLATE_FORMATS))
+	generate.add_argument("--cycles", type = int, default = 400)
+	generate.add_argument("--interval", type = float, default = 300.0, help = "seconds between cycles (default: %(default)s)")
+	generate.add_argument("--drop-fraction", type = float, default = 0.5, help = "fraction of wells with a drop artifact (default: %(default)s)")
+	generate.add_argument("--noise", type = float, default = 0.001, help = "standard deviation of the noise in OD (default: %(default)s)")
+	generate.add_argument("--seed", type = int, default = 0)
+
+	run = commands.add_parser("run", help = "time each stage of the analysis on synthetic plates")
+	run.add_argument("--wells", type = int, nargs = "+", default = [96, 384, 1536], choices = sorted(PLATE_FORMATS))
+	run.add_argument("--cycles", type = int, nargs = "+", default = [1000, 10000])
+	run.add_argument("--window", type = int, default = 40)
+	run.add_argument("--directory", help = "directory for the temporary files (default: the system's)")
+	run.add_argument("--save", help = "save the results as JSON")
+	run.add_argument("--compare", help = "compare with results saved with --save, and fail if any stage got slower")
+	run.add_argument("--tolerance", type = float, default = 0.25, help = "how much slower a stage may get with --compare (default: %(default)s)")
+
+	imports = commands.add_parser("imports", help = "time the import of TECANWellAnalyzer in a fresh interpreter")
+	imports.add_argument("--runs", type = int, default = 5, help = "number of times to import it, the fastest is reported (default: %(default)s)")
+	imports.add_argument("--max-seconds", type = float, help = "fail if the import takes longer than this")
+
+	accuracy = commands.add_parser("accuracy", help = "compare the regressions of the analysis with scipy.stats.linregress")
+	accuracy.add_argument("--export", help = "check this export instead of a synthetic plate")
+	accuracy.add_argument("--labels", help = "the well label file of --export")
+	accuracy.add_argument("--wells", type = int, default = 96, choices = sorted(PLATE_FORMATS))
+	accuracy.add_argument("--cycles", type = int, default = 20000)
+	accuracy.add_argument("--window", type = int, default = 40)
+	accuracy.add_argument("--checks", type = int, default = 2000, help = "number of randomly chosen windows to check (default: %(default)s)")
+	accuracy.add_argument("--tolerance", type = float, default = 1e-6, help = "largest difference allowed (default: %(default)s)")
+
+	args = parser.parse_args(argv)
+
+	if args.command == "generate":
+		stem = os.path.splitext(args.export)[0]
+		writeSyntheticExport(args.export, stem + TECANWellAnalyzer.LABEL_FILE_SUFFIX, args.wells, args.cycles, args.interval,
+			args.drop_fraction, args.noise, startFileName = stem + TECANWellAnalyzer.START_FILE_SUFFIX, seed = args.seed)
+		return 0
+
+	if args.command == "imports":
+		seconds, modules = timeImport(args.runs)
+		print "Importing TECANWellAnalyzer takes %.3f s" % seconds
+		if modules:
+			print "It should not import:", ", ".join(modules)
+			return 1
+		if args.max_seconds is not None and seconds > args.max_seconds:
+			print "Slower than", args.max_seconds, "s"
+			return 1
+		return 0
+
+	if args.command == "accuracy":
+		if args.export is not None:
+			if args.labels is None:
+				parser.error("--export needs --labels")
+			result = checkAccuracy(args.export, args.labels, args.window, args.checks)
+		else:
+			workDirectory = tempfile.mkdtemp()
+			try:
+				odFileName = os.path.join(workDirectory, "plate.txt")
+				labelFileName = os.path.join(workDirectory, "labels.txt")
+				writeSyntheticExport(odFileName, labelFileName, args.wells, args.cycles)
+				result = checkAccuracy(odFileName, labelFileName, args.window, args.checks)
+			finally:
+				shutil.rmtree(workDirectory, ignore_errors = True)
+
+		print "%d windows of %d timepoints checked on %d wells x %d cycles" % (result["windows"], result["windowSize"], result["wells"], result["cycles"])
+		print "Largest difference from linregress: slope %.3g, standard error %.3g, R squared %.3g" % (result["slope"], result["stderr"], result["rSquared"])
+		print "Largest difference of the slopes when streamed: %.3g" % result["streamed"]
+		if max(result["slope"], result["stderr"], result["rSquared"], result["streamed"]) > args.tolerance:
+			print "More than", args.tolerance
+			return 1
+		return 0
+
+	results = []
+	for numWells in args.wells:
+		for numCycles in args.cycles:
+			results.append(benchmarkPlate(numWells, numCycles, args.window, args.directory))
+	printResults(results)
+
+	if args.save is not None:
+		f = open(args.save, "w")
+		json.dump(results, f, indent = 1, sort_keys = True)
+		f.close()
+
+	if args.compare is not None:
+		f = open(args.compare)
+		regressions = findRegressions(results, json.load(f), args.tolerance)
+		f.close()
+
+		for regression in regressions:
+			print "Slower:", regression
+		if regressions:
+			return 1
+
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
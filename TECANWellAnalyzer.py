@@ -10,43 +10,829 @@ runs through the process of analyzing the curves.
 
 """
 
+import argparse
+import collections
+import cProfile
+import functools
+import glob
+import hashlib
+import json
+import multiprocessing
 import os
+import pstats
+import Queue
+import re
+import signal
+import sqlite3
 import sys
-import matplotlib
-import matplotlib.pyplot as mplot
+import threading
+import time
+import traceback
+import warnings
+import zipfile
 import numpy
-import scipy
-from scipy import stats
 
 
-class Well:
+#In headless mode pyplot is never imported, and anything that would plot raises RuntimeError
+#instead. It is on if the environment variable TECAN_HEADLESS is set, see also setHeadless()
+HEADLESS = bool(os.environ.get("TECAN_HEADLESS"))
+
+
+#Turns headless mode on or off
+def setHeadless(headless = True):
+	global HEADLESS
+	HEADLESS = headless
+
+
+#Returns matplotlib.pyplot, which is only imported the first time something is plotted
+#(it takes longer to import than the rest of the analysis needs for a small plate)
+def getPyplot():
+	if HEADLESS:
+		raise RuntimeError("Can not plot in headless mode")
+	import matplotlib.pyplot
+	return matplotlib.pyplot
+
+
+#The plate formats that can be read: number of wells -> (number of rows, number of columns)
+PLATE_FORMATS = {6: (2, 3), 24: (4, 6), 96: (8, 12), 384: (16, 24), 1536: (32, 48)}
+
+#A well label is one or two row letters (A to Z, then AA to AF on 1536 well plates)
+#followed by the column number, i.e. 'A1', 'P24' or 'AF48'
+WELL_LABEL_PATTERN = re.compile(r"^([A-Z]{1,2})([0-9]{1,2})$")
+
+
+#Return the (row, column) of a well label, both counted from 0. 'A1' is (0, 0), 'H12' is (7, 11)
+#and 'AF48' is (31, 47). Raises ValueError for anything that is not a well label
+def parseWellLabel(label):
+	match = WELL_LABEL_PATTERN.match(label)
+	if match is None:
+		raise ValueError("'%s' is not a well label" % label)
+
+	rowLetters, column = match.groups()
+	row = 0
+	for letter in rowLetters:
+		row = row * 26 + (ord(letter) - ord('A') + 1)
+
+	return row - 1, int(column) - 1
+
+
+#Convert the tab delimited numbers following the label of a row into a float array.
+#The whole string is converted by numpy in one go
+def _parseNumbers(text, what):
+	text = text.strip()
+	if not text:
+		return numpy.zeros(0)
+
+	numbers = numpy.fromstring(text, sep = "\t")
+	if len(numbers) != text.count("\t") + 1:
+		raise ValueError("Could not read all of the numbers in the %s row" % what)
+	return numbers
+
+
+#Return the number of tab delimited fields in text
+def _countFields(text):
+	if not text:
+		return 0
+	return text.count("\t") + 1
+
+
+#Return text without its first numFields tab delimited fields
+def _skipFields(text, numFields):
+	if numFields == 0:
+		return text
+
+	fields = text.split("\t", numFields)
+	if len(fields) <= numFields:
+		return ""
+	return fields[numFields]
+
+
+#Return only the first numFields tab delimited fields of text
+def _keepFields(text, numFields):
+	return "\t".join(text.split("\t", numFields)[:numFields])
+
+
+#Raise ValueError unless every row of measurements (wells x tab delimited text) read from the export
+#fileName has numTimepoints fields. lineNumbers are the line numbers of the rows in the file, from 1
+def _checkRowLengths(fileName, wellLabels, rows, lineNumbers, numTimepoints):
+	for label, row, lineNumber in zip(wellLabels, rows, lineNumbers):
+		if _countFields(row) != numTimepoints:
+			raise ValueError("Line %d of %s has %d measurements for well %s, expected %d" % (lineNumber, fileName, _countFields(row), label,
+				numTimepoints))
+
+
+#Raise ValueError unless the well labels read from the export fileName make up a whole plate
+def _checkWellLabels(fileName, wellLabels):
+	if len(wellLabels) not in PLATE_FORMATS:
+		raise ValueError("%s has %d wells, expected one of %s" % (fileName, len(wellLabels), sorted(PLATE_FORMATS)))
+
+	numRows, numColumns = PLATE_FORMATS[len(wellLabels)]
+	for label in wellLabels:
+		row, column = parseWellLabel(label)
+		if row >= numRows or column >= numColumns:
+			raise ValueError("Well %s is not on a %d well plate" % (label, len(wellLabels)))
+
+	if len(set(wellLabels)) != len(wellLabels):
+		raise ValueError("%s has more than one row for the same well" % fileName)
+
+
+#Read the OD600 section of a TECAN export (see load_OD600 for the format). The whole file
+#is read at once and all of the measurements are converted to floats in a single call.
+#
+#Only the timepoints from firstTimepoint on are returned, the others are not converted at all.
+#With partial = True the file may still be being written, so the rows can have different
+#lengths. Only the timepoints that every row already has are returned.
+#
+#Returns the well labels (a list, in file order), the measurements (a wells x timepoints
+#float array), the timepoints in seconds and the temperatures (float arrays, the temperatures
+#are None if the file has no Temp row)
+def readODExport(fileName, firstTimepoint = 0, partial = False):
+	f = open(fileName)
+	lines = f.read().splitlines()
+	f.close()
+
+	timeRow = None
+	temperatureRow = None
+	wellLabels = []
+	wellRows = []
+	wellLineNumbers = []
+
+	for lineNumber, line in enumerate(lines, 1):
+		name, sep, rest = line.partition("\t")
+		name = name.strip()
+
+		if name.startswith("Time"):
+			timeRow = rest.strip()
+		elif name.startswith("Temp"):
+			temperatureRow = rest.strip()
+		elif WELL_LABEL_PATTERN.match(name):
+			wellLabels.append(name)
+			wellRows.append(rest.strip())
+			wellLineNumbers.append(lineNumber)
+
+	if timeRow is None:
+		raise ValueError("%s has no 'Time [s]' row" % fileName)
+	_checkWellLabels(fileName, wellLabels)
+
+	#Skip the timepoints that are not wanted, and cut every row down to the shortest one if the
+	#file is still being written
+	rows = [timeRow] + wellRows
+	if temperatureRow is not None:
+		rows.append(temperatureRow)
+	rows = [_skipFields(row, firstTimepoint) for row in rows]
+
+	if partial:
+		numTimepoints = min([_countFields(row) for row in rows])
+		rows = [_keepFields(row, numTimepoints) if _countFields(row) > numTimepoints else row for row in rows]
+
+	timesSecs = _parseNumbers(rows[0], "Time")
+	temperatures = None
+	if temperatureRow is not None:
+		temperatures = _parseNumbers(rows[-1], "Temp")
+
+	#Convert every measurement of every well at once, once every row is known to have one per timepoint
+	#(otherwise a short row would shift the measurements of the wells after it)
+	_checkRowLengths(fileName, wellLabels, rows[1:(1 + len(wellLabels))], wellLineNumbers, len(timesSecs))
+	measurements = numpy.zeros(0)
+	if len(timesSecs) > 0:
+		measurements = _parseNumbers("\t".join(rows[1:(1 + len(wellLabels))]), "well")
+
+	return wellLabels, measurements.reshape(len(wellLabels), len(timesSecs)), timesSecs, temperatures
+
+
+#Read the well label annotations (see load_OD600 for the format) into a dictionary with the
+#well label as the key and (strain name, dilution) as the entry. The wells can be in any order
+def readWellLabels(fileName):
+	wellAnnotations = {}
+
+	f = open(fileName)
+	for line in f:
+		tokens = [token.strip() for token in line.split("\t")]
+		if len(tokens) < 3 or not tokens[0]:
+			continue
+		wellAnnotations[tokens[0]] = (tokens[1], tokens[2])
+	f.close()
+
+	return wellAnnotations
+
+
+#Returns the strain names and dilutions (two lists) of the wells with the labels wellLabels, read from
+#the well label file fileName. Raises ValueError if any of the wells is not in the file
+def lookUpWellLabels(wellLabels, fileName):
+	wellAnnotations = readWellLabels(fileName)
+
+	missingWells = [label for label in wellLabels if label not in wellAnnotations]
+	if missingWells:
+		raise ValueError("No strain name and dilution in " + fileName + " for wells " + ", ".join(missingWells))
+
+	return [wellAnnotations[label][0] for label in wellLabels], [wellAnnotations[label][1] for label in wellLabels]
+
+
+#Returns True if every field after the first of a row (split on tabs) is a number, and there is at least one
+def _isNumberRow(fields):
+	values = [field for field in fields[1:] if field]
+	try:
+		[float(value) for value in values]
+	except ValueError:
+		return False
+	return len(values) > 0
+
+
+#Read every block of measurements in a whole TECAN export, i.e. OD600 followed by GFP or other
+#wavelengths, each in the format described in load_OD600. A block starts at its 'Cycle Nr.' row
+#(or at a second 'Time' row if there is none) and is named by the last line before it that has
+#only a name in it (i.e. 'OD600', or 'Label: GFP'). Only rows of numbers count as 'Cycle', 'Time'
+#and 'Temp' rows, so the 'Date:' and 'Time:' lines of the export header are passed over, as is
+#anything else in the export.
+#The file is read once, and all of the measurements of a block are converted in one call.
+#
+#Returns a list of (name, well labels, measurements, timepoints in seconds, temperatures) for the
+#blocks in file order, as readODExport() returns them for one block
+def readExportBlocks(fileName):
+	f = open(fileName)
+	lines = f.read().splitlines()
+	f.close()
+
+	blocks = []
+	lastName = None
+	currBlock = None
+
+	for lineNumber, line in enumerate(lines, 1):
+		name, sep, rest = line.partition("\t")
+		name = name.strip()
+		rest = rest.strip()
+
+		#Only the rows that could be a 'Cycle', 'Time' or 'Temp' row are split here, the rows of the wells
+		#are left to be converted all at once below
+		numberRow = name.startswith(("Cycle", "Time", "Temp")) and _isNumberRow([name] + [field.strip() for field in rest.split("\t")])
+
+		startsBlock = numberRow and (name.startswith("Cycle") or (name.startswith("Time") and (currBlock is None or currBlock["Time"] is not None)))
+		if startsBlock:
+			blockName = lastName or "Block %d" % (len(blocks) + 1)
+			currBlock = {"name": blockName, "Time": None, "Temp": None, "labels": [], "rows": [], "lineNumbers": []}
+			blocks.append(currBlock)
+			lastName = None
+
+		if name.startswith("Time") and numberRow:
+			currBlock["Time"] = rest
+		elif name.startswith("Temp") and numberRow and currBlock is not None:
+			currBlock["Temp"] = rest
+		elif WELL_LABEL_PATTERN.match(name) and currBlock is not None:
+			currBlock["labels"].append(name)
+			currBlock["rows"].append(rest)
+			currBlock["lineNumbers"].append(lineNumber)
+		elif name and not startsBlock and not rest:
+			lastName = name.split(":", 1)[1].strip() if name.startswith("Label:") else name
+
+	results = []
+	for block in blocks:
+		if block["Time"] is None:
+			raise ValueError("Block %s of %s has no 'Time [s]' row" % (block["name"], fileName))
+		_checkWellLabels(fileName, block["labels"])
+
+		timesSecs = _parseNumbers(block["Time"], "Time")
+		temperatures = None
+		if block["Temp"] is not None:
+			temperatures = _parseNumbers(block["Temp"], "Temp")
+
+		_checkRowLengths(fileName, block["labels"], block["rows"], block["lineNumbers"], len(timesSecs))
+		measurements = numpy.zeros(0)
+		if len(timesSecs) > 0:
+			measurements = _parseNumbers("\t".join(block["rows"]), "well")
+
+		results.append((block["name"], block["labels"], measurements.reshape(len(block["labels"]), len(timesSecs)), timesSecs, temperatures))
+	return results
+
+
+#Read every block of a whole TECAN export (see readExportBlocks()) into a Plate, with the strain
+#names and dilutions from the well label file labelFileName. Returns an OrderedDict of the block
+#name and its Plate, in file order (a block name that comes up again gets ' 2', ' 3' ... added).
+#
+#The plates share one time axis, that of the first block, and have their wells in the order of the
+#first block, so the measurements of one block can be divided by those of another. The blocks of one
+#cycle are measured a few seconds apart, which is ignored. If the run stopped part of the way through a
+#cycle, the later blocks can have one timepoint fewer, and every block is cut to the shortest one
+def readPlateBlocks(fileName, labelFileName):
+	blocks = readExportBlocks(fileName)
+	if not blocks:
+		raise ValueError("%s has no blocks of measurements" % fileName)
+
+	firstName, wellLabels, firstMeasurements, timesSecs, firstTemperatures = blocks[0]
+	strainNames, dilutions = lookUpWellLabels(wellLabels, labelFileName)
+	numTimepoints = min([len(block[3]) for block in blocks])
+
+	plates = collections.OrderedDict()
+	for name, labels, measurements, currTimesSecs, temperatures in blocks:
+		if sorted(labels) != sorted(wellLabels):
+			raise ValueError("Block %s of %s does not have the same wells as block %s" % (name, fileName, firstName))
+		rows = dict((label, n) for n, label in enumerate(labels))
+		order = [rows[label] for label in wellLabels]
+
+		if temperatures is not None:
+			temperatures = temperatures[:numTimepoints]
+
+		uniqueName = name
+		n = 2
+		while uniqueName in plates:
+			uniqueName = "%s %d" % (name, n)
+			n += 1
+		plates[uniqueName] = Plate(wellLabels, measurements[order, :numTimepoints], timesSecs[:numTimepoints], strainNames, dilutions, temperatures)
+
+	return plates
+
+
+#Returns the Plate of the block blockName of a whole TECAN export (see readPlateBlocks()). Raises
+#ValueError if there is no such block
+def readPlateBlock(fileName, labelFileName, blockName):
+	plates = readPlateBlocks(fileName, labelFileName)
+	if blockName not in plates:
+		raise ValueError("%s has no block %s, only %s" % (fileName, blockName, ", ".join(plates.keys())))
+	return plates[blockName]
+
+
+#Returns the dilution as a number if it is one, so that equal dilutions written differently
+#('0.002', '0.0020', 0.002) are the same dictionary key. Anything else is returned as it is
+def dilutionKey(dilution):
+	try:
+		return float(dilution)
+	except (TypeError, ValueError):
+		return dilution
+
+
+#The smallest fall in OD right after the peak that findDropStarts() takes as the drop artifact
+DROP_MIN_MAGNITUDE = 0.02
+
+
+#Finds the first timepoint after the drop artifact for every row of measurements (a wells x
+#timepoints array) at once. This is the same guess that Analyzer.createStartTimepoints() offers:
+#look for the maximum OD between startTimepoint and endTimepoint. If the maximum is in the
+#middle of that range and the next measurement is at least minDrop lower, the maximum is the
+#peak of the artifact and the timepoint after it is returned. Otherwise the well has no
+#artifact and 0 is returned.
+def findDropStarts(measurements, startTimepoint = 0, endTimepoint = 100, minDrop = DROP_MIN_MAGNITUDE):
+	measurements = numpy.atleast_2d(measurements)
+	window = measurements[:, startTimepoint:endTimepoint]
+	starts = numpy.zeros(len(measurements), dtype = int)
+	if window.shape[1] < 2:
+		return starts
+
+	rows = numpy.arange(len(window))
+	peaks = numpy.argmax(window, axis = 1)
+	afterPeaks = numpy.minimum(peaks + 1, window.shape[1] - 1)
+	drops = window[rows, peaks] - window[rows, afterPeaks]
+
+	isArtifact = (peaks < window.shape[1] - 1) & (drops >= minDrop)
+	starts[isArtifact] = startTimepoint + peaks[isArtifact] + 1
+	return starts
+
+
+#Replaces the measurements that are <= 0 in every row of values (a wells x timepoints array) so
+#that they can be log transformed. A value <= 0 is replaced by the value before it (after that one
+#has been replaced itself). At the start of a row it is replaced by the entry of previous for that
+#row, the last replaced value of the timepoints before these, or by 10E-9 if there is no previous.
+def fillNonPositive(values, previous = None):
+	values = numpy.atleast_2d(numpy.asarray(values, dtype = float))
+	numRows, numTimepoints = values.shape
+
+	#For every timepoint, find the last timepoint up to it that is kept. NaNs are kept, as they
+	#would be by a comparison with 0
+	with numpy.errstate(invalid = "ignore"):
+		kept = ~(values <= 0)
+	lastKept = numpy.where(kept, numpy.arange(numTimepoints), -1)
+	numpy.maximum.accumulate(lastKept, axis = 1, out = lastKept)
+
+	rows = numpy.arange(numRows)[:, numpy.newaxis]
+	filled = values[rows, numpy.maximum(lastKept, 0)]
+
+	noneKept = lastKept < 0
+	if previous is None:
+		filled[noneKept] = 0.000000001
+	else:
+		previous = numpy.asarray(previous, dtype = float).reshape(numRows, 1)
+		filled[noneKept] = numpy.broadcast_to(previous, filled.shape)[noneKept]
+	return filled
+
+
+#The number of measurements from the starting timepoint on that the base of a well is found from
+BASE_NUM_POINTS = 10
+
+#The ways findBases() can find the base from those measurements:
+#min, the lowest one
+#percentile, the BASE_PERCENTILE percentile of them
+#trimmedMean, the mean once the BASE_TRIM_FRACTION lowest and highest of them are left out
+BASE_ESTIMATORS = ("min", "percentile", "trimmedMean")
+BASE_PERCENTILE = 10.0
+BASE_TRIM_FRACTION = 0.2
+
+
+#Finds the base of every row of measurements (a wells x timepoints array) from the numPoints
+#measurements from its starting timepoint on (startTimepoints, one per row), all at once. A row
+#with a starting timepoint of -1 has its base found from all of its measurements. The estimator
+#is one of BASE_ESTIMATORS.
+#
+#With min, the bases are exactly what min() gives for each row: if the first measurement is NaN
+#the base is NaN, otherwise later NaNs are passed over. The other estimators pass over all NaNs.
+#If wells (a list of row indices) is given, only the bases of those rows are found, with one
+#starting timepoint each, and only their numPoints measurements are read from measurements.
+#Raises ValueError if a starting timepoint is past the last measurement
+def findBases(measurements, startTimepoints, numPoints = BASE_NUM_POINTS, estimator = "min", percentile = BASE_PERCENTILE,
+		trimFraction = BASE_TRIM_FRACTION, wells = None):
+	if estimator not in BASE_ESTIMATORS:
+		raise ValueError("The base estimator must be one of %s, got '%s'" % (", ".join(BASE_ESTIMATORS), estimator))
+
+	startTimepoints = numpy.asarray(startTimepoints, dtype = int)
+	numTimepoints = measurements.shape[1]
+	if wells is None:
+		wells = numpy.arange(measurements.shape[0])
+	wells = numpy.asarray(wells, dtype = int)
+	numRows = len(wells)
+	bases = numpy.empty(numRows)
+
+	tooLate = startTimepoints >= numTimepoints
+	if tooLate.any():
+		raise ValueError("Well %d starts at timepoint %d, but there are only %d timepoints" % (wells[tooLate][0],
+			startTimepoints[tooLate][0], numTimepoints))
+
+	#The rows without a starting timepoint use all of their measurements
+	wholeRows = startTimepoints < 0
+	if wholeRows.any():
+		bases[wholeRows] = findBases(measurements, numpy.zeros(wholeRows.sum(), dtype = int), numTimepoints,
+			estimator, percentile, trimFraction, wells[wholeRows])
+	rows = numpy.flatnonzero(~wholeRows)
+	if len(rows) == 0:
+		return bases
+
+	#Gather the numPoints measurements of each row into one array, with NaN past the end of a row
+	columns = startTimepoints[rows, numpy.newaxis] + numpy.arange(numPoints)
+	inRange = columns < numTimepoints
+	values = numpy.asarray(measurements[wells[rows, numpy.newaxis], numpy.minimum(columns, numTimepoints - 1)], dtype = float)
+	values[~inRange] = numpy.nan
+
+	with numpy.errstate(invalid = "ignore"):
+		if estimator == "min":
+			values[~inRange] = numpy.inf
+			rowBases = numpy.fmin.reduce(values, axis = 1)
+			rowBases[numpy.isnan(values[:, 0])] = numpy.nan
+
+		else:
+			#Sorting puts the NaNs at the end of each row, after the numbers that are used
+			values.sort(axis = 1)
+			numNumbers = (~numpy.isnan(values)).sum(axis = 1)
+			rowIndex = numpy.arange(len(rows))
+
+			if estimator == "percentile":
+				#Interpolate between the two closest measurements, as numpy.percentile does
+				positions = (numNumbers - 1) * (percentile / 100.0)
+				below = numpy.floor(positions).astype(int)
+				above = numpy.minimum(below + 1, numpy.maximum(numNumbers - 1, 0))
+				fraction = positions - below
+				rowBases = values[rowIndex, numpy.maximum(below, 0)] * (1 - fraction) + values[rowIndex, above] * fraction
+
+			else:
+				numTrimmed = (numNumbers * trimFraction).astype(int)
+				sums = numpy.zeros((len(rows), numPoints + 1))
+				numpy.cumsum(numpy.where(numpy.isnan(values), 0.0, values), axis = 1, out = sums[:, 1:])
+				numKept = numNumbers - 2 * numTrimmed
+				rowBases = (sums[rowIndex, numNumbers - numTrimmed] - sums[rowIndex, numTrimmed]) / numKept
+
+			rowBases[numNumbers == 0] = numpy.nan
+
+	bases[rows] = rowBases
+	return bases
+
+
+#The ways smoothMeasurements() can smooth the measurements of each well:
+#savgol, a Savitzky-Golay filter fitting a polynomial of degree SMOOTHING_POLYORDER to each window
+#median, the median of each window
+#exponential, an exponential moving average with the weight 2 / (width + 1) on the newest measurement
+SMOOTHING_METHODS = ("savgol", "median", "exponential")
+SMOOTHING_POLYORDER = 2
+
+#The most values smoothMeasurements() gathers at once for the moving median
+SMOOTHING_CHUNK_VALUES = 20 * 1000 * 1000
+
+
+#Smooths every row of values (a wells x timepoints array) over time with the method (one of
+#SMOOTHING_METHODS) and width (the number of timepoints in each window), all of the rows at once.
+#The time taken grows with the size of the array and the width. The windows of savgol and median
+#are centred on each timepoint and their width must be odd, the first and last timepoints of savgol
+#come from the polynomial of the first and last whole window, and median repeats the first and last
+#measurements past the ends. Raises ValueError for other methods or widths that do not fit
+def smoothMeasurements(values, method, width, polyorder = SMOOTHING_POLYORDER):
+	if method not in SMOOTHING_METHODS:
+		raise ValueError("The smoothing method must be one of %s, got '%s'" % (", ".join(SMOOTHING_METHODS), method))
+	if width < 1 or (method != "exponential" and width % 2 == 0):
+		raise ValueError("The %s smoothing width must be a positive%s number, got %s" % (method, "" if method == "exponential" else " odd", width))
+	if method == "savgol" and width <= polyorder:
+		raise ValueError("The savgol smoothing width must be more than the polynomial degree %d, got %d" % (polyorder, width))
+	
+	values = numpy.asarray(values, dtype = float)
+	numRows, numTimepoints = values.shape
+	if width == 1 or numTimepoints == 0:
+		return values.copy()
+	
+	if method == "savgol":
+		from scipy.signal import savgol_filter
+		return savgol_filter(values, width, polyorder, axis = 1, mode = "interp" if numTimepoints >= width else "nearest")
+	
+	if method == "exponential":
+		from scipy.signal import lfilter
+		weight = 2.0 / (width + 1)
+		smoothed, finalState = lfilter([weight], [1.0, weight - 1], values, axis = 1, zi = (1 - weight) * values[:, :1])
+		return smoothed
+	
+	#The moving median, from a view of every window of the padded rows, a few rows at a time
+	halfWidth = width // 2
+	padded = numpy.concatenate((numpy.repeat(values[:, :1], halfWidth, axis = 1), values, numpy.repeat(values[:, -1:], halfWidth, axis = 1)), axis = 1)
+	windows = numpy.lib.stride_tricks.as_strided(padded, (numRows, numTimepoints, width), padded.strides + padded.strides[1:])
+	smoothed = numpy.empty((numRows, numTimepoints))
+	chunkSize = max(int(SMOOTHING_CHUNK_VALUES // (numTimepoints * width)), 1)
+	for firstRow in range(0, numRows, chunkSize):
+		smoothed[firstRow:firstRow + chunkSize] = numpy.median(windows[firstRow:firstRow + chunkSize], axis = 2)
+	return smoothed
+
+
+#Returns log2 of the measurements less the bases (one per row), after the values <= 0 are replaced
+#(see fillNonPositive()), and the number of values that were replaced. If smoothing, a tuple of the
+#arguments of smoothMeasurements() after the values, is given, the measurements less the bases are
+#smoothed first
+def logLessBase(measurements, bases, previous = None, smoothing = None):
+	lessBase = numpy.subtract(measurements, numpy.asarray(bases, dtype = float)[:, numpy.newaxis], dtype = float)
+	if smoothing is not None:
+		lessBase = smoothMeasurements(lessBase, *smoothing)
+	with numpy.errstate(invalid = "ignore"):
+		numReplaced = int((lessBase <= 0).sum())
+	filled = fillNonPositive(lessBase, previous)
+	return numpy.log2(filled), filled, numReplaced
+
+
+#Formats an array of numbers exactly the way str() formats a float, separated by separator.
+#The rows are turned into a list once and formatted by str() itself, as its rules for when to
+#add a '.0' and when to switch to an exponent are not those of any % format
+def formatFloats(values, separator = "\t"):
+	return separator.join(map(str, numpy.asarray(values, dtype = float).ravel().tolist()))
+
+
+#Returns the doubling times for an array of slopes (1 / slope). A slope of 0 gives a doubling time of 0
+def doublingTimesFromSlopes(slopes):
+	doublings = numpy.zeros(numpy.shape(slopes))
+	nonzero = slopes != 0
+	doublings[nonzero] = 1 / slopes[nonzero]
+	return doublings
+
+
+#Returns the window with the shortest positive doubling time of every row of doublingMatrix (wells x
+#windows), only counting the windows that start at or after the starting timepoint of the row.
+#Rows without any such window get -1
+def findFastestWindows(doublingMatrix, startTimepoints):
+	doublingMatrix = numpy.asarray(doublingMatrix, dtype = float)
+	if doublingMatrix.shape[1] == 0:
+		return numpy.zeros(len(doublingMatrix), dtype = int) - 1
+
+	with numpy.errstate(invalid = "ignore"):
+		usable = (doublingMatrix > 0) & (numpy.arange(doublingMatrix.shape[1]) >= numpy.asarray(startTimepoints)[:, numpy.newaxis])
+	fastest = numpy.argmin(numpy.where(usable, doublingMatrix, numpy.inf), axis = 1)
+	fastest[~usable.any(axis = 1)] = -1
+	return fastest
+
+
+class Plate:
+
+	"""This class holds the data of a whole plate in columns.
+	The OD600 measurements, one row per well and one column per timepoint (a 2-D float array)
+	The timepoints in seconds and in hours, and the temperatures if they are known (float arrays)
+	The well labels, strain names and dilutions (lists of strings, in row order)
+	The starting timepoint and the base of every well (arrays, -1 until they are set)
+
+	The measurements of a plate opened with openMemmapPlate() stay on disk as float32, and
+	directory is where they are kept"""
+
+
+	#Initialize a plate by passing the well labels (a list), the measurements (anything
+	#numpy can turn into a wells x timepoints float array), the timepoints in seconds
+	#(a list), the strain names and dilutions (lists in the same order as the labels) and
+	#optionally the temperatures (a list). A numpy.memmap of measurements is used as it is
+	def __init__(self, labels, measurements, timesSecs, strainNames, dilutions, temperatures = None):
+		if isinstance(measurements, numpy.memmap):
+			self.measurements = measurements
+		else:
+			self.measurements = numpy.ascontiguousarray(measurements, dtype = float)
+		self.timesSecs = numpy.asarray(timesSecs, dtype = float)
+		self.timesHrs = self.timesSecs / 3600
+		self.temperatures = None
+		if temperatures is not None:
+			self.temperatures = numpy.asarray(temperatures, dtype = float)
+		self.labels = list(labels)
+		self.strainNames = list(strainNames)
+		self.dilutions = list(dilutions)
+		self.startTimepoints = numpy.empty(len(self.labels), dtype = int)
+		self.startTimepoints.fill(-1)
+		self.bases = numpy.empty(len(self.labels))
+		self.bases.fill(-1)
+		self.storage = None #The array with room to spare used by appendTimepoints
+		self.directory = None #Set by openMemmapPlate()
+
+		if self.measurements.shape != (len(self.labels), len(self.timesSecs)):
+			raise ValueError("Expected %d wells x %d timepoints of measurements, got %s" % (len(self.labels), len(self.timesSecs), self.measurements.shape))
+
+	#Return the number of wells
+	def getNumWells(self):
+		return len(self.labels)
+
+	#Return the number of timepoints
+	def getNumTimepoints(self):
+		return len(self.timesSecs)
+
+	#Return a Well for every row, in order
+	def getWells(self):
+		return [Well(self, n) for n in range(self.getNumWells())]
+
+	#Return the data that was read from the files as a dictionary of arrays (see plateFromArrays())
+	def getArrays(self):
+		arrays = {"labels": numpy.array(self.labels), "measurements": self.measurements, "timesSecs": self.timesSecs,
+			"strainNames": numpy.array(self.strainNames), "dilutions": numpy.array(self.dilutions)}
+		if self.temperatures is not None:
+			arrays["temperatures"] = self.temperatures
+		return arrays
+
+	#Add timepoints to the end of the plate: their times in seconds (a list), the measurements
+	#(a wells x new timepoints array) and optionally their temperatures (a list). The measurements
+	#are kept in a larger array with room to spare, so that adding a few timepoints at a time
+	#does not copy the whole plate every time
+	def appendTimepoints(self, timesSecs, measurements, temperatures = None):
+		timesSecs = numpy.asarray(timesSecs, dtype = float)
+		measurements = numpy.asarray(measurements, dtype = float).reshape(self.getNumWells(), len(timesSecs))
+
+		oldLength = self.getNumTimepoints()
+		newLength = oldLength + len(timesSecs)
+
+		if self.storage is None or self.storage.shape[1] < newLength:
+			self.storage = numpy.empty((self.getNumWells(), max(newLength, 2 * oldLength)))
+			self.storage[:, :oldLength] = self.measurements
+
+		self.storage[:, oldLength:newLength] = measurements
+		self.measurements = self.storage[:, :newLength]
+
+		self.timesSecs = numpy.concatenate((self.timesSecs, timesSecs))
+		self.timesHrs = self.timesSecs / 3600
+		if self.temperatures is not None and temperatures is not None:
+			self.temperatures = numpy.concatenate((self.temperatures, numpy.asarray(temperatures, dtype = float)))
+
+
+#Make a Plate from the dictionary of arrays returned by Plate.getArrays()
+def plateFromArrays(arrays):
+	return Plate(arrays["labels"].tolist(), arrays["measurements"], arrays["timesSecs"], arrays["strainNames"].tolist(),
+		arrays["dilutions"].tolist(), arrays.get("temperatures"))
+
+
+#The names of the files in a directory made by convertToMemmap()
+MEMMAP_MEASUREMENTS_FILE = "measurements.f32"
+MEMMAP_INFO_FILE = "plate.npz"
+
+#About how many bytes the chunks of wells that an Analyzer works on at a time should take up
+#when the plate is kept on disk (see Analyzer.chunkSize). Each chunk needs about 24 float64
+#arrays of one entry per measurement, for the regression sums and the results
+MEMMAP_CHUNK_BYTES = 200 * 1000 * 1000
+
+
+#Converts the export odFileName and the well label file labelFileName into a plate kept on disk,
+#in the directory (made if it does not exist). The measurements are written as a raw float32
+#array, one well after the other, and everything else as a .npz file. The export is read one row
+#at a time, so it never has to fit in memory. Returns openMemmapPlate(directory)
+def convertToMemmap(odFileName, labelFileName, directory):
+	if not os.path.isdir(directory):
+		os.makedirs(directory)
+
+	timesSecs = None
+	temperatures = None
+	wellLabels = []
+
+	measurementsFileName = os.path.join(directory, MEMMAP_MEASUREMENTS_FILE)
+	tempFileName = measurementsFileName + ".%d.tmp" % os.getpid()
+	out = open(tempFileName, "wb")
+	try:
+		f = open(odFileName)
+		for lineNumber, line in enumerate(f, 1):
+			name, sep, rest = line.rstrip("\r\n").partition("\t")
+			name = name.strip()
+
+			if name.startswith("Time"):
+				timesSecs = _parseNumbers(rest, "Time")
+			elif name.startswith("Temp"):
+				temperatures = _parseNumbers(rest, "Temp")
+			elif WELL_LABEL_PATTERN.match(name):
+				if timesSecs is None:
+					raise ValueError("%s has no 'Time [s]' row before the wells" % odFileName)
+				currMeasurements = _parseNumbers(rest, "well")
+				if len(currMeasurements) != len(timesSecs):
+					raise ValueError("Line %d of %s has %d measurements for well %s, expected %d" % (lineNumber, odFileName, len(currMeasurements),
+						name, len(timesSecs)))
+
+				wellLabels.append(name)
+				currMeasurements.astype(numpy.float32).tofile(out)
+		f.close()
+	finally:
+		out.close()
+
+	if timesSecs is None:
+		raise ValueError("%s has no 'Time [s]' row" % odFileName)
+	_checkWellLabels(odFileName, wellLabels)
+	strainNames, dilutions = lookUpWellLabels(wellLabels, labelFileName)
+
+	if os.path.exists(measurementsFileName):
+		os.remove(measurementsFileName)
+	os.rename(tempFileName, measurementsFileName)
+
+	arrays = {"labels": numpy.array(wellLabels), "timesSecs": timesSecs, "strainNames": numpy.array(strainNames),
+		"dilutions": numpy.array(dilutions), "sources": numpy.array([fileSignature(odFileName), fileSignature(labelFileName)])}
+	if temperatures is not None:
+		arrays["temperatures"] = temperatures
+	numpy.savez(os.path.join(directory, MEMMAP_INFO_FILE), **arrays)
+
+	return openMemmapPlate(directory)
+
+
+#Returns a string that changes whenever the file fileName does (its size and modification time)
+def fileSignature(fileName):
+	stat = os.stat(fileName)
+	return "%d:%r" % (stat.st_size, stat.st_mtime)
+
+
+#Opens a plate made by convertToMemmap(). The measurements are a read only numpy.memmap of the
+#file, so only the parts that are used are read into memory
+def openMemmapPlate(directory):
+	info = numpy.load(os.path.join(directory, MEMMAP_INFO_FILE))
+	labels = info["labels"].tolist()
+	timesSecs = info["timesSecs"]
+
+	measurements = numpy.zeros((len(labels), len(timesSecs)), dtype = numpy.float32)
+	if measurements.size > 0:
+		measurements = numpy.memmap(os.path.join(directory, MEMMAP_MEASUREMENTS_FILE), dtype = numpy.float32, mode = "r",
+			shape = (len(labels), len(timesSecs)))
+
+	temperatures = info["temperatures"] if "temperatures" in info.files else None
+	plate = Plate(labels, measurements, timesSecs, info["strainNames"].tolist(), info["dilutions"].tolist(), temperatures)
+	plate.directory = directory
+	info.close()
+	return plate
+
+
+#Returns True if directory has a plate made by convertToMemmap() from the files odFileName and
+#labelFileName as they are now
+def isMemmapCurrent(odFileName, labelFileName, directory):
+	try:
+		info = numpy.load(os.path.join(directory, MEMMAP_INFO_FILE))
+		sources = info["sources"].tolist()
+		info.close()
+	except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+		return False
+	return sources == [fileSignature(odFileName), fileSignature(labelFileName)]
+
+
+#Returns an Analyzer that works on the plate of the export odFileName kept on disk in directory,
+#converting the export first if it has not been converted or has changed since. The Analyzer
+#works on chunkSize wells at a time (by default as many as fit in MEMMAP_CHUNK_BYTES)
+def openMemmapAnalyzer(odFileName, labelFileName, directory, chunkSize = None, instrumentation = None):
+	if isMemmapCurrent(odFileName, labelFileName, directory):
+		plate = openMemmapPlate(directory)
+	else:
+		plate = convertToMemmap(odFileName, labelFileName, directory)
+
+	if chunkSize is None:
+		chunkSize = max(1, MEMMAP_CHUNK_BYTES // (24 * 8 * max(plate.getNumTimepoints(), 1)))
+
+	a = Analyzer(odFileName, labelFileName, plate, instrumentation)
+	a.chunkSize = chunkSize
+	return a
+
+
+class Well(object):
 
 	"""This class encapsualtes all of the relevant information for the well. 
 	The alphanumeric label (i.e. 'A1')
 	The OD600 measurements for the well
 	The strain name in the well
-	The dilution in the well"""
-	
-	
-	#Initiliaze a well by passing its label (a string), 
-	#the measurements in order (a list), the strain name (a string)
-	#the dilution (a string)
-	#In addition, there is a variable start_after_drop which is the index
+	The dilution in the well
+
+	A Well does not hold any data itself, it is a view of one row of a Plate"""
+
+	__slots__ = ('plate', 'index')
+
+
+	#Initiliaze a well by passing the Plate it belongs to and its row in the plate.
+	#In addition, the plate has the starting timepoint of the well which is the index
 	#of the first measurement after the drop artifact. This is initialized as -1
-	#for every Well object, but can be set either from reading from a file 
+	#for every well, but can be set either from reading from a file 
 	#that has the assignments for each drop, or 
-	def __init__(self, well_label, msmnts, strain_name, dil):
-		self.label = well_label 
-		self.measurements = msmnts 
-		self.name = strain_name
-		self.dilution = dil
-		self.starting_timepoint = -1
-		self.base = -1
-	
-	
-	def getLabel():
-		return self.label
-	
+	def __init__(self, plate, index):
+		self.plate = plate
+		self.index = index
+
+	#The measurements of the well, a row of the plate's array
+	@property
+	def measurements(self):
+		return self.plate.measurements[self.index]
+
 	#Return the whole set of measurements
 	def getMeasurements(self, start = -1, end = -1):
 		if start > -1 and end > -1:
@@ -56,66 +842,831 @@ class Well:
 	
 	#Return a specific measurement. i is an integer
 	def getSpecificMeasurement(self, i):
-		return self.measurements[i]
+		return self.plate.measurements[self.index, i]
+	
+
+	
+	#Return the label of the well
+	def getLabel(self):
+		return self.plate.labels[self.index]
 	
+	#Return the name of the strain
+	def getStrainName(self):
+		return self.plate.strainNames[self.index]
+	
+	#Return the dilution
+	def getDilution(self):
+		return self.plate.dilutions[self.index]
+		
+	#Return the starting_timepoint, the index where the artifact ends
+	def getStartTimepoint(self):
+		return int(self.plate.startTimepoints[self.index])
+	
+	#Set start_after_drop
+	def setStartTimepoint(self, i):
+		self.plate.startTimepoints[self.index] = i
+	
+	#Set base
+	def setBase(self, base):
+		self.plate.bases[self.index] = float(base)
+	
+	#Get base
+	def getBase(self):
+		return float(self.plate.bases[self.index])
+		
+	#Get the measurements minus the base, as float64 even if the plate is kept as float32
+	def getMeasurementsLessBase(self):
+		return numpy.subtract(self.measurements, self.plate.bases[self.index], dtype = float)
+
+
+#The number of window sizes whose sums of blocks a RegressionSums keeps (see getBlockSums())
+REGRESSION_KEPT_BLOCK_SIZES = 2
+
+
+class RegressionSums:
+
+	"""This class holds the cumulative sums of x, y, x*x, y*y and x*y along the
+	measurements of every well at once. The least squares fit of any window of
+	any well can then be read off with a few array subtractions instead of one
+	scipy.stats.linregress call per window per well.
+
+	The sums restart at every block of windowSize timepoints, and x and every row
+	of y are taken relative to the first timepoint of the block (the slope and r of
+	a window do not change under a shift). A window is then the end of one block
+	and the start of the next, so the sums stay as small as the window itself and
+	the subtractions stay accurate however long the run is. Each window size has blocks
+	of its own length, as longer blocks would lose that accuracy for shorter windows. The
+	sums of the last REGRESSION_KEPT_BLOCK_SIZES window sizes asked for are kept, so i.e.
+	the doubling times and the regression quality of one window size share them.
+
+	x is the list of timepoints shared by all wells, y is a 2-D array with one
+	row per well and one column per timepoint. More timepoints can be added
+	later with extend(), after which only the last block is summed again"""
+
+
+	def __init__(self, xVals, yVals):
+		x = numpy.asarray(xVals, dtype = float)
+		y = numpy.atleast_2d(numpy.asarray(yVals, dtype = float))
+
+		#The timepoints and measurements are kept in arrays with room to spare, so that
+		#extend() does not have to copy everything each time. Only the first length are used
+		self.numRows = y.shape[0]
+		self.length = 0
+		self.lastY = None
+		self.x = numpy.zeros(0)
+		self.y = numpy.zeros((self.numRows, 0))
+		self.sumBad = numpy.zeros((self.numRows, 1))
+		self.sumChanges = numpy.zeros((self.numRows, 1))
+		self.blockSums = collections.OrderedDict() #Block size -> the sums of the blocks, the most recently used last
+
+		self.extend(x, y)
+
+
+	#Add more timepoints (xVals) and their measurements (yVals, one row per well)
+	#to the end of the sums
+	def extend(self, xVals, yVals):
+		x = numpy.asarray(xVals, dtype = float)
+		y = numpy.asarray(yVals, dtype = float).reshape(self.numRows, -1)
+
+		if len(x) != y.shape[1]:
+			raise ValueError("There are %d timepoints but %d measurements per well" % (len(x), y.shape[1]))
+		if len(x) == 0:
+			return
+
+		self._reserve(self.length + len(x))
+		self.x[self.length:(self.length + len(x))] = x
+		self.y[:, self.length:(self.length + len(x))] = y
+
+		#Windows that touch a NaN give NaN, just like linregress would. The NaNs are
+		#counted, and left out of the sums of the blocks so they do not poison the rest
+		finite = numpy.isfinite(y)
+
+		#Count the places where a measurement differs from the one before it. A window
+		#without any such change is flat, and gets a slope of exactly 0 (as linregress
+		#does) rather than whatever is left over from rounding in the subtractions
+		previousY = y[:, :1] if self.lastY is None else self.lastY
+		changes = y != numpy.concatenate((previousY, y[:, :-1]), axis = 1)
+
+		#The counts are whole numbers, so their sums along the whole run are exact
+		self._append(self.sumBad, (~finite).astype(float))
+		self._append(self.sumChanges, changes.astype(float))
+
+		self.length += len(x)
+		self.lastY = y[:, -1:].copy()
+
+
+	#Make sure there is room for numTimepoints timepoints, at least doubling the
+	#room each time it runs out
+	def _reserve(self, numTimepoints):
+		if numTimepoints < self.sumBad.shape[-1]:
+			return
+
+		capacity = max(numTimepoints + 1, 2 * self.sumBad.shape[-1])
+		for name, used in (("x", self.length), ("y", self.length), ("sumBad", self.length + 1), ("sumChanges", self.length + 1)):
+			oldValues = getattr(self, name)
+			newValues = numpy.zeros(oldValues.shape[:-1] + (capacity,))
+			newValues[..., :used] = oldValues[..., :used]
+			setattr(self, name, newValues)
+
+
+	#Continue the cumulative sum in sums along the timepoints with vals. The sums
+	#have a leading 0, so that the sum over timepoints [i, j) is sums[..., j] - sums[..., i]
+	def _append(self, sums, vals):
+		newSums = sums[..., (self.length + 1):(self.length + 1 + vals.shape[-1])]
+		numpy.cumsum(vals, axis = -1, out = newSums)
+		newSums += sums[..., self.length:(self.length + 1)]
+
+
+	#Return the number of timepoints
+	def getLength(self):
+		return self.length
+
+
+	#Returns the sums of the blocks of blockSize timepoints as a dictionary with:
+	#xAnchors (blocks), yAnchors (wells x blocks)		the first x and y of each block (0 for a y that is NaN)
+	#X, XX (blocks x blockSize + 1), Y, YY, XY (wells x blocks x blockSize + 1)		the cumulative sums within each
+	#		block of x and y less the anchors of the block, with a leading 0
+	#The sums of the last REGRESSION_KEPT_BLOCK_SIZES block sizes are kept, and when timepoints have been added
+	#since only the blocks from the last one that was not full on are summed again
+	def getBlockSums(self, blockSize):
+		blocks = self.blockSums.pop(blockSize, None)
+		if blocks is not None and blocks["length"] == self.length:
+			self.blockSums[blockSize] = blocks
+			return blocks
+
+		firstBlock = 0
+		if blocks is not None:
+			firstBlock = blocks["length"] // blockSize
+		numBlocks = -(-self.length // blockSize)
+		numNew = numBlocks - firstBlock
+
+		#The new blocks, with the last one filled out with the last timepoint and measurements of 0
+		x = numpy.zeros(numNew * blockSize)
+		y = numpy.zeros((self.numRows, numNew * blockSize))
+		x[:(self.length - firstBlock * blockSize)] = self.x[(firstBlock * blockSize):self.length]
+		if self.length > 0:
+			x[(self.length - firstBlock * blockSize):] = self.x[self.length - 1]
+		y[:, :(self.length - firstBlock * blockSize)] = self.y[:, (firstBlock * blockSize):self.length]
+		x = x.reshape(numNew, blockSize)
+		y = y.reshape(self.numRows, numNew, blockSize)
+
+		finite = numpy.isfinite(y)
+		xAnchors = x[:, 0]
+		yAnchors = numpy.where(finite[:, :, 0], y[:, :, 0], 0.0)
+		dx = x - xAnchors[:, numpy.newaxis]
+		dy = numpy.where(finite, y - yAnchors[:, :, numpy.newaxis], 0.0)
+
+		newBlocks = {"xAnchors": xAnchors, "yAnchors": yAnchors}
+		for name, values in (("X", dx), ("XX", dx * dx), ("Y", dy), ("YY", dy * dy), ("XY", dx * dy)):
+			sums = numpy.zeros(values.shape[:-1] + (blockSize + 1,))
+			numpy.cumsum(values, axis = -1, out = sums[..., 1:])
+			newBlocks[name] = sums
+
+		if firstBlock > 0:
+			for name in ("xAnchors", "X", "XX"):
+				newBlocks[name] = numpy.concatenate((blocks[name][:firstBlock], newBlocks[name]))
+			for name in ("yAnchors", "Y", "YY", "XY"):
+				newBlocks[name] = numpy.concatenate((blocks[name][:, :firstBlock], newBlocks[name]), axis = 1)
+
+		newBlocks["length"] = self.length
+		self.blockSums[blockSize] = newBlocks
+		while len(self.blockSums) > REGRESSION_KEPT_BLOCK_SIZES:
+			self.blockSums.popitem(False)
+		return newBlocks
+
+
+	#Returns the slope, intercept, r and standard error of the slope of every window
+	#of windowSize timepoints for every well, as 2-D arrays (wells x windows).
+	#Window i covers timepoints i to i + windowSize - 1. As in findDoublingTimes, only
+	#windows with i + windowSize < the number of timepoints are included.
+	#Only the windows from firstWindow on are returned.
+	def regress(self, windowSize, firstWindow = 0):
+		return self.regressWithResiduals(windowSize, firstWindow, False)[:4]
+
+
+	#Returns the same as regress(), and also the standard deviation of the residuals of every
+	#window (sqrt(sum of squared residuals / (windowSize - 2)), 0 for windows of 2), unless
+	#residuals = False
+	def regressWithResiduals(self, windowSize, firstWindow = 0, residuals = True):
+		if windowSize < 2:
+			raise ValueError("The window size must be at least 2, got %d" % windowSize)
+
+		w = float(windowSize)
+		endWindow = max(self.length - windowSize, firstWindow)
+		lo = slice(firstWindow, endWindow)
+		hi = slice(firstWindow + windowSize, endWindow + windowSize)
+
+		#Window i = k * windowSize + r is the end of block k from timepoint i on, and the first r timepoints
+		#of block k + 1. Those are moved onto the anchors of block k (by d for x and e for y) before they
+		#are added. This is done for whole blocks of windows, which are then laid end to end
+		blocks = self.getBlockSums(windowSize)
+		firstBlock = firstWindow // windowSize
+		endBlock = max(-(-endWindow // windowSize), firstBlock)
+		used = slice(firstBlock, endBlock + 1)
+		first = firstWindow - firstBlock * windowSize
+		numWindows = endWindow - firstWindow
+
+		xAnchors = blocks["xAnchors"][used]
+		yAnchors = blocks["yAnchors"][:, used]
+		r = numpy.arange(windowSize, dtype = float)
+		d = numpy.diff(xAnchors)[:, numpy.newaxis]
+		e = numpy.diff(yAnchors, axis = 1)[:, :, numpy.newaxis]
+
+		X, XX, Y, YY, XY = [blocks[name][..., used, :] for name in ("X", "XX", "Y", "YY", "XY")]
+		headX = X[1:, :windowSize]
+		headY = Y[:, 1:, :windowSize]
+		sums = []
+		for blockSums, head, shifts in ((X, headX, (r * d,)),
+				(XX, XX[1:, :windowSize], (2 * d * headX, r * d * d)),
+				(Y, headY, (r * e,)),
+				(YY, YY[:, 1:, :windowSize], (2 * e * headY, r * e * e)),
+				(XY, XY[:, 1:, :windowSize], (e * headX, d * headY, r * d * e))):
+			windowSums = blockSums[..., :-1, windowSize:] - blockSums[..., :-1, :windowSize]
+			windowSums += head
+			for shift in shifts:
+				windowSums += shift
+			windowSums = windowSums.reshape(windowSums.shape[:-2] + (-1,))
+			sums.append(windowSums[..., first:(first + numWindows)])
+		sx, sxx, sy, syy, sxy = sums
+		xMeans = (sx / w) + numpy.repeat(xAnchors[:-1], windowSize)[first:(first + numWindows)]
+		yMeans = (sy / w) + numpy.repeat(yAnchors[:, :-1], windowSize, axis = 1)[:, first:(first + numWindows)]
+
+		#Sums of squares and products about the window means
+		ssxm = sxx - sx * sx / w
+		ssym = numpy.maximum(syy - sy * sy / w, 0.0)
+		ssxym = sxy - sx * sy / w
+
+		flat = (self.sumChanges[:, hi] - self.sumChanges[:, (firstWindow + 1):(endWindow + 1)]) == 0
+		ssym[flat] = 0.0
+		ssxym[flat] = 0.0
+
+		slopes = ssxym / ssxm
+		intercepts = yMeans - slopes * xMeans
+
+		rDen = numpy.sqrt(ssxm * ssym)
+		rs = numpy.zeros(slopes.shape)
+		nonzero = rDen != 0
+		rs[nonzero] = numpy.clip(ssxym[nonzero] / rDen[nonzero], -1.0, 1.0)
+
+		if windowSize == 2:
+			stderrs = numpy.zeros(slopes.shape)
+		else:
+			stderrs = numpy.sqrt(numpy.maximum(1 - rs * rs, 0.0) * ssym / ssxm / (w - 2))
+
+		residualStds = None
+		if residuals:
+			residualStds = numpy.zeros(slopes.shape)
+			if windowSize > 2:
+				residualStds = numpy.sqrt(numpy.maximum(1 - rs * rs, 0.0) * ssym / (w - 2))
+
+		bad = (self.sumBad[:, hi] - self.sumBad[:, lo]) > 0
+		for result in (slopes, intercepts, rs, stderrs, residualStds):
+			if result is not None:
+				result[bad] = numpy.nan
+
+		return slopes, intercepts, rs, stderrs, residualStds
+
+
+#Returns the two sided p-values of the slopes of windows of windowSize timepoints with the correlation
+#coefficients rs, for the hypothesis that the slope is 0, as scipy.stats.linregress gives them
+def regressionPValues(rs, windowSize):
+	from scipy import special
+
+	degrees = windowSize - 2
+	if degrees <= 0:
+		return numpy.where(numpy.isnan(rs), numpy.nan, 1.0)
+
+	with numpy.errstate(divide = "ignore", invalid = "ignore"):
+		ts = rs * numpy.sqrt(degrees / ((1.0 - rs) * (1.0 + rs)))
+	return 2 * special.stdtr(degrees, -numpy.abs(ts))
+
+
+#The smallest R squared that Analyzer.findBestDoublingTimes() accepts by default
+BEST_WINDOW_MIN_R_SQUARED = 0.95
+
+#The OD above the base whose time Analyzer.findWellSummaries() reports by default
+SUMMARY_OD_THRESHOLD = 0.1
+
+#The fraction of the largest OD above the base that the line through the best window of a well is
+#followed back to for its lag. A logistic curve of the form fitted by fitGrowthCurves() is at
+#1 / (1 + e^2) of its capacity at its lag, so the lags of both come out close to each other
+SUMMARY_LAG_FRACTION = 1 / (1 + numpy.exp(2))
+
+
+#Returns which windows (a wells x windows boolean array) pass all of these, given the results of
+#Analyzer.findRegressionQuality() (quality) and the starting timepoint of every well:
+#minRSquared, the smallest R squared
+#slopeSign, 1 for only rising windows, -1 for only falling ones, 0 for either (windows with a slope of 0 never pass)
+#windowsAfterStart, how many timepoints after the starting timepoint of its well a window must start at least
+#maxPValue, the largest p-value of the slope (only if the p-values were found)
+#Windows with a NaN in them never pass
+def filterWindows(quality, startTimepoints, minRSquared = 0.0, slopeSign = 1, windowsAfterStart = 0, maxPValue = None):
+	slopes = quality["slopes"]
+	with numpy.errstate(invalid = "ignore"):
+		passed = quality["rSquared"] >= minRSquared
+		if slopeSign > 0:
+			passed &= slopes > 0
+		elif slopeSign < 0:
+			passed &= slopes < 0
+		else:
+			passed &= slopes != 0
+		if maxPValue is not None:
+			passed &= quality["pValues"] <= maxPValue
+
+	firstWindows = numpy.maximum(numpy.asarray(startTimepoints), 0) + windowsAfterStart
+	passed &= numpy.arange(slopes.shape[1]) >= firstWindows[:, numpy.newaxis]
+	return passed
+
+
+#Returns the window with the steepest slope of every well among the windows that passed (see
+#filterWindows()), or -1 for wells where none did
+def findSteepestWindows(slopes, passed):
+	if slopes.shape[1] == 0:
+		return numpy.zeros(len(slopes), dtype = int) - 1
+
+	steepest = numpy.argmax(numpy.where(passed, numpy.abs(slopes), -numpy.inf), axis = 1)
+	steepest[~passed.any(axis = 1)] = -1
+	return steepest
+
+
+#The growth models that fitGrowthCurves() can fit, in the form of Zwietering et al. (1990) where
+#y is the OD less the base, A the capacity (the OD reached above the base), mu the maximum rate
+#(OD per hour) and lambda the lag (hours):
+#logistic	y = A / (1 + exp(4 mu / A (lambda - t) + 2))
+#gompertz	y = A exp(-exp(mu e / A (lambda - t) + 1))
+GROWTH_MODELS = ("logistic", "gompertz")
+
+#How many Levenberg-Marquardt iterations fitGrowthCurves() does at most, and the relative change
+#in the sum of squares below which a fit has converged
+FIT_MAX_ITERATIONS = 200
+FIT_TOLERANCE = 1e-10
+
+#The number of wells that Analyzer.findGrowthParameters() fits together, unless the Analyzer has a chunkSize
+FIT_CHUNK_WELLS = 256
+
 
+#Returns the values of the growth model (one of GROWTH_MODELS) at the times t (wells x timepoints)
+#for the parameters of each well (wells x 3: capacity, maximum rate, lag), and the derivatives of
+#the values with respect to the parameters (wells x timepoints x 3)
+def growthModel(model, params, t):
+	capacities, rates, lags = [params[:, i:(i + 1)] for i in range(3)]
+	derivatives = numpy.empty(t.shape + (3,))
+
+	if model == "logistic":
+		z = numpy.clip(4 * rates / capacities * (lags - t) + 2, -500, 500)
+		fraction = 0.5 * (1 - numpy.tanh(z / 2)) # 1 / (1 + exp(z))
+		values = capacities * fraction
+		dValues = -values * (1 - fraction) # with respect to z
+		factor = 4.0
+	else:
+		z = numpy.clip(rates * numpy.e / capacities * (lags - t) + 1, -500, 500)
+		expZ = numpy.exp(numpy.minimum(z, 700))
+		values = capacities * numpy.exp(-expZ)
+		dValues = -values * expZ
+		factor = numpy.e
+
+	derivatives[..., 0] = values / capacities - dValues * factor * rates * (lags - t) / (capacities * capacities)
+	derivatives[..., 1] = dValues * factor * (lags - t) / capacities
+	derivatives[..., 2] = dValues * factor * rates / capacities
+	return values, derivatives
+
+
+#Returns starting guesses of the capacity, maximum rate and lag for every row of y (wells x
+#timepoints, less the base, NaN where it is not to be used) at times t (wells x timepoints):
+#the largest y, the steepest rise over a few timepoints, and where the tangent at that point meets 0
+def guessGrowthParameters(t, y):
+	numWells, numTimepoints = y.shape
+	with numpy.errstate(invalid = "ignore"):
+		capacities = numpy.nanmax(numpy.where(numpy.isnan(y), -numpy.inf, y), axis = 1)
+
+		step = max(1, numTimepoints // 20)
+		rises = (y[:, step:] - y[:, :-step]) / (t[:, step:] - t[:, :-step])
+		rises[~numpy.isfinite(rises)] = -numpy.inf
+
+	params = numpy.empty((numWells, 3))
+	params[:, 0] = numpy.maximum(capacities, 1e-3)
+	if rises.shape[1] == 0:
+		params[:, 1] = params[:, 0]
+		params[:, 2] = 0.0
+		return params
+
+	steepest = numpy.argmax(rises, axis = 1)
+	rows = numpy.arange(numWells)
+	params[:, 1] = numpy.maximum(rises[rows, steepest], 1e-3)
+	middles = steepest + step // 2
+	yMiddles = numpy.where(numpy.isnan(y[rows, middles]), 0.0, y[rows, middles])
+	params[:, 2] = numpy.maximum(t[rows, middles] - yMiddles / params[:, 1], 0.0)
+	return params
+
+
+#Fits the growth model (one of GROWTH_MODELS) to every row of y (wells x timepoints, the OD less
+#the base) at the times t (wells x timepoints), by least squares. NaNs in y are left out of the fit.
+#All of the wells are fitted together: each Levenberg-Marquardt iteration is one set of array
+#operations across every well, and each well has its own damping and stops once it has converged.
+#Returns the capacities, maximum rates, lags, root mean square residuals and whether each fit
+#converged (arrays with one entry per well). Wells with fewer than 4 points get NaNs
+def fitGrowthCurves(t, y, model = "logistic", maxIterations = FIT_MAX_ITERATIONS, tolerance = FIT_TOLERANCE):
+	if model not in GROWTH_MODELS:
+		raise ValueError("The growth model must be one of %s, got '%s'" % (", ".join(GROWTH_MODELS), model))
+
+	t = numpy.asarray(t, dtype = float)
+	y = numpy.asarray(y, dtype = float)
+	used = ~numpy.isnan(y)
+	yUsed = numpy.where(used, y, 0.0)
+	numUsed = used.sum(axis = 1)
+
+	#The fit is done with y scaled so the largest value of each well is about 1
+	scales = numpy.nanmax(numpy.where(used, numpy.abs(y), 0.0), axis = 1)
+	scales[scales == 0] = 1.0
+	yUsed = yUsed / scales[:, numpy.newaxis]
+
+	params = guessGrowthParameters(t, numpy.where(used, yUsed, numpy.nan))
+	dampings = numpy.ones(len(y)) * 1e-3
+	active = numUsed >= 4
+	converged = numpy.zeros(len(y), dtype = bool)
+
+	def sumOfSquares(currParams, rows):
+		values = growthModel(model, currParams, t[rows])[0]
+		residuals = numpy.where(used[rows], yUsed[rows] - values, 0.0)
+		return (residuals * residuals).sum(axis = 1)
+
+	with numpy.errstate(over = "ignore", invalid = "ignore", divide = "ignore"):
+		costs = numpy.zeros(len(y))
+		costs[active] = sumOfSquares(params[active], active)
+
+		for iteration in range(maxIterations):
+			rows = numpy.flatnonzero(active & ~converged)
+			if len(rows) == 0:
+				break
+
+			values, derivatives = growthModel(model, params[rows], t[rows])
+			derivatives[~used[rows]] = 0.0
+			residuals = numpy.where(used[rows], yUsed[rows] - values, 0.0)
+
+			jtj = numpy.einsum("wti,wtj->wij", derivatives, derivatives)
+			gradients = numpy.einsum("wti,wt->wi", derivatives, residuals)
+
+			#Damp the diagonal, the small constant keeps the system solvable if a parameter has no effect
+			diagonals = numpy.arange(3)
+			damped = jtj.copy()
+			damped[:, diagonals, diagonals] += dampings[rows, numpy.newaxis] * (jtj[:, diagonals, diagonals] + 1e-12)
+			steps = numpy.linalg.solve(damped, gradients[..., numpy.newaxis])[..., 0]
+
+			newParams = params[rows] + steps
+			newCosts = sumOfSquares(newParams, rows)
+			better = (newCosts <= costs[rows]) & numpy.isfinite(newCosts) & (newParams[:, 0] > 0) & (newParams[:, 1] > 0)
+
+			improvement = (costs[rows] - newCosts) / numpy.maximum(costs[rows], 1e-300)
+			converged[rows] = better & (improvement < tolerance) | (costs[rows] == 0)
+
+			accepted = rows[better]
+			params[accepted] = newParams[better]
+			costs[accepted] = newCosts[better]
+			dampings[accepted] = numpy.maximum(dampings[accepted] / 10, 1e-12)
+			dampings[rows[~better]] *= 10
+
+			#A well whose damping has run away can not be improved any more
+			converged[rows[dampings[rows] > 1e12]] = True
+
+	capacities = params[:, 0] * scales
+	rates = params[:, 1] * scales
+	lags = params[:, 2]
+	residuals = numpy.sqrt(costs / numpy.maximum(numUsed, 1)) * scales
+
+	for result in (capacities, rates, lags, residuals):
+		result[~active] = numpy.nan
+	return capacities, rates, lags, residuals, converged & active
+
+
+#The number of resamples and the confidence of the intervals of bootstrapMeans() by default
+BOOTSTRAP_SAMPLES = 1000
+BOOTSTRAP_CONFIDENCE = 0.95
+
+#The most resampled values bootstrapMeans() keeps in memory at once
+BOOTSTRAP_CHUNK_VALUES = 20 * 1000 * 1000
+
+
+#Returns the given percentiles (interpolated linearly, as numpy.percentile() does) of each column of
+#values, leaving out the NaN. Sorting once is much quicker than numpy.nanpercentile() for many columns.
+#Columns with no values get NaN
+def nanPercentiles(values, percentiles):
+	sortedValues = numpy.sort(values, axis = 0) #The NaN are sorted to the end
+	numValues = (~numpy.isnan(values)).sum(axis = 0)
+	columns = numpy.arange(values.shape[1])
+	results = []
+	for percentile in percentiles:
+		positions = percentile / 100.0 * numpy.maximum(numValues - 1, 0)
+		below = numpy.floor(positions).astype(int)
+		above = numpy.ceil(positions).astype(int)
+		fractions = positions - below
+		results.append(sortedValues[below, columns] * (1 - fractions) + sortedValues[above, columns] * fractions)
+		results[-1][numValues == 0] = numpy.nan
+	return results
+
+
+#Returns the mean of each column of values (replicates x columns, NaN where there is no value)
+#and the lower and upper bounds of its bootstrap confidence interval. All numSamples resamples of
+#the replicates are drawn at once, a few columns at a time, and each column only averages the
+#replicates that have a value there. The bounds are NaN for columns with fewer than two values
+def bootstrapMeans(values, numSamples = BOOTSTRAP_SAMPLES, confidence = BOOTSTRAP_CONFIDENCE, seed = 0):
+	values = numpy.asarray(values, dtype = float)
+	numReplicates, numColumns = values.shape
+	present = ~numpy.isnan(values)
+	filledValues = numpy.where(present, values, 0.0)
+	numPresent = present.sum(axis = 0)
+	
+	with numpy.errstate(invalid = "ignore", divide = "ignore"):
+		means = filledValues.sum(axis = 0) / numPresent
+	lows = numpy.zeros(numColumns) + numpy.nan
+	highs = numpy.zeros(numColumns) + numpy.nan
+	if numReplicates < 2 or numColumns == 0:
+		return means, lows, highs
+	
+	resamples = numpy.random.RandomState(seed).randint(0, numReplicates, (numSamples, numReplicates))
+	percentiles = [50.0 * (1 - confidence), 50.0 * (1 + confidence)]
+	chunkSize = max(int(BOOTSTRAP_CHUNK_VALUES // (numSamples * numReplicates)), 1)
+	for firstColumn in range(0, numColumns, chunkSize):
+		columns = slice(firstColumn, firstColumn + chunkSize)
+		with numpy.errstate(invalid = "ignore", divide = "ignore"):
+			sampleMeans = filledValues[resamples, columns].sum(axis = 1) / present[resamples, columns].sum(axis = 1)
+		lows[columns], highs[columns] = nanPercentiles(sampleMeans, percentiles)
+	
+	lows[numPresent < 2] = numpy.nan
+	highs[numPresent < 2] = numpy.nan
+	return means, lows, highs
+
+
+#Runs bootstrapMeans() for one group of replicates. job is a tuple of its arguments.
+#Returns (means, medians, lows, highs)
+def bootstrapGroupJob(job):
+	values = job[0]
+	means, lows, highs = bootstrapMeans(*job)
+	with warnings.catch_warnings():
+		warnings.simplefilter("ignore", RuntimeWarning)
+		medians = numpy.nanmedian(values, axis = 0)
+	return means, medians, lows, highs
+
+
+#Returns the results of bootstrapGroupJob() for each array of replicates in groups, in order,
+#across a pool of numWorkers processes. Each group is resampled with seed plus its position, so
+#the intervals are the same whatever the number of workers. Inside a worker process of a batch,
+#which can not start processes of its own, the groups are done in that process
+def bootstrapGroups(groups, numSamples = BOOTSTRAP_SAMPLES, confidence = BOOTSTRAP_CONFIDENCE, seed = 0, numWorkers = 1):
+	jobs = [(values, numSamples, confidence, seed + groupIndex) for groupIndex, values in enumerate(groups)]
+	if numWorkers <= 1 or len(jobs) <= 1 or multiprocessing.current_process().daemon:
+		return [bootstrapGroupJob(job) for job in jobs]
+	
+	pool = multiprocessing.Pool(min(numWorkers, len(jobs)))
+	try:
+		results = pool.map(bootstrapGroupJob, jobs, max(len(jobs) // (4 * numWorkers), 1))
+	finally:
+		pool.close()
+		pool.join()
+	return results
+
+
+#The number of functions listed for each stage in the report when the stages are profiled
+PROFILE_REPORT_SIZE = 20
+
+
+class Instrumentation:
+
+	"""This class keeps track of where the time goes while a plate is analyzed.
+	Each stage (an Analyzer method marked with @instrumentedStage) is timed every time it
+	is called. The time of a stage includes the stages it calls, its own time does not.
+	Counters keep the amount of work done, i.e. the number of wells, timepoints, windows
+	and measurements that had to be replaced before the log transform.
+
+	With profile = True every outermost stage is also run under cProfile, and the functions
+	that took the most time in it are listed in the report.
+
+	Functions passed to subscribe() are called as callback(stage name, seconds, counters)
+	each time a stage finishes. getReport() returns everything as a dictionary and
+	saveReport() writes it as JSON."""
+
+	def __init__(self, profile = False):
+		self.profile = profile
+		self.stages = {} #Stage name -> {"calls", "seconds", "ownSeconds", "failures"}
+		self.stageOrder = [] #The stage names in the order they were first called
+		self.counters = {}
+		self.profiles = {} #Stage name -> pstats.Stats, only when profiling
+		self.hooks = []
+		self.openStages = [] #The time taken by the stages called from each stage still running
+		self.createdTime = time.time()
+
+
+	#Calls callback(stage name, seconds, counters) each time a stage finishes
+	def subscribe(self, callback):
+		self.hooks.append(callback)
+
+
+	#Stops calling callback
+	def unsubscribe(self, callback):
+		self.hooks.remove(callback)
+
+
+	#Adds amount to the counter name
+	def count(self, name, amount = 1):
+		self.counters[name] = self.counters.get(name, 0) + amount
+
+
+	#Sets the counter name to value
+	def setCount(self, name, value):
+		self.counters[name] = value
+
+
+	#Returns the stage record for name, making it the first time
+	def getStage(self, name):
+		if name not in self.stages:
+			self.stages[name] = {"calls": 0, "seconds": 0.0, "ownSeconds": 0.0, "failures": 0}
+			self.stageOrder.append(name)
+		return self.stages[name]
+
+
+	#Runs method(*args, **kwargs) as the stage name and returns what it returns
+	def runStage(self, name, method, *args, **kwargs):
+		profiler = None
+		if self.profile and not self.openStages:
+			profiler = cProfile.Profile()
+
+		stage = self.getStage(name)
+		self.openStages.append(0.0)
+		failed = True
+		startTime = time.time()
+		try:
+			if profiler is not None:
+				result = profiler.runcall(method, *args, **kwargs)
+			else:
+				result = method(*args, **kwargs)
+			failed = False
+			return result
+		finally:
+			seconds = time.time() - startTime
+			nestedSeconds = self.openStages.pop()
+			if self.openStages:
+				self.openStages[-1] += seconds
+
+			stage["calls"] += 1
+			stage["seconds"] += seconds
+			stage["ownSeconds"] += seconds - nestedSeconds
+			if failed:
+				stage["failures"] += 1
+
+			if profiler is not None:
+				if name in self.profiles:
+					self.profiles[name].add(profiler)
+				else:
+					self.profiles[name] = pstats.Stats(profiler)
+
+			if not failed:
+				for hook in list(self.hooks):
+					hook(name, seconds, dict(self.counters))
+
+
+	#Returns the functions that took the most time in the profile of the stage name as a list of
+	#dictionaries, with the most cumulative time first
+	def getProfileSummary(self, name, numFunctions = PROFILE_REPORT_SIZE):
+		entries = []
+		for (fileName, line, function), (primitiveCalls, calls, ownSeconds, seconds, callers) in self.profiles[name].stats.items():
+			entries.append({"function": "%s:%d(%s)" % (os.path.basename(fileName), line, function),
+				"calls": calls, "ownSeconds": ownSeconds, "seconds": seconds})
+		entries.sort(key = lambda entry: entry["seconds"], reverse = True)
+		return entries[:numFunctions]
+
+
+	#Returns the stage times, the counters and the profiles as a dictionary
+	def getReport(self):
+		report = {"stages": [], "counters": dict(self.counters), "wallSeconds": time.time() - self.createdTime}
+		for name in self.stageOrder:
+			stage = dict(self.stages[name])
+			stage["name"] = name
+			report["stages"].append(stage)
+
+		if self.profiles:
+			report["profiles"] = dict((name, self.getProfileSummary(name)) for name in self.profiles)
+		return report
+
+
+	#Writes getReport() to the file fileName as JSON
+	def saveReport(self, fileName):
+		f = open(fileName, "w")
+		json.dump(self.getReport(), f, indent = 1, sort_keys = True)
+		f.write("\n")
+		f.close()
+
+
+#Marks an Analyzer method as a stage, timed by the Analyzer's Instrumentation under the method's name
+def instrumentedStage(method):
+	@functools.wraps(method)
+	def runInstrumented(self, *args, **kwargs):
+		return self.instrumentation.runStage(method.__name__, method, self, *args, **kwargs)
+	return runInstrumented
+
+
+class DoublingTimesView:
+
+	"""A DoublingTimesView looks up the doubling times of each well label in the rows of a
+	doubling time matrix, like the dictionary returned by Analyzer.findDoublingTimes(), but
+	without making a list of every row. The rows are only read when they are looked up, so
+	the matrix can stay on disk"""
+
+	def __init__(self, labels, doublingMatrix):
+		self.rows = dict((label, n) for n, label in enumerate(labels))
+		self.labels = list(labels)
+		self.doublingMatrix = doublingMatrix
+
+	def __getitem__(self, label):
+		return self.doublingMatrix[self.rows[label]].tolist()
+
+	def __contains__(self, label):
+		return label in self.rows
+
+	def __iter__(self):
+		return iter(self.labels)
+
+	def __len__(self):
+		return len(self.labels)
+
+	def keys(self):
+		return list(self.labels)
+
+	def get(self, label, default = None):
+		if label in self.rows:
+			return self[label]
+		return default
+
+
+class Analyzer:
 	
-	#Return the label of the well
-	def getLabel(self):
-		return self.label
+	"""The Analyzer class loads the data and has methods for analyzing it."""
 	
-	#Return the name of the strain
-	def getStrainName(self):
-		return self.name
+	#The files are not read if the Plate read from them is passed as plate (i.e. from a PlateCache).
+	#The time taken by each stage is kept by instrumentation (a new Instrumentation if it is None)
+	def __init__(self, OD_FILE_NAME, LABEL_FILE_NAME, plate = None, instrumentation = None):
 	
-	#Return the dilution
-	def getDilution(self):
-		return self.dilution
+		self.instrumentation = instrumentation or Instrumentation()
+		self.plate = plate #The Plate holding all of the data, set by load_OD600
+		if plate is None:
+			self.OD600_WELLS, self.timesHrs, self.timesSecs = self.load_OD600(OD_FILE_NAME, LABEL_FILE_NAME)
+		else:
+			self.OD600_WELLS, self.timesHrs, self.timesSecs = plate.getWells(), plate.timesHrs, plate.timesSecs
+		self.instrumentation.setCount("wells", self.plate.getNumWells())
+		self.instrumentation.setCount("timepoints", self.plate.getNumTimepoints())
+		self.doublingTimes = {}
+		self.doublingMatrix = None
+		self.regressionSums = None #Kept by getRegressionSums()
+		self.regressionSumsKey = None
+		self.chunkSize = None #The number of wells worked on at a time, see iterRegressionSums()
+		self.growthFits = None #Set by findGrowthParameters()
+		self.regressionQuality = None #Set by findRegressionQuality()
+		self.bestDoublingTimes = None #Set by findBestDoublingTimes()
+		self.wellSummaries = None #Set by findWellSummaries()
+		self.replicateStatistics = None #Set by findReplicateStatistics()
+		self.smoothing = None #Set by setSmoothing()
+		self.indexWells()
 		
-	#Return the starting_timepoint, the index where the artifact ends
-	def getStartTimepoint(self):
-		return self.starting_timepoint
+		
+	#Builds the lookup tables for the wells:
+	#wellsByLabel, the well for each alphanumeric label
+	#wellsByStrain, the list of wells for each (strain name, dilution)
+	#The dilution is compared as a number, so '0.0020' and 0.002 are the same dilution
+	def indexWells(self):
+		self.wellsByLabel = {}
+		self.wellsByStrain = {}
+		
+		for currWell in self.OD600_WELLS:
+			self.wellsByLabel[currWell.getLabel()] = currWell
+			
+			currKey = (currWell.getStrainName(), dilutionKey(currWell.getDilution()))
+			self.wellsByStrain.setdefault(currKey, []).append(currWell)
 	
-	#Set start_after_drop
-	def setStartTimepoint(self, i):
-		self.starting_timepoint = i	
 	
-	#Set base
-	def setBase(self, base):
-		self.base = float(base)
+	#Returns the well with the given label (i.e. 'A1'). Raises KeyError if there is no such well
+	def getWell(self, well_name):
+		try:
+			return self.wellsByLabel[well_name]
+		except KeyError:
+			raise KeyError("There is no well " + str(well_name))
 	
-	#Get base
-	def getBase(self):
-		return self.base
-		
-	#Get the measurements minus the base
-	def getMeasurementsLessBase(self):
-			
-		baseLessMeasurements = []
-		
-		n = 0
-		while n < len(self.measurements):
-			baseLessMeasurements.append(float(self.measurements[n]) - self.base)
-			n += 1
-		return baseLessMeasurements
-
-class Analyzer:
 	
-	"""The Analyzer class loads the data and has methods for analyzing it."""
+	#Returns the list of wells with the given strain name and dilution, in plate order.
+	#The list is empty if there are no such wells
+	def getWells(self, strain_name, dilution):
+		return list(self.wellsByStrain.get((strain_name, dilutionKey(dilution)), []))
+	
+	
+	#Returns the (strain name, dilution) of every group of wells, sorted
+	def getStrainsAndDilutions(self):
+		return sorted(self.wellsByStrain.keys())
 	
-	def __init__(self, OD_FILE_NAME, LABEL_FILE_NAME):
 	
-		self.OD600_WELLS, self.timesHrs, self.timesSecs = self.load_OD600(OD_FILE_NAME, LABEL_FILE_NAME)
-		self.doublingTimes = {}
-		
-		
 	####################################################################################################################
 	#   This method loads the OD600 values and the well labels. It then constructs individual Well classes for each well
 	#   Since this data is read from file, the formatting needs to be correct. 
 	#
 	#
 	#   For the data file that has the OD600 file, it should be TAB DELIMITED. It should also be a copy of the OD600
-	#   Section of the TECAN data file. For example:
+	#   Section of the TECAN data file. Plates with 6, 24, 96, 384 or 1536 wells can be read. For example:
 	#
 	#	OD600
 	#	Cycle Nr.		1		2		3		.....
@@ -131,7 +1682,7 @@ class Analyzer:
 	#
 	#
 	#   For the data file that has the labels for the different wells, it needs to be hand made, but should be formatted 
-	#   as such:
+	#   as such (the wells are matched up by their labels, so they can be in any order):
 	#
 	#	A1		[Strain Name]		[Dilution]
 	#	A2		[Strain Name]		[Dilution]
@@ -142,71 +1693,27 @@ class Analyzer:
 	#	H12 	[Strain Name]		{Dilution]
 	#
 	#
-	#   The method returns 3 lists:
-	#   Wells, a list of the wells with their corresponding measurements/data
-	#   Hours, a list of the measurement times converted into hours
-	#   Seconds a list of the measurement times in seconds
+	#   The data is kept in a Plate (self.plate). The method returns:
+	#   Wells, a list of the wells, each a view of its row of the plate
+	#   Hours, an array of the measurement times converted into hours
+	#   Seconds an array of the measurement times in seconds
+	#
+	#   With partial = True the export may still be being written, see readODExport()
 	####################################################################################################################
 	
-	def load_OD600(self, OD600s, labels):
-		Wells = [] #a list of Wells
-		Hours = [] #A list of floats
-		Seconds = [] #A list of floats
-		
-		
-		#Open the file of OD600 data
-		fileOD600 = open(OD600s)
-		
-		fileOD600.readline() #Skip the first line, it's just the 'OD600' label
-		fileOD600.readline() #Skip the second line, it's just the cycle numbers
-		
-		#Read the next line which has the timepoints in seconds. Add that to Seconds and also convert the times
-		#into hours and add them to Hours
-		
-		timePointsInSeconds = fileOD600.readline().split("\t")
-		
-		n = 1 #We start at index = 1 (i.e. the second) token in this line because the first one is just the string label 'Times [s]'
-		while n < len(timePointsInSeconds):
-			currTimePointSeconds = float(timePointsInSeconds[n])
-			currTimePointHours = float(currTimePointSeconds/3600)
-			
-			Hours.append(currTimePointHours)
-			Seconds.append(currTimePointSeconds)
-			
-			n+=1
-		
-		fileOD600.readline() #Skip the next line because it is just the temperatures
-		
-		#Open the file of well label annotations. NOTE: THE WELLS SHOULD BE SORTED FROM A1 TO H12. THAT WAY IT MATCHES THE OD600 DATA ORDER
-		fileLabels = open(labels)
-		
+	@instrumentedStage
+	def load_OD600(self, OD600s, labels, partial = False):
 		
-		#Read each well and create a new Well for each one and add it to the Wells list
-		n = 0
-		while n < 96:
-			currOD600Line = fileOD600.readline() #Read each line
-			currLabelLine = fileLabels.readline() 
-			
-			currOD600Tokens = currOD600Line.split("\t")
-			currLabelTokens = currLabelLine.split("\t")
-			
-			currLabel = currOD600Tokens[0]
-			currMeasurements = currOD600Tokens[1:len(currOD600Tokens)]
-			currStrainName = currLabelTokens[1]
-			currDilution = currLabelTokens[2]
-			
-			currWell = Well(currLabel, currMeasurements, currStrainName, currDilution)
-			Wells.append(currWell)
-			
-			n +=1
-			
+		#Read the OD600 data, the measurements come back as one float array in file order
+		WellLabels, Measurements, Seconds, Temperatures = readODExport(OD600s, 0, partial)
 		
-		#close the files
-		fileOD600.close()
-		fileLabels.close()
+		#Read the well label annotations and look up the strain name and dilution of each well by its label
+		StrainNames, Dilutions = lookUpWellLabels(WellLabels, labels)
 		
+		#Put everything into one Plate and make a Well for each row
+		self.plate = Plate(WellLabels, Measurements, Seconds, StrainNames, Dilutions, Temperatures)
 		
-		return Wells, Hours, Seconds
+		return self.plate.getWells(), self.plate.timesHrs, self.plate.timesSecs
 	
 	
 	
@@ -216,18 +1723,8 @@ class Analyzer:
 	#X axis will be hours
 	def plotWell(self, well_name, start = -1, end = -1):
 		
-		#First, search through the wells and find the specified well 
-		currWell = None
-		n = 0
-		while n < len(self.OD600_WELLS):
-			
-			possibleWell = self.OD600_WELLS[n]
-			 
-			if possibleWell.getLabel() == well_name:
-				currWell = possibleWell
-				n = len(self.OD600_WELLS)
-			else:
-				n +=1
+		#First, find the specified well 
+		currWell = self.getWell(well_name)
 		
 		#now get the measurements to be plotted
 		dataToBePlotted = currWell.getMeasurements(start,end) #The exception case where start and end are not specified is handled by the getMeasurements method
@@ -243,6 +1740,7 @@ class Analyzer:
 		
 		
 		#Finally, plot it
+		mplot = getPyplot()
 		mplot.plot(xAxisValues,dataToBePlotted)
 	
 	
@@ -263,8 +1761,10 @@ class Analyzer:
 	# In the event that no such file exists, it will read the corresponding name and index,
 	# find the corresponding well and define it with the index.
 	# 
-	# If there is no file, it calls createStartTimepoints() to build the list.
-	def loadStartTimepoints(self,fileName):
+	# If there is no file, it calls createStartTimepoints() to build the list. With interactive = False
+	# the list is built without asking the user, see createStartTimepoints()
+	@instrumentedStage
+	def loadStartTimepoints(self,fileName, interactive = True, minDrop = DROP_MIN_MAGNITUDE):
 		
 		try:
 			file = open(fileName)
@@ -274,22 +1774,16 @@ class Analyzer:
 				currWellName = currLineEntries[0]
 				currIndex = int(currLineEntries[1])
 				
-				#Now loop through the list of wells, find the right well, and assign its index
-				n = 0
-				while n < len(self.OD600_WELLS):
-					currWell = self.OD600_WELLS[n]
-					
-					if currWell.getLabel() == currWellName:
-						currWell.setStartTimepoint(currIndex)
-						n = len(self.OD600_WELLS)
-					
-					n += 1
+				#Now find the right well and assign its index. Wells that are not on this plate are skipped
+				currWell = self.wellsByLabel.get(currWellName)
+				if currWell is not None:
+					currWell.setStartTimepoint(currIndex)
 				
 			print "Indeces read and loaded from file ", fileName	
 				
 		except IOError:
 			print "Failure to load file. Creating new one"
-			self.createStartTimepoints(fileName)
+			self.createStartTimepoints(fileName, interactive, minDrop)
 	
 	
 	
@@ -305,15 +1799,27 @@ class Analyzer:
 	# data which is printed to the console
 	#
 	# User input controls the decision. At the end, the data is written to the file 'fileName'
-	def createStartTimepoints(self, fileName):
+	#
+	# With interactive = False nothing is plotted and the user is not asked. The guess is
+	# accepted for every well at once (see findDropStarts()), but only when the OD falls by at
+	# least minDrop right after the peak. Otherwise the starting timepoint is 0
+	#
+	# In headless mode (see setHeadless()) only interactive = False can be used
+	def createStartTimepoints(self, fileName, interactive = True, minDrop = DROP_MIN_MAGNITUDE):
 		
 		#These determine the window of values to be plotted. 0 means beginning.
 		startTimepoint = 0
 		endTimepoint = 100
 		
+		if not interactive:
+			self.findStartTimepoints(startTimepoint, endTimepoint, minDrop)
+			self.saveStartTimepoints(fileName)
+			return
+		
 		
 		#First, loop through the wells and plot each well, asking for user input
 		#about how to set the beginning timepoint
+		mplot = getPyplot()
 		n = 0
 		while n < len(self.OD600_WELLS):
 			
@@ -325,8 +1831,8 @@ class Analyzer:
 		
 			#get the maximum OD in this range as well as the timepoint at which it 
 			#occurs
-			maxOD = max(currODVals)
-			maxTimepoint = currODVals.index(maxOD)
+			maxTimepoint = int(numpy.argmax(currODVals))
+			maxOD = currODVals[maxTimepoint]
 			
 			#Print out the range of values, adding a marker to show the max
 			i = 0
@@ -396,19 +1902,26 @@ class Analyzer:
 			
 		
 		
-		n = 0
-		
+		self.saveStartTimepoints(fileName)
+	
+	
+	# Sets the starting timepoint of every well without asking the user, using the same guess as
+	# createStartTimepoints() on the measurements from startTimepoint to endTimepoint.
+	# See findDropStarts() for how minDrop is used
+	@instrumentedStage
+	def findStartTimepoints(self, startTimepoint = 0, endTimepoint = 100, minDrop = DROP_MIN_MAGNITUDE):
+		self.plate.startTimepoints[:] = findDropStarts(self.plate.measurements, startTimepoint, endTimepoint, minDrop)
+		print "Starting timepoints found for ", self.plate.getNumWells(), " wells"
+	
+	
+	# Writes the starting timepoint of every well to the file 'fileName' in the format read
+	# by loadStartTimepoints()
+	def saveStartTimepoints(self, fileName):
+		lines = [label + "\t" + str(start) + "\n" for label, start in zip(self.plate.labels, self.plate.startTimepoints.tolist())]
 		
-		while n < len(self.OD600_WELLS):
-			currWell = self.OD600_WELLS[n]
-			#Now save it to the file by appending it
-			f = open(fileName, 'a')
-			
-			f.write(currWell.getLabel() + "\t")
-			f.write(str(currWell.getStartTimepoint()))
-			f.write("\n")
-			f.close()
-			n +=1
+		f = open(fileName, 'w')
+		f.write("".join(lines))
+		f.close()
 			
 	
 	
@@ -417,116 +1930,477 @@ class Analyzer:
 	# The base is defined as the minimum of the first 10 values
 	# From the starting timepoint. The starting timepoint is 
 	# got by calling the Well object's getStartTimepoint() method.
-	def findBase(self):
+	#
+	# The bases of all of the wells are found at once by findBases(). estimator can also be
+	# 'percentile' or 'trimmedMean' (see BASE_ESTIMATORS), with percentile and trimFraction
+	@instrumentedStage
+	def findBase(self, estimator = "min", percentile = BASE_PERCENTILE, trimFraction = BASE_TRIM_FRACTION):
 		
-		n = 0
-		while n < len(self.OD600_WELLS):
-			currWell = self.OD600_WELLS[n]
-			
-			currStartTimepoint = currWell.getStartTimepoint()
-			currEndTimepoint = currStartTimepoint + 10 
-			
-			currWellVals = currWell.getMeasurements(currStartTimepoint, currEndTimepoint)
-
-			currWell.setBase(min(currWellVals))
-			print currWell.getLabel(), " Starting index is: ",currStartTimepoint, " base is: ", currWell.getBase()
-			n +=1 
+		self.plate.bases[:] = findBases(self.plate.measurements, self.plate.startTimepoints, BASE_NUM_POINTS, estimator, percentile, trimFraction)
+		
+		formattedBases = formatFloats(self.plate.bases).split("\t")
+		lines = [label + "  Starting index is:  " + str(start) + "  base is:  " + base + "\n"
+			for label, start, base in zip(self.plate.labels, self.plate.startTimepoints.tolist(), formattedBases)]
+		sys.stdout.write("".join(lines))
 		
 	
 
 	# This method finds all of the doubling times for each well using a specified windowSize
 	# The results will be returned as a dictionary with the key being the alphanumeric
-	# label of the well and the entry being a list of doubling times. 
+	# label of the well and the entry being a list of doubling times.
 	# The list will have all of the doubling times from timepoint 0.
 	# This includes artifactual timepoints with the spike at the beginning involved which can later be excluded
+	#
+	# The log transformed measurements of all the wells are put into one 2-D array and the
+	# regressions of every window of every well are done together by RegressionSums.
+	# If self.chunkSize is set, this is done for that many wells at a time instead (see iterRegressionSums())
+	@instrumentedStage
 	def findDoublingTimes(self, windowSize):
+		return self.setDoublingTimes(self.findDoublingMatrix(windowSize))
+
+
+	# Returns the doubling times of every window of every well as an array with one row per well
+	# and one column per window, without setting them (see findDoublingTimes())
+	def findDoublingMatrix(self, windowSize):
+
+		#Now we calculate the doubling rate in every sliding window of every well at once
+		doublingMatrix = self.newResultMatrix("doublings_%d" % windowSize, max(self.plate.getNumTimepoints() - windowSize, 0))
+		for firstWell, endWell, regressionSums in self.iterRegressionSums():
+			doublingMatrix[firstWell:endWell] = doublingTimesFromSlopes(regressionSums.regress(windowSize)[0])
+		self.instrumentation.count("windows", doublingMatrix.size)
+
+		return doublingMatrix
+	
+	
+	# This method finds the slopes of the log2 measurements for several window sizes at once.
+	# All of them are read off the same RegressionSums and the log2 measurements are only
+	# worked out once. Each window size then sums the blocks of its own length once (see
+	# RegressionSums) and reads every window off them, which keeps every size as accurate
+	# as linregress. The results are returned as a dictionary with the window size
+	# as the key and the slopes (an array with one row per well and one column per window, as in
+	# findDoublingTimes) as the entry. doublingTimesFromSlopes() turns them into doubling times.
+	@instrumentedStage
+	def findSlopesForWindowSizes(self, windowSizes):
+		slopes = {}
+		for windowSize in windowSizes:
+			slopes[windowSize] = self.newResultMatrix("sweep_slopes_%d" % windowSize, max(self.plate.getNumTimepoints() - windowSize, 0))
+		
+		for firstWell, endWell, regressionSums in self.iterRegressionSums():
+			for windowSize in windowSizes:
+				slopes[windowSize][firstWell:endWell] = regressionSums.regress(windowSize)[0]
+		
+		for windowSize in windowSizes:
+			self.instrumentation.count("windows", slopes[windowSize].size)
+		return slopes
+	
+	
+	# This method finds how well the line fits in every window of windowSize timepoints of every
+	# well, along with its slope, all at once like findDoublingTimes(). The results are returned as
+	# a dictionary of arrays with one row per well and one column per window:
+	# slopes, intercepts		of the log2 measurements against the hours
+	# rSquared		the square of the correlation coefficient
+	# stderrs		the standard error of the slope
+	# residualStds		the standard deviation of the residuals
+	# pValues		the p-value of the slope (only with pValues = True, which imports scipy)
+	# and windowSize, and sumsKey, the getRegressionSumsKey() they were found with. They are also kept
+	# as self.regressionQuality
+	@instrumentedStage
+	def findRegressionQuality(self, windowSize, pValues = False):
+		numWindows = max(self.plate.getNumTimepoints() - windowSize, 0)
+		names = ["slopes", "intercepts", "rSquared", "stderrs", "residualStds"]
+		if pValues:
+			names.append("pValues")
+		
+		quality = {"windowSize": windowSize, "sumsKey": self.getRegressionSumsKey()}
+		for name in names:
+			quality[name] = self.newResultMatrix("quality_%s_%d" % (name, windowSize), numWindows)
+		
+		for firstWell, endWell, regressionSums in self.iterRegressionSums():
+			slopes, intercepts, rs, stderrs, residualStds = regressionSums.regressWithResiduals(windowSize)
+			quality["slopes"][firstWell:endWell] = slopes
+			quality["intercepts"][firstWell:endWell] = intercepts
+			quality["rSquared"][firstWell:endWell] = rs * rs
+			quality["stderrs"][firstWell:endWell] = stderrs
+			quality["residualStds"][firstWell:endWell] = residualStds
+			if pValues:
+				quality["pValues"][firstWell:endWell] = regressionPValues(rs, windowSize)
+		
+		self.instrumentation.count("windows", quality["slopes"].size)
+		self.regressionQuality = quality
+		return quality
+	
+	
+	# This method picks the window of windowSize timepoints with the steepest rise of every well,
+	# out of the windows that start at least windowsAfterStart timepoints after the starting
+	# timepoint and fit a line with an R squared of at least minRSquared (and a p-value of at most
+	# maxPValue, if it is given). See filterWindows(). This is the estimate of the doubling time
+	# during exponential growth.
+	#
+	# Returns the window of every well (-1 if none passed) and its doubling time (NaN if none
+	# passed), which are also kept as self.bestDoublingTimes with the windowSize, sumsKey and the
+	# parameters. The regression quality is found again unless self.regressionQuality is current (see isCurrent())
+	@instrumentedStage
+	def findBestDoublingTimes(self, windowSize, minRSquared = BEST_WINDOW_MIN_R_SQUARED, windowsAfterStart = 0, maxPValue = None):
+		quality = self.regressionQuality
+		if not self.isCurrent(quality, windowSize) or (maxPValue is not None and "pValues" not in quality):
+			quality = self.findRegressionQuality(windowSize, maxPValue is not None)
+		
+		passed = filterWindows(quality, self.plate.startTimepoints, minRSquared, 1, windowsAfterStart, maxPValue)
+		bestWindows = findSteepestWindows(quality["slopes"], passed)
+		
+		doublings = numpy.zeros(len(bestWindows)) + numpy.nan
+		found = bestWindows >= 0
+		doublings[found] = 1 / quality["slopes"][numpy.flatnonzero(found), bestWindows[found]]
+		
+		self.bestDoublingTimes = {"windowSize": windowSize, "sumsKey": quality["sumsKey"], "minRSquared": minRSquared,
+			"windowsAfterStart": windowsAfterStart, "maxPValue": maxPValue, "windows": bestWindows, "doublingTimes": doublings}
+		return bestWindows, doublings
+	
+	
+	# This method reduces the doubling times of every well to a few numbers, all at once:
+	# minDoublingTimes		the doubling time of the window picked by findBestDoublingTimes() (hours)
+	# maxGrowthRates		1 / minDoublingTimes (doublings per hour)
+	# bestWindows, windowStartHrs		that window and the time it starts at
+	# rSquared		its R squared
+	# lags		how long after the starting timepoint the line through that window reaches
+	#			SUMMARY_LAG_FRACTION of the largest OD less the base of the well, in hours. 0 if the line
+	#			is already above it by then. The OD the well started at can not be used, as the base is
+	#			found from those same measurements and they are at the level of the noise once it is taken off
+	# thresholdHrs		the time at which the OD less the base first reaches threshold, from the
+	#			starting timepoint on (hours)
+	# All of the times except the lag are counted from the first measurement. Wells without a window
+	# that passes get NaN, and -1 as their window. The arrays are returned as a dictionary, with
+	# windowSize and threshold, and kept as self.wellSummaries. The windows and regression quality kept
+	# by findBestDoublingTimes() are used if they are current and were picked with the same parameters,
+	# so that only the threshold changing does not pick them again
+	@instrumentedStage
+	def findWellSummaries(self, windowSize, threshold = SUMMARY_OD_THRESHOLD, minRSquared = BEST_WINDOW_MIN_R_SQUARED, windowsAfterStart = 0):
+		best = self.bestDoublingTimes
+		if (self.isCurrent(best, windowSize) and self.isCurrent(self.regressionQuality, windowSize) and best["minRSquared"] == minRSquared
+				and best["windowsAfterStart"] == windowsAfterStart and best["maxPValue"] is None):
+			bestWindows, doublings = best["windows"], best["doublingTimes"]
+		else:
+			bestWindows, doublings = self.findBestDoublingTimes(windowSize, minRSquared, windowsAfterStart)
+		quality = self.regressionQuality
+		numWells = self.plate.getNumWells()
+		found = numpy.flatnonzero(bestWindows >= 0)
+		starts = numpy.maximum(self.plate.startTimepoints, 0)
+		
+		summaries = {"windowSize": windowSize, "sumsKey": quality["sumsKey"], "threshold": threshold, "bestWindows": bestWindows,
+			"minDoublingTimes": doublings}
+		for name in ("maxGrowthRates", "windowStartHrs", "rSquared", "lags", "thresholdHrs"):
+			summaries[name] = numpy.zeros(numWells) + numpy.nan
+		
+		summaries["maxGrowthRates"][found] = 1 / doublings[found]
+		summaries["windowStartHrs"][found] = self.timesHrs[bestWindows[found]]
+		summaries["rSquared"][found] = quality["rSquared"][found, bestWindows[found]]
+		
+		#The first time the OD less the base reaches the threshold and the largest OD less the base,
+		#from the starting timepoint on, a chunk of wells at a time
+		maxLevels = numpy.zeros(numWells) + numpy.nan
+		chunkSize = self.chunkSize or numWells
+		for firstWell in range(0, numWells, max(chunkSize, 1)):
+			endWell = min(firstWell + chunkSize, numWells)
+			lessBase = numpy.subtract(self.plate.measurements[firstWell:endWell], self.plate.bases[firstWell:endWell, numpy.newaxis], dtype = float)
+			afterStart = numpy.arange(self.plate.getNumTimepoints()) >= starts[firstWell:endWell, numpy.newaxis]
+			with numpy.errstate(invalid = "ignore"):
+				reached = (lessBase >= threshold) & afterStart
+			if reached.shape[1] == 0:
+				continue
+			firstReached = numpy.argmax(reached, axis = 1)
+			hasReached = reached.any(axis = 1)
+			summaries["thresholdHrs"][firstWell:endWell][hasReached] = self.timesHrs[firstReached[hasReached]]
+			
+			lessBase[~afterStart | numpy.isnan(lessBase)] = -numpy.inf
+			maxLevels[firstWell:endWell] = lessBase.max(axis = 1)
+		
+		#The lag, where the line through the best window meets the log2 of SUMMARY_LAG_FRACTION of the largest OD
+		if len(found) > 0:
+			with numpy.errstate(divide = "ignore", invalid = "ignore"):
+				lagLevels = numpy.log2(maxLevels[found] * SUMMARY_LAG_FRACTION)
+				crossings = (lagLevels - quality["intercepts"][found, bestWindows[found]]) / quality["slopes"][found, bestWindows[found]]
+				lags = numpy.maximum(crossings - self.timesHrs[starts[found]], 0.0)
+			lags[~numpy.isfinite(crossings)] = numpy.nan
+			summaries["lags"][found] = lags
+		
+		self.wellSummaries = summaries
+		return summaries
+	
+	
+	# Writes the summaries found by findWellSummaries() to the file fileName, tab delimited, with one line per well:
+	# Well		Strain		Dilution		First Timepoint After Artifact		Min Doubling Time (hrs)		Max Growth Rate (doublings/hr)	...
+	@instrumentedStage
+	def saveWellSummaries(self, fileName):
+		summaries = self.wellSummaries
+		headings = ["Well", "Strain", "Dilution", "First Timepoint After Artifact", "Min Doubling Time (hrs)", "Max Growth Rate (doublings/hr)",
+			"Best Window (size %d)" % summaries["windowSize"], "Best Window Start (hrs)", "Best Window R Squared", "Lag (hrs)",
+			"Time to OD %s above Base (hrs)" % summaries["threshold"]]
+		numbers = numpy.column_stack([summaries[name] for name in ("minDoublingTimes", "maxGrowthRates")])
+		moreNumbers = numpy.column_stack([summaries[name] for name in ("windowStartHrs", "rSquared", "lags", "thresholdHrs")])
+		
+		lines = ["\t".join(headings) + "\n"]
+		startTimepoints = self.plate.startTimepoints.tolist()
+		bestWindows = summaries["bestWindows"].tolist()
+		for wellIndex in range(self.plate.getNumWells()):
+			line = self.plate.labels[wellIndex] + "\t" + self.plate.strainNames[wellIndex] + "\t" + str(float(self.plate.dilutions[wellIndex])) + "\t"
+			line += str(startTimepoints[wellIndex]) + "\t" + formatFloats(numbers[wellIndex]) + "\t" + str(bestWindows[wellIndex]) + "\t"
+			lines.append(line + formatFloats(moreNumbers[wellIndex]) + "\n")
+		
+		f = open(fileName, "w")
+		f.write("".join(lines))
+		f.close()
+	
+	
+	# This method groups the replicate wells by (strain name, dilution), as getStrainsAndDilutions() does, and
+	# finds for every group:
+	# curveMeans, curveMedians		the mean and median doubling time of each window (groups x windows)
+	# curveLows, curveHighs		the bootstrap confidence interval of the mean of each window
+	# metricMeans, metricMedians, metricLows, metricHighs		the same for each of the summaries of
+	#			findWellSummaries() named in metricNames (groups x metrics), if it has been called
+	# Only windows from the starting timepoint of a well on with a positive doubling time count, and
+	# the replicates are resampled numSamples times for each group (see bootstrapGroups(), which spreads
+	# the groups over numWorkers processes). The results are returned as a dictionary, with the groups,
+	# their numbers of replicates and the confidence, and kept as self.replicateStatistics
+	@instrumentedStage
+	def findReplicateStatistics(self, numSamples = BOOTSTRAP_SAMPLES, confidence = BOOTSTRAP_CONFIDENCE, numWorkers = 1, seed = 0):
+		doublingMatrix = self.getDoublingMatrix()
+		numWindows = doublingMatrix.shape[1]
+		groups = self.getStrainsAndDilutions()
+		groupIndices = [numpy.array([currWell.index for currWell in self.wellsByStrain[group]]) for group in groups]
+		
+		metricNames = []
+		metrics = numpy.zeros((self.plate.getNumWells(), 0))
+		if self.wellSummaries is not None:
+			metricNames = ["minDoublingTimes", "maxGrowthRates", "lags", "thresholdHrs"]
+			metrics = numpy.column_stack([self.wellSummaries[name] for name in metricNames])
+		
+		groupValues = []
+		for indices in groupIndices:
+			curves = doublingMatrix[indices]
+			with numpy.errstate(invalid = "ignore"):
+				usable = numpy.isfinite(curves) & (curves > 0) & (numpy.arange(numWindows) >= self.plate.startTimepoints[indices, numpy.newaxis])
+			groupValues.append(numpy.hstack((numpy.where(usable, curves, numpy.nan), metrics[indices])))
+		
+		self.instrumentation.count("bootstrapResamples", numSamples * len(groups))
+		results = bootstrapGroups(groupValues, numSamples, confidence, seed, numWorkers)
+		
+		statistics = {"groups": groups, "numReplicates": numpy.array([len(indices) for indices in groupIndices]),
+			"confidence": confidence, "numSamples": numSamples, "metricNames": metricNames}
+		for statisticIndex, name in enumerate(("Means", "Medians", "Lows", "Highs")):
+			combined = numpy.array([result[statisticIndex] for result in results]).reshape(len(groups), numWindows + len(metricNames))
+			statistics["curve" + name] = combined[:, :numWindows]
+			statistics["metric" + name] = combined[:, numWindows:]
+		
+		self.replicateStatistics = statistics
+		return statistics
+	
+	
+	# Writes the statistics of each group of replicates for the summaries of the wells, found by
+	# findReplicateStatistics(), to the file fileName, tab delimited, with one line per group:
+	# Strain		Dilution		Replicates		Min Doubling Time (hrs) Mean		... Median		... CI Low		... CI High		...
+	@instrumentedStage
+	def saveReplicateStatistics(self, fileName):
+		statistics = self.replicateStatistics
+		metricHeadings = {"minDoublingTimes": "Min Doubling Time (hrs)", "maxGrowthRates": "Max Growth Rate (doublings/hr)",
+			"lags": "Lag (hrs)", "thresholdHrs": "Time to Threshold (hrs)"}
+		intervalName = "%g%% CI" % (100 * statistics["confidence"])
+		
+		headings = ["Strain", "Dilution", "Replicates"]
+		for name in statistics["metricNames"]:
+			headings += [metricHeadings[name] + suffix for suffix in (" Mean", " Median", " " + intervalName + " Low", " " + intervalName + " High")]
+		
+		values = numpy.dstack([statistics[name] for name in ("metricMeans", "metricMedians", "metricLows", "metricHighs")])
+		values = values.reshape(len(statistics["groups"]), -1)
+		
+		lines = ["\t".join(headings) + "\n"]
+		for groupIndex, (strainName, dilution) in enumerate(statistics["groups"]):
+			line = strainName + "\t" + str(dilution) + "\t" + str(statistics["numReplicates"][groupIndex])
+			if values.shape[1] > 0:
+				line += "\t" + formatFloats(values[groupIndex])
+			lines.append(line + "\n")
+		
+		f = open(fileName, "w")
+		f.write("".join(lines))
+		f.close()
+	
+	
+	# Writes the doubling time curves of each group of replicates, found by findReplicateStatistics(), to
+	# the file fileName, tab delimited, with the windows as in saveToFile() and four lines per group:
+	# Strain		Dilution		Replicates		Statistic (Mean, Median, CI Low or CI High)		[interval 1 (hrs)]		[interval 2 (hrs)]	...
+	@instrumentedStage
+	def saveReplicateCurves(self, fileName, windowSize):
+		statistics = self.replicateStatistics
+		numWindows = statistics["curveMeans"].shape[1]
+		intervalName = "%g%% CI" % (100 * statistics["confidence"])
+		
+		intervalStarts = formatFloats(self.timesHrs[:numWindows]).split("\t")
+		intervalEnds = formatFloats(self.timesHrs[windowSize:(windowSize + numWindows)]).split("\t")
+		heading = "Strain\tDilution\tReplicates\tStatistic"
+		if numWindows > 0:
+			heading += "".join(["\t" + start + " - " + end for start, end in zip(intervalStarts, intervalEnds)])
+		lines = [heading + "\n"]
+		for groupIndex, (strainName, dilution) in enumerate(statistics["groups"]):
+			groupStart = strainName + "\t" + str(dilution) + "\t" + str(statistics["numReplicates"][groupIndex]) + "\t"
+			for name, statisticName in (("curveMeans", "Mean"), ("curveMedians", "Median"), ("curveLows", intervalName + " Low"), ("curveHighs", intervalName + " High")):
+				line = groupStart + statisticName
+				if numWindows > 0:
+					line += "\t" + formatFloats(statistics[name][groupIndex])
+				lines.append(line + "\n")
+		
+		f = open(fileName, "w")
+		f.write("".join(lines))
+		f.close()
+	
+	
+	# Goes through the wells self.chunkSize at a time, giving the first well, the end of the chunk
+	# and the RegressionSums of the wells in between each time. Only one chunk is kept in memory at
+	# a time. If self.chunkSize is None all of the wells are one chunk, with getRegressionSums()
+	def iterRegressionSums(self):
+		numWells = self.plate.getNumWells()
+		if self.chunkSize is None:
+			yield 0, numWells, self.getRegressionSums()
+			return
+		
+		for firstWell in range(0, numWells, self.chunkSize):
+			endWell = min(firstWell + self.chunkSize, numWells)
+			yield firstWell, endWell, RegressionSums(self.timesHrs, self.getLogMeasurements(firstWell, endWell))
+	
+	
+	# Returns an array for results with one row per well and numColumns columns. For a plate kept
+	# on disk (see openMemmapPlate()) it is kept on disk as well, in the file <name>.npy next to the plate
+	def newResultMatrix(self, name, numColumns):
+		shape = (self.plate.getNumWells(), numColumns)
+		if self.plate.directory is None or shape[0] * shape[1] == 0:
+			return numpy.empty(shape)
+		return numpy.lib.format.open_memmap(os.path.join(self.plate.directory, name + ".npy"), mode = "w+", dtype = float, shape = shape)
+	
+	
+	# Makes the doubling times smooth the measurements less the base of every well with the method (one of
+	# SMOOTHING_METHODS) and width (in timepoints) before the log transform (see smoothMeasurements()).
+	# With method = None they are not smoothed, as by default. Raises ValueError for an unknown method or
+	# a width that does not fit it
+	def setSmoothing(self, method, width = None, polyorder = SMOOTHING_POLYORDER):
+		if method is None:
+			self.smoothing = None
+			return
+		smoothMeasurements(numpy.zeros((1, 0)), method, width, polyorder)
+		self.smoothing = (method, width, polyorder)
+	
+	
+	# Returns the RegressionSums of the log2 measurements (see getLogMeasurements()). They are
+	# kept and used again until the bases, the smoothing or the number of timepoints change
+	@instrumentedStage
+	def getRegressionSums(self):
+		currKey = self.getRegressionSumsKey()
+		
+		if self.regressionSumsKey != currKey:
+			self.regressionSums = RegressionSums(self.timesHrs, self.getLogMeasurements())
+			self.regressionSumsKey = currKey
+		return self.regressionSums
+	
+	
+	# Returns what the RegressionSums depend on, to tell whether the ones kept by getRegressionSums() can still be used
+	def getRegressionSumsKey(self):
+		return (self.plate.getNumTimepoints(), self.plate.bases.tobytes(), self.plate.startTimepoints.tobytes(), self.smoothing)
+	
+	
+	# Returns True if results (i.e. self.regressionQuality, self.bestDoublingTimes or self.wellSummaries) were
+	# found for windowSize from the bases, starting timepoints and smoothing the Analyzer has now
+	def isCurrent(self, results, windowSize):
+		return results is not None and results["windowSize"] == windowSize and results["sumsKey"] == self.getRegressionSumsKey()
+	
+	
+	# Returns the log2 measurements less the base of every well, with one row per well and one
+	# column per timepoint. The measurements less the base are smoothed first if setSmoothing() has
+	# been called. Measurements that are <= 0 once the base is taken off are replaced,
+	# and counted as replacedMeasurements by the Instrumentation. Only the wells from firstWell up to
+	# endWell are included if they are given
+	def getLogMeasurements(self, firstWell = 0, endWell = None):
+		if endWell is None:
+			endWell = self.plate.getNumWells()
+		
+		#The measurements less the base may contain negative values. This poses a problem when we
+		#want to log transform the data because a log transform of a number <= 0 results in either
+		#NaN or -inf, both of which will make our linear regressions problematic.
+		#
+		#The solution is to find the 0 or negative values, and replace them. If such a value is at
+		#timepoint 0, we replace it with 0.000000001, or 10E-9, a close enough approximation of 0.
+		#If the value occurs in the middle of the list, (timepoint > 0), then the measurement at
+		#timepoint n is equal to the measurement at timepoint n-1. logLessBase() does this for all
+		#of the wells at once
+		logMeasurements, filled, numReplaced = logLessBase(self.plate.measurements[firstWell:endWell], self.plate.bases[firstWell:endWell],
+			smoothing = self.smoothing)
+		self.instrumentation.count("replacedMeasurements", numReplaced)
+		return logMeasurements
+	
+	
+	#Sets the doubling times from an array with one row per well and one column per window
+	#(i.e. as calculated by findDoublingTimes). It is kept as self.doublingMatrix, and the
+	#dictionary of doubling times for each well label is built from it and returned.
+	#If self.chunkSize is set, a DoublingTimesView of the matrix is used instead of the dictionary
+	def setDoublingTimes(self, doublingMatrix):
+		if self.chunkSize is not None:
+			self.doublingMatrix = doublingMatrix
+			self.doublingTimes = DoublingTimesView(self.plate.labels, doublingMatrix)
+			return self.doublingTimes
+		
 		doublings = {}
 		
+		#Now that we have the doublings associated with each well, add them to the dictionary
 		wellIndex = 0
 		while wellIndex < len(self.OD600_WELLS):
+			currLabel = self.OD600_WELLS[wellIndex].getLabel()
+			doublings[currLabel] = doublingMatrix[wellIndex].tolist()
+			wellIndex += 1
+
+		self.doublingMatrix = doublingMatrix
+		self.doublingTimes = doublings
+		return doublings
+	
+
+	# This method fits a growth model (one of GROWTH_MODELS) to the measurements less the base of
+	# every well from its starting timepoint on, see fitGrowthCurves(). The times are counted from
+	# the starting timepoint, so the lag is the time from the end of the artifact until growth.
+	# The wells are fitted FIT_CHUNK_WELLS (or self.chunkSize) at a time.
+	# The results are kept as self.growthFits and returned, a dictionary with the model and the
+	# arrays capacities, maxRates, lags, residuals and converged (one entry per well)
+	@instrumentedStage
+	def findGrowthParameters(self, model = "logistic"):
+		numWells = self.plate.getNumWells()
+		chunkSize = self.chunkSize or FIT_CHUNK_WELLS
+		starts = numpy.maximum(self.plate.startTimepoints, 0)
+		
+		fits = {"model": model, "capacities": numpy.empty(numWells), "maxRates": numpy.empty(numWells), "lags": numpy.empty(numWells),
+			"residuals": numpy.empty(numWells), "converged": numpy.zeros(numWells, dtype = bool)}
+		
+		for firstWell in range(0, numWells, chunkSize):
+			endWell = min(firstWell + chunkSize, numWells)
+			currStarts = starts[firstWell:endWell, numpy.newaxis]
 			
-			currDoublings = []
-			
-			currWell = self.OD600_WELLS[wellIndex]
-			
-			
-			#Get the measurements for this well MINUS THE BASE
-			currMeasurements = currWell.getMeasurementsLessBase()
-			
-			#The problem with currMeasurements, though, is that it may contain negative values.
-			#This poses a problem when we want to log transform the data because a log transform of
-			#a number <= 0 results in either NaN or -inf, both of which will make our linear regressions
-			#problematic (infinite loop). 
-			#
-			#The solution is to go through the list, find the 0 or negative values, and replace them
-			#If such a value is at timepoint 0, we replace it with 0.000000001, or 10E-9, a close enough
-			#approximation of 0. If the value occurs in the middle of the list, (timepoint > 0), then the
-			#the measurement at timepoint n is equal to the measurement at timepoint n-1.
-			adjustedMeasurements = []
-			
+			lessBase = numpy.subtract(self.plate.measurements[firstWell:endWell], self.plate.bases[firstWell:endWell, numpy.newaxis], dtype = float)
+			lessBase[numpy.arange(self.plate.getNumTimepoints()) < currStarts] = numpy.nan
 			
-			#First, test if the first measurement is <= 0, if so, replace it with 10E-9
-			firstMeasurement = currMeasurements[0]
-			if firstMeasurement <= 0:
-				adjustedMeasurements.append(0.000000001)
+			if self.plate.getNumTimepoints() > 0:
+				times = self.timesHrs - self.timesHrs[numpy.minimum(currStarts, self.plate.getNumTimepoints() - 1)]
 			else:
-				adjustedMeasurements.append(firstMeasurement)
-			
-			#Now go through the rest of the list
-			measurementIndex = 1
-			while measurementIndex < len(currMeasurements):
-				
-				toBeAdded = 0
-				
-				possibleAddition = currMeasurements[measurementIndex]
-				
-				if possibleAddition <= 0:
-					toBeAdded = adjustedMeasurements[measurementIndex-1]
-				else:
-					toBeAdded = possibleAddition
-				
-				adjustedMeasurements.append(toBeAdded)
-				
-				
-				measurementIndex +=1
-			
-			
-			#Now log transform (base 2) the measurements:
-			logMeasurements = numpy.log2(adjustedMeasurements)
-			
-			#Now we calculate the doubling rate using a sliding window
-			startOfWindow = 0
-			while (startOfWindow + windowSize) < len(logMeasurements):
-				
-				currYVals = logMeasurements[startOfWindow:(startOfWindow + windowSize)]
-				currXVals = self.timesHrs[startOfWindow: (startOfWindow + windowSize)]
-				
-				currSlope,currIntercept, currR, currP, currErr = scipy.stats.linregress(currXVals, currYVals)
-				
-				#print currSlope
-				currDoublingTime = 0
-				if currSlope != 0:
-					currDoublingTime = 1/float(currSlope)
-				
-				currDoublings.append(currDoublingTime)
-				
-				
-				startOfWindow +=1
-			
-			
-			
-			#Now that we have the doublings associated with this well, add it to the dictionary
-			currLabel = currWell.getLabel()
-			
-			doublings[currLabel] = currDoublings
+				times = numpy.zeros(lessBase.shape)
 			
-			
-			wellIndex += 1
+			results = fitGrowthCurves(times, lessBase, model)
+			for name, result in zip(("capacities", "maxRates", "lags", "residuals", "converged"), results):
+				fits[name][firstWell:endWell] = result
 		
-		self.doublingTimes = doublings
-		return doublings
+		self.instrumentation.count("fitFailures", int(numWells - fits["converged"].sum()))
+		self.growthFits = fits
+		return fits
+	
+	
+	#Returns the doubling times as an array with one row per well and one column per window
+	def getDoublingMatrix(self):
+		if self.doublingMatrix is None:
+			self.doublingMatrix = numpy.array([self.doublingTimes[label] for label in self.plate.labels], dtype = float)
+		return self.doublingMatrix
+	
 	
-
 	#Saves to file with name fileName
 	#The file will be tab delimited and have this format:
 	# OD600 Doubling Times
@@ -537,78 +2411,374 @@ class Analyzer:
 	# .
 	# .
 	# .
+	#
+	# Each row of numbers is formatted in a single call of formatFloats(), and the rows are
+	# written out in blocks
+	#
+	# If findGrowthParameters() has been called, the lag, maximum rate and capacity of each well
+	# are written after its first timepoint after the artifact
+	@instrumentedStage
 	def saveToFile(self, fileName, windowSize):
-		f = open(fileName, "w")
-		f.write("OD600 Doubling Times \n")
+		numWindows = max(len(self.timesHrs) - windowSize, 0)
 		
-		timepointLine = "- \t - \t - \t - \t Timepoint: \t"
-		n = 0
-		while (n+windowSize) < len(self.timesHrs):
-			timepointLine += str(n) + "\t"
-			n +=1
+		fitColumns = ""
+		fitHeadings = ""
+		if self.growthFits is not None:
+			fitColumns = "- \t - \t - \t "
+			modelName = self.growthFits["model"].capitalize()
+			fitHeadings = modelName + " Lag (hrs) \t" + modelName + " Max Rate (OD/hr) \t" + modelName + " Capacity (OD) \t"
 		
-		timepointLine += "\n"
+		timepointLine = "- \t - \t - \t - \t " + fitColumns + "Timepoint: \t" + "".join([str(n) + "\t" for n in range(numWindows)]) + "\n"
+		
+		intervalStarts = formatFloats(self.timesHrs[:numWindows]).split("\t")
+		intervalEnds = formatFloats(self.timesHrs[windowSize:(windowSize + numWindows)]).split("\t")
+		thirdLine = "Well \tStrain \tDilution \tFirst Timepoint After Artifact \t" + fitHeadings + "Interval (hrs): \t"
+		if numWindows > 0:
+			thirdLine += "".join([start + " - " + end + "\t" for start, end in zip(intervalStarts, intervalEnds)])
+		thirdLine += "\n"
 		
+		f = open(fileName, "w")
+		f.write("OD600 Doubling Times \n")
 		f.write(timepointLine)
+		f.write(thirdLine)
 		
-		thirdLine = "Well \tStrain \tDilution \tFirst Timepoint After Artifact \tInterval (hrs): \t"
+		doublingMatrix = self.getDoublingMatrix()
+		startTimepoints = self.plate.startTimepoints.tolist()
 		
-		n = 0
-		while (n+windowSize) < len(self.timesHrs):
-			
-			currIntervalStart = str(self.timesHrs[n])
-			currIntervalEnd = str(self.timesHrs[(n + windowSize)])
-			
-			thirdLine += currIntervalStart
-			thirdLine += " - "
-			thirdLine += currIntervalEnd
-			thirdLine += "\t"
-			
-			n +=1
+		fitValues = [""] * self.plate.getNumWells()
+		if self.growthFits is not None:
+			fitMatrix = numpy.column_stack((self.growthFits["lags"], self.growthFits["maxRates"], self.growthFits["capacities"]))
+			fitValues = [formatFloats(row) + "\t" for row in fitMatrix]
 		
-		thirdLine += "\n"
+		lines = []
+		for wellIndex in range(self.plate.getNumWells()):
+			line = self.plate.labels[wellIndex] + "\t" + self.plate.strainNames[wellIndex] + "\t"
+			line += str(float(self.plate.dilutions[wellIndex])) + "\t" + str(startTimepoints[wellIndex]) + "\t" + fitValues[wellIndex] + "\t"
+			if doublingMatrix.shape[1] > 0:
+				line += formatFloats(doublingMatrix[wellIndex]) + "\t"
+			lines.append(line + "\n")
 			
-		f.write(thirdLine)
+			if len(lines) == 64:
+				f.write("".join(lines))
+				lines = []
 		
+		f.write("".join(lines))
+		f.close()
+	
+	
+	#Saves the doubling times and everything needed to make sense of them to the binary file
+	#fileName, a numpy .npz archive with the arrays:
+	# doublingTimes		wells x windows, as in saveToFile()
+	# labels, strainNames, dilutions, startTimepoints, bases		one entry per well
+	# timesHrs		the time of every measurement
+	# windowStartHrs, windowEndHrs		the interval of every window, as in saveToFile()
+	# windowSize
+	# fitModel, fitCapacities, fitMaxRates, fitLags, fitResiduals, fitConverged		if findGrowthParameters() has been called
+	# rSquared, stderrs, residualStds (and pValues)		wells x windows, if findRegressionQuality() has been called for windowSize
+	# bestWindows, bestDoublingTimes		if findBestDoublingTimes() has been called for windowSize
+	# summaryMaxGrowthRates, summaryLags, summaryThresholdHrs, summaryThreshold		if findWellSummaries() has been called for windowSize
+	# These three are left out if the bases, starting timepoints or smoothing have changed since (see isCurrent())
+	# replicateStrainNames, replicateDilutions, replicateNumReplicates, replicateCurveMeans, ...		if findReplicateStatistics() has been called
+	# The archive is not compressed, so each array can be read straight from its place in the file
+	# (i.e. memory mapped) without reading the rest
+	@instrumentedStage
+	def saveToBinary(self, fileName, windowSize):
+		doublingMatrix = self.getDoublingMatrix()
+		numWindows = doublingMatrix.shape[1]
 		
-		wellIndex = 0
-		while wellIndex < len(self.OD600_WELLS):
-			currWell = self.OD600_WELLS[wellIndex]
-			
-			line = ""
-			
-			line += str(currWell.getLabel())
-			line += "\t"
-			
-			line += str(currWell.getStrainName())
-			line += "\t"
-			
-			line += str(float(currWell.getDilution()))
-			line += "\t"
-			
-			line += str(currWell.getStartTimepoint())
-			line += "\t"
-			line += "\t"
-			
-			currDoublings = self.doublingTimes[currWell.getLabel()]
-			
-			doublingListIndex = 0
-			while doublingListIndex < len(currDoublings):
-				line += str(currDoublings[doublingListIndex])
-				line += "\t"
-				doublingListIndex +=1
-			
-			line += "\n"
-			
-			f.write(line)
-			
-			wellIndex +=1
+		extraArrays = {}
+		if self.growthFits is not None:
+			for name in ("capacities", "maxRates", "lags", "residuals", "converged"):
+				extraArrays["fit" + name[0].upper() + name[1:]] = self.growthFits[name]
+			extraArrays["fitModel"] = self.growthFits["model"]
 		
-		f.close()
+		if self.isCurrent(self.regressionQuality, windowSize):
+			for name in ("rSquared", "stderrs", "residualStds", "pValues"):
+				if name in self.regressionQuality:
+					extraArrays[name] = self.regressionQuality[name]
+		
+		if self.isCurrent(self.bestDoublingTimes, windowSize):
+			extraArrays["bestWindows"] = self.bestDoublingTimes["windows"]
+			extraArrays["bestDoublingTimes"] = self.bestDoublingTimes["doublingTimes"]
+		
+		if self.isCurrent(self.wellSummaries, windowSize):
+			for name in ("maxGrowthRates", "lags", "thresholdHrs", "threshold"):
+				extraArrays["summary" + name[0].upper() + name[1:]] = self.wellSummaries[name]
+		
+		if self.replicateStatistics is not None and self.replicateStatistics["curveMeans"].shape[1] == numWindows:
+			statistics = self.replicateStatistics
+			extraArrays["replicateStrainNames"] = numpy.array([strainName for strainName, dilution in statistics["groups"]])
+			extraArrays["replicateDilutions"] = numpy.array([str(dilution) for strainName, dilution in statistics["groups"]])
+			extraArrays["replicateMetricNames"] = numpy.array(statistics["metricNames"], dtype = str)
+			for name in ("numReplicates", "curveMeans", "curveMedians", "curveLows", "curveHighs", "metricMeans", "metricMedians", "metricLows", "metricHighs"):
+				extraArrays["replicate" + name[0].upper() + name[1:]] = statistics[name]
+		
+		numpy.savez(fileName,
+			doublingTimes = doublingMatrix,
+			labels = numpy.array(self.plate.labels),
+			strainNames = numpy.array(self.plate.strainNames),
+			dilutions = numpy.array([float(dilution) for dilution in self.plate.dilutions]),
+			startTimepoints = self.plate.startTimepoints,
+			bases = self.plate.bases,
+			timesHrs = self.timesHrs,
+			windowStartHrs = self.timesHrs[:numWindows],
+			windowEndHrs = self.timesHrs[windowSize:(windowSize + numWindows)],
+			windowSize = windowSize,
+			**extraArrays)
+	
+	
+	#Adds the doubling times, starting timepoints, bases and well summaries (if they have been found for
+	#windowSize) to the SQLite database fileName as the plate plateName, replacing any plate of that name
+	#(see ResultsStore)
+	@instrumentedStage
+	def saveToStore(self, fileName, plateName, windowSize):
+		store = ResultsStore(fileName)
+		try:
+			store.addPlate(plateName, self, windowSize)
+		finally:
+			store.close()
+	
+	
+	#Draws the growth curves of every well in the layout of the plate and saves the figure to the file
+	#fileName. The format is taken from the extension, i.e. .png or .pdf. All of the curves share the
+	#same scale. The starting timepoint of each well is marked with a red dot, and if the doubling
+	#times of windows of windowSize timepoints have been found, the window with the shortest doubling
+	#time after the starting timepoint is shaded and its doubling time written in the corner.
+	#
+	#The figure is drawn without pyplot, as one set of lines for the whole plate rather than a
+	#subplot for each well, so it works in headless mode and is quick even for 1536 well plates
+	@instrumentedStage
+	def saveOverview(self, fileName, windowSize = None, title = None):
+		from matplotlib.figure import Figure
+		from matplotlib.backends.backend_agg import FigureCanvasAgg
+		from matplotlib.collections import LineCollection, PolyCollection
+		
+		numWells = self.plate.getNumWells()
+		numRows, numColumns = PLATE_FORMATS[numWells]
+		numTimepoints = self.plate.getNumTimepoints()
+		wellRows, wellColumns = numpy.array([parseWellLabel(label) for label in self.plate.labels]).reshape(numWells, 2).T
+		
+		#Every well gets a cell 1 wide and 1 high, with row A at the top. The curves fill 90% of the cell
+		step = max(1, -(-numTimepoints // OVERVIEW_POINTS))
+		timepoints = numpy.arange(0, numTimepoints, step)
+		measurements = numpy.asarray(self.plate.measurements[:, ::step], dtype = float)
+		
+		with numpy.errstate(invalid = "ignore"):
+			lowest = numpy.nanmin(measurements) if measurements.size > 0 else 0.0
+			highest = numpy.nanmax(measurements) if measurements.size > 0 else 1.0
+		if not numpy.isfinite(highest - lowest) or highest <= lowest:
+			lowest, highest = 0.0, 1.0
+		lastHour = self.timesHrs[-1] if numTimepoints > 0 and self.timesHrs[-1] > 0 else 1.0
+		
+		def cellX(hours, columns):
+			return columns + 0.05 + 0.9 * hours / lastHour
+		
+		def cellY(ods, rows):
+			return (numRows - 1 - rows) + 0.05 + 0.9 * (ods - lowest) / (highest - lowest)
+		
+		figure = Figure(figsize = (min(max(numColumns * 1.0, 8), 40), min(max(numRows * 0.8, 6), 30)))
+		FigureCanvasAgg(figure)
+		axes = figure.add_axes([0.04, 0.04, 0.94, 0.9])
+		
+		xs = cellX(self.timesHrs[timepoints], wellColumns[:, numpy.newaxis])
+		ys = cellY(measurements, wellRows[:, numpy.newaxis])
+		axes.add_collection(LineCollection(numpy.dstack((xs, ys)), colors = "b", linewidths = 0.5))
+		
+		#Shade the fastest window of each well
+		if windowSize is not None and (self.doublingMatrix is not None or self.doublingTimes):
+			doublingMatrix = self.getDoublingMatrix()
+			fastest = findFastestWindows(doublingMatrix, self.plate.startTimepoints)
+			windows = []
+			for wellIndex in numpy.flatnonzero(fastest >= 0):
+				firstHour = self.timesHrs[fastest[wellIndex]]
+				lastWindowHour = self.timesHrs[min(fastest[wellIndex] + windowSize - 1, numTimepoints - 1)]
+				left, right = cellX(numpy.array([firstHour, lastWindowHour]), wellColumns[wellIndex])
+				bottom = numRows - 1 - wellRows[wellIndex] + 0.05
+				windows.append([(left, bottom), (right, bottom), (right, bottom + 0.9), (left, bottom + 0.9)])
+				if numWells <= 384:
+					axes.text(wellColumns[wellIndex] + 0.95, bottom + 0.85, "%.2g" % doublingMatrix[wellIndex, fastest[wellIndex]],
+						fontsize = 5, horizontalalignment = "right", verticalalignment = "top")
+			axes.add_collection(PolyCollection(windows, facecolors = "orange", edgecolors = "none", alpha = 0.3))
+		
+		#Mark the starting timepoints
+		starts = self.plate.startTimepoints
+		marked = (starts >= 0) & (starts < numTimepoints)
+		if marked.any():
+			startODs = numpy.asarray(self.plate.measurements[numpy.flatnonzero(marked), starts[marked]], dtype = float)
+			axes.plot(cellX(self.timesHrs[starts[marked]], wellColumns[marked]), cellY(startODs, wellRows[marked]), "r.", markersize = 2)
+		
+		#The grid of wells, labelled like the plate
+		for row in range(numRows + 1):
+			axes.axhline(row, color = "0.8", linewidth = 0.5)
+		for column in range(numColumns + 1):
+			axes.axvline(column, color = "0.8", linewidth = 0.5)
+		rowNames = [chr(ord('A') + row) if row < 26 else "A" + chr(ord('A') + row - 26) for row in range(numRows)]
+		axes.set_xticks(numpy.arange(numColumns) + 0.5)
+		axes.set_xticklabels([str(column + 1) for column in range(numColumns)], fontsize = 6)
+		axes.set_yticks(numpy.arange(numRows) + 0.5)
+		axes.set_yticklabels(rowNames[::-1], fontsize = 6)
+		axes.tick_params(length = 0)
+		axes.set_xlim(0, numColumns)
+		axes.set_ylim(0, numRows)
+		
+		axes.set_title(title or "OD600 %.3g to %.3g over %.3g hrs" % (lowest, highest, lastHour), fontsize = 8)
+		figure.savefig(fileName, dpi = 150)
 			
 			
 			
 
+#The most measurements of each well drawn by Analyzer.saveOverview(). Longer runs are thinned out to this
+OVERVIEW_POINTS = 250
+
+
+class StreamingAnalyzer(Analyzer):
+
+	"""A StreamingAnalyzer follows an export that the TECAN is still writing.
+	Each call to update() reads only the timepoints added since the last call, adds them
+	to the plate, and calculates the doubling times of only the windows that have become
+	complete, by extending the regression sums instead of starting over. The sums of a block
+	of timepoints only depend on the timepoints in it (see RegressionSums), so the doubling
+	times are exactly those of an Analyzer run on the whole export once it is written.
+
+	The starting timepoints are read from startFileName if it exists, otherwise they are
+	found automatically (see findDropStarts()) once the first 100 timepoints are in, and
+	saved to startFileName if it is given. The bases are found as soon as every well has
+	10 measurements after its starting timepoint. No doubling times are calculated before that."""
+
+	def __init__(self, OD_FILE_NAME, LABEL_FILE_NAME, windowSize, startFileName = None, minDrop = DROP_MIN_MAGNITUDE, instrumentation = None):
+
+		Analyzer.__init__(self, OD_FILE_NAME, LABEL_FILE_NAME, instrumentation = instrumentation)
+		self.odFileName = OD_FILE_NAME
+		self.windowSize = windowSize
+		self.startFileName = startFileName
+		self.minDrop = minDrop
+		self.fileStamp = self.getFileStamp()
+
+		self.startsKnown = False
+		if startFileName is not None and os.path.exists(startFileName):
+			self.loadStartTimepoints(startFileName)
+			self.startsKnown = True
+
+		self.streamingSums = None #Set once the bases are known
+		self.lastFilled = None #The last log transformable value of each well, see fillNonPositive()
+		self.numWindows = 0 #The number of windows with doubling times so far
+
+		for label in self.plate.labels:
+			self.doublingTimes[label] = []
+
+
+	#The export may still be being written, so only read the timepoints that every well already has
+	def load_OD600(self, OD600s, labels):
+		return Analyzer.load_OD600(self, OD600s, labels, True)
+
+
+	#The doubling times of earlier windows are never worked out again, while smoothing would change
+	#them as later measurements come in, so the measurements can not be smoothed while following an export
+	def setSmoothing(self, method, width = None, polyorder = SMOOTHING_POLYORDER):
+		if method is not None:
+			raise ValueError("The measurements can not be smoothed while following an export")
+
+
+	#Returns the modification time and size of the export, which change whenever it is written to
+	def getFileStamp(self):
+		stat = os.stat(self.odFileName)
+		return stat.st_mtime, stat.st_size
+
+
+	#Reads any new timepoints from the export and calculates the doubling times of the windows
+	#that are now complete. Those doubling times are added to the end of the lists in
+	#self.doublingTimes, and returned as (index of the first new window, wells x new windows array).
+	#Returns None if there are no new windows
+	@instrumentedStage
+	def update(self):
+		self.fileStamp = self.getFileStamp()
+
+		currLabels, newMeasurements, newSeconds, newTemperatures = readODExport(self.odFileName, self.plate.getNumTimepoints(), True)
+		if currLabels != self.plate.labels:
+			raise ValueError("The wells in " + self.odFileName + " have changed")
+
+		if len(newSeconds) > 0:
+			self.plate.appendTimepoints(newSeconds, newMeasurements, newTemperatures)
+			self.timesHrs = self.plate.timesHrs
+			self.timesSecs = self.plate.timesSecs
+			self.instrumentation.setCount("timepoints", self.plate.getNumTimepoints())
+
+		return self.analyzeNewTimepoints()
+
+
+	#Calculates the doubling times of the windows that have become complete, see update()
+	@instrumentedStage
+	def analyzeNewTimepoints(self):
+		numTimepoints = self.plate.getNumTimepoints()
+
+		if self.streamingSums is None:
+
+			#Wait until the starting timepoints and then the bases can be found
+			if not self.startsKnown:
+				if numTimepoints < 100:
+					return None
+				self.findStartTimepoints(0, 100, self.minDrop)
+				if self.startFileName is not None:
+					self.saveStartTimepoints(self.startFileName)
+				self.startsKnown = True
+
+			if numTimepoints < self.plate.startTimepoints.max() + 10:
+				return None
+			self.findBase()
+
+			logMeasurements, filled, numReplaced = logLessBase(self.plate.measurements, self.plate.bases)
+			self.instrumentation.count("replacedMeasurements", numReplaced)
+			self.streamingSums = RegressionSums(self.timesHrs, logMeasurements)
+			self.lastFilled = filled[:, -1]
+
+		elif numTimepoints > self.streamingSums.getLength():
+
+			#Only the new timepoints are transformed and added to the sums
+			firstNew = self.streamingSums.getLength()
+			logMeasurements, filled, numReplaced = logLessBase(self.plate.measurements[:, firstNew:], self.plate.bases, self.lastFilled)
+			self.instrumentation.count("replacedMeasurements", numReplaced)
+			self.streamingSums.extend(self.timesHrs[firstNew:], logMeasurements)
+			self.lastFilled = filled[:, -1]
+
+		slopes = self.streamingSums.regress(self.windowSize, self.numWindows)[0]
+		if slopes.shape[1] == 0:
+			return None
+
+		firstWindow = self.numWindows
+		newDoublings = doublingTimesFromSlopes(slopes)
+		self.numWindows += slopes.shape[1]
+		self.instrumentation.count("windows", slopes.size)
+
+		for label, currDoublings in zip(self.plate.labels, newDoublings.tolist()):
+			self.doublingTimes[label].extend(currDoublings)
+		self.doublingMatrix = None
+
+		return firstWindow, newDoublings
+
+
+	#Keeps calling update() whenever the export changes, checking every interval seconds, and
+	#passes each result that has new windows to callback(firstWindow, newDoublings).
+	#Returns once the export has not changed for idleTimeout seconds (never if it is None)
+	def follow(self, callback, interval = 60.0, idleTimeout = None):
+		lastChange = time.time()
+
+		result = self.analyzeNewTimepoints()
+		if result is not None:
+			callback(*result)
+
+		while True:
+			if self.getFileStamp() != self.fileStamp:
+				lastChange = time.time()
+				result = self.update()
+				if result is not None:
+					callback(*result)
+			elif idleTimeout is not None and time.time() - lastChange >= idleTimeout:
+				return
+
+			time.sleep(interval)
+
+
+
 #######################################################################################################################################
 #######################################################################################################################################
 #######################################################################################################################################
@@ -637,6 +2807,9 @@ def run():
 	#of growth curves ends
 	DROP_INDECES_FILE_NAME = "/Users/yyfwuhan/Projects/2011-TaMaRa-growth-curve/TECANWellAnalyzer/EXAMPLE/Starts_After_Drops.txt"
 
+	#If the file above does not exist, should the user be asked about each well (True), or should
+	#the starting timepoints be found automatically (False)
+	INTERACTIVE_START_TIMEPOINTS = True
 
 	#This is the window size when calculating the doubling time. 
 	DOUBLING_WINDOW_SIZE = 40
@@ -647,7 +2820,7 @@ def run():
 	a = Analyzer(OD_600_DATA_FILE_NAME, WELL_LABEL_FILE_NAME)
 
 	#First: Try to load the indeces ater drop
-	a.loadStartTimepoints(DROP_INDECES_FILE_NAME)
+	a.loadStartTimepoints(DROP_INDECES_FILE_NAME, INTERACTIVE_START_TIMEPOINTS)
 
 	#Second: Find the base OD for each well
 	a.findBase()
@@ -657,3 +2830,1045 @@ def run():
 
 	a.saveToFile(DOUBLING_FILE_NAME, DOUBLING_WINDOW_SIZE)
 
+
+
+#######################################################################################################################################
+#Pipeline of stages whose results are kept in memory
+#######################################################################################################################################
+
+#The stages of a Pipeline, in order, as (name, the stages it needs, the parameters it uses)
+PIPELINE_STAGES = (
+	("startTimepoints", (), ("startFileName", "minDrop")),
+	("bases", ("startTimepoints",), ("baseEstimator", "basePercentile", "baseTrimFraction")),
+	("regressionSums", ("bases",), ("smoothMethod", "smoothWidth")),
+	("doublingTimes", ("regressionSums",), ("windowSize",)),
+	("regressionQuality", ("regressionSums",), ("windowSize",)),
+	("bestDoublingTimes", ("regressionQuality",), ("windowSize", "minRSquared", "windowsAfterStart")),
+	("wellSummaries", ("bestDoublingTimes",), ("windowSize", "minRSquared", "windowsAfterStart", "threshold")),
+	("growthFits", ("bases",), ("fitModel",)),
+)
+
+#The parameters of a Pipeline and their values until they are set
+PIPELINE_DEFAULTS = {"startFileName": None, "minDrop": DROP_MIN_MAGNITUDE, "baseEstimator": "min", "basePercentile": BASE_PERCENTILE,
+	"baseTrimFraction": BASE_TRIM_FRACTION, "smoothMethod": None, "smoothWidth": None, "windowSize": 40,
+	"minRSquared": BEST_WINDOW_MIN_R_SQUARED, "windowsAfterStart": 0, "threshold": SUMMARY_OD_THRESHOLD, "fitModel": "logistic"}
+
+#The most stage results a Pipeline keeps, the least recently used ones are dropped beyond it
+PIPELINE_MEMO_SIZE = 64
+
+
+class Pipeline:
+
+	"""A Pipeline runs the stages of the analysis of one Analyzer on demand and keeps the result of
+	each stage in memory, under the parameters it used and the results it was made from. Asking for a
+	stage again only runs the stages whose parameters have changed since, and the ones after them, so
+	i.e. a new window size reuses the starting timepoints, bases and regression sums, and going back to
+	an earlier window size runs nothing at all.
+
+	The stages are listed in PIPELINE_STAGES and the parameters in PIPELINE_DEFAULTS:
+
+		p = Pipeline(Analyzer(odFileName, labelFileName))
+		p.set(startFileName = startFileName, windowSize = 40)
+		p.get("doublingTimes")
+		p.set(windowSize = 30, baseEstimator = "percentile")
+		p.get("wellSummaries")
+		p.analyzer.saveToFile(fileName, 30)
+
+	get() leaves the Analyzer as if the stage and the stages it needs had just been run, so its save
+	methods can be used. The stages that are run are counted as pipelineMisses by the Instrumentation
+	of the Analyzer and the ones that are not as pipelineHits. The Analyzer must keep its plate in
+	memory, as the results of a plate on disk are written over by the next run (see openMemmapPlate())."""
+
+	def __init__(self, analyzer, memoSize = PIPELINE_MEMO_SIZE):
+		if analyzer.plate.directory is not None:
+			raise ValueError("A Pipeline needs a plate kept in memory, not on disk in " + analyzer.plate.directory)
+		self.analyzer = analyzer
+		self.memoSize = memoSize
+		self.parameters = dict(PIPELINE_DEFAULTS)
+		self.stages = dict((name, (inputs, parameters)) for name, inputs, parameters in PIPELINE_STAGES)
+		self.results = collections.OrderedDict() #Stage key -> result, the most recently used last
+
+
+	#Sets the parameters given by name, i.e. set(windowSize = 30). Raises ValueError for an unknown parameter
+	def set(self, **parameters):
+		for name in parameters:
+			if name not in self.parameters:
+				raise ValueError("There is no pipeline parameter '%s', the parameters are %s" % (name, ", ".join(sorted(self.parameters))))
+		self.parameters.update(parameters)
+
+
+	#Returns the key of the result of the stage name under the current parameters, made from the
+	#parameters of the stage and the keys of the stages it needs
+	def getKey(self, name):
+		inputs, parameters = self.stages[name]
+		return (name, tuple(self.parameters[parameter] for parameter in parameters), tuple(self.getKey(currInput) for currInput in inputs))
+
+
+	#Returns the result of the stage name under the current parameters, running it and the stages it needs
+	#only if their results are not kept already. The Analyzer is left with the results of the stage and
+	#the stages it needs. Raises KeyError for an unknown stage
+	def get(self, name):
+		if name not in self.stages:
+			raise KeyError("There is no pipeline stage '%s', the stages are %s" % (name, ", ".join(stage[0] for stage in PIPELINE_STAGES)))
+		inputs = self.stages[name][0]
+		for currInput in inputs:
+			self.get(currInput)
+		
+		key = self.getKey(name)
+		if key in self.results:
+			self.analyzer.instrumentation.count("pipelineHits")
+			result = self.results.pop(key)
+		else:
+			self.analyzer.instrumentation.count("pipelineMisses")
+			result = getattr(self, "run_" + name)()
+		
+		self.results[key] = result
+		while len(self.results) > self.memoSize:
+			self.results.popitem(False)
+		
+		getattr(self, "apply_" + name)(result)
+		return result
+
+
+	#Forgets every result kept so far
+	def clear(self):
+		self.results.clear()
+
+
+	#Each stage is run by run_<stage name>(), with the Analyzer already holding the results of the
+	#stages it needs, and its result is put back into the Analyzer by apply_<stage name>(result)
+
+	def run_startTimepoints(self):
+		if self.parameters["startFileName"] is None:
+			self.analyzer.findStartTimepoints(minDrop = self.parameters["minDrop"])
+		else:
+			self.analyzer.loadStartTimepoints(self.parameters["startFileName"], False, self.parameters["minDrop"])
+		return self.analyzer.plate.startTimepoints.copy()
+
+	def apply_startTimepoints(self, startTimepoints):
+		self.analyzer.plate.startTimepoints[:] = startTimepoints
+
+
+	def run_bases(self):
+		plate = self.analyzer.plate
+		return findBases(plate.measurements, plate.startTimepoints, BASE_NUM_POINTS, self.parameters["baseEstimator"],
+			self.parameters["basePercentile"], self.parameters["baseTrimFraction"])
+
+	def apply_bases(self, bases):
+		self.analyzer.plate.bases[:] = bases
+
+
+	def run_regressionSums(self):
+		self.analyzer.setSmoothing(self.parameters["smoothMethod"], self.parameters["smoothWidth"])
+		return self.analyzer.getRegressionSums()
+
+	def apply_regressionSums(self, regressionSums):
+		self.analyzer.setSmoothing(self.parameters["smoothMethod"], self.parameters["smoothWidth"])
+		self.analyzer.regressionSums = regressionSums
+		self.analyzer.regressionSumsKey = self.analyzer.getRegressionSumsKey()
+
+
+	#The doubling times are looked up in the matrix by a DoublingTimesView, rather than making a list of
+	#every row each time the stage is asked for
+	def run_doublingTimes(self):
+		return self.analyzer.instrumentation.runStage("findDoublingTimes", self.analyzer.findDoublingMatrix, self.parameters["windowSize"])
+
+	def apply_doublingTimes(self, doublingMatrix):
+		self.analyzer.doublingMatrix = doublingMatrix
+		self.analyzer.doublingTimes = DoublingTimesView(self.analyzer.plate.labels, doublingMatrix)
+
+
+	def run_regressionQuality(self):
+		return self.analyzer.findRegressionQuality(self.parameters["windowSize"])
+
+	def apply_regressionQuality(self, quality):
+		self.analyzer.regressionQuality = quality
+
+
+	def run_bestDoublingTimes(self):
+		self.analyzer.findBestDoublingTimes(self.parameters["windowSize"], self.parameters["minRSquared"], self.parameters["windowsAfterStart"])
+		return self.analyzer.bestDoublingTimes
+
+	def apply_bestDoublingTimes(self, bestDoublingTimes):
+		self.analyzer.bestDoublingTimes = bestDoublingTimes
+
+
+	#findWellSummaries() uses the windows and regression quality applied by the stages it needs, rather than finding them again
+	def run_wellSummaries(self):
+		return self.analyzer.findWellSummaries(self.parameters["windowSize"], self.parameters["threshold"], self.parameters["minRSquared"],
+			self.parameters["windowsAfterStart"])
+
+	def apply_wellSummaries(self, summaries):
+		self.analyzer.wellSummaries = summaries
+
+
+	def run_growthFits(self):
+		return self.analyzer.findGrowthParameters(self.parameters["fitModel"])
+
+	def apply_growthFits(self, fits):
+		self.analyzer.growthFits = fits
+
+
+
+#######################################################################################################################################
+#Caching parsed plates and results on disk
+#######################################################################################################################################
+
+#The default largest size of a PlateCache directory in bytes
+PLATE_CACHE_SIZE = 500 * 1000 * 1000
+
+
+#Returns the SHA-1 digest (a hex string) of the contents of a file
+def fileDigest(fileName):
+	digest = hashlib.sha1()
+	f = open(fileName, "rb")
+	block = f.read(1 << 20)
+	while block:
+		digest.update(block)
+		block = f.read(1 << 20)
+	f.close()
+	return digest.hexdigest()
+
+
+class PlateCache:
+
+	"""A PlateCache keeps parsed plates, bases and doubling times in a directory so that
+	they do not have to be worked out again when nothing they depend on has changed.
+	Each entry is a compressed .npz file named by its key, a SHA-1 digest of the input
+	file contents and the parameters the entry was made from.
+
+	Once the files in the directory take up more than maxBytes, the least recently
+	used entries are removed. Reading an entry counts as using it."""
+
+	def __init__(self, directory, maxBytes = PLATE_CACHE_SIZE):
+		self.directory = directory
+		self.maxBytes = maxBytes
+
+		if not os.path.isdir(directory):
+			try:
+				os.makedirs(directory)
+			except OSError:
+				if not os.path.isdir(directory):
+					raise
+
+
+	#Returns a key made from any number of parts: strings, numbers, or arrays (whose contents are used)
+	def makeKey(self, *parts):
+		digest = hashlib.sha1()
+		for part in parts:
+			if isinstance(part, numpy.ndarray):
+				digest.update(str(part.dtype) + str(part.shape))
+				digest.update(numpy.ascontiguousarray(part).tobytes())
+			else:
+				digest.update(repr(part))
+			digest.update("\0")
+		return digest.hexdigest()
+
+
+	#Return the name of the file of the entry for key
+	def getFileName(self, key):
+		return os.path.join(self.directory, key + ".npz")
+
+
+	#Returns the arrays stored under key as a dictionary, or None if there is no such entry
+	def get(self, key):
+		fileName = self.getFileName(key)
+		try:
+			stored = numpy.load(fileName)
+			arrays = dict((name, stored[name]) for name in stored.files)
+			stored.close()
+		except (IOError, OSError, ValueError, zipfile.BadZipfile):
+			return None
+
+		#Mark the entry as recently used
+		try:
+			os.utime(fileName, None)
+		except OSError:
+			pass
+		return arrays
+
+
+	#Stores the arrays (a dictionary of names and arrays) under key, then removes old entries if
+	#the cache is too big. The entry is written to a temporary file first, so that other
+	#processes never read half of an entry
+	def put(self, key, arrays):
+		fileName = self.getFileName(key)
+		tempFileName = os.path.join(self.directory, "%s.%d.tmp.npz" % (key, os.getpid()))
+
+		numpy.savez_compressed(tempFileName, **arrays)
+		if os.path.exists(fileName):
+			os.remove(fileName)
+		os.rename(tempFileName, fileName)
+
+		self.evict()
+
+
+	#Removes the least recently used entries until the cache is no larger than maxBytes
+	def evict(self):
+		entries = []
+		for name in os.listdir(self.directory):
+			if name.endswith(".npz") and not name.endswith(".tmp.npz"):
+				fileName = os.path.join(self.directory, name)
+				try:
+					stat = os.stat(fileName)
+				except OSError:
+					continue
+				entries.append((stat.st_mtime, stat.st_size, fileName))
+
+		entries.sort()
+		totalBytes = sum(entry[1] for entry in entries)
+		for mtime, size, fileName in entries:
+			if totalBytes <= self.maxBytes:
+				break
+			try:
+				os.remove(fileName)
+			except OSError:
+				pass
+			totalBytes -= size
+
+
+	#Returns an Analyzer for the export and label files, and the key of its plate. The plate is
+	#only parsed if it is not in the cache already. instrumentation is passed on to the Analyzer,
+	#and counts the cacheHits and cacheMisses. If blockName is given, that block of a whole export
+	#is used (see readPlateBlock())
+	def loadAnalyzer(self, odFileName, labelFileName, instrumentation = None, blockName = None):
+		plateKey = self.makeKey("plate", fileDigest(odFileName), fileDigest(labelFileName), *([blockName] if blockName is not None else []))
+
+		arrays = self.get(plateKey)
+		if arrays is not None:
+			a = Analyzer(odFileName, labelFileName, plateFromArrays(arrays), instrumentation)
+			a.instrumentation.count("cacheHits")
+			return a, plateKey
+
+		if blockName is not None:
+			a = Analyzer(odFileName, labelFileName, readPlateBlock(odFileName, labelFileName, blockName), instrumentation)
+		else:
+			a = Analyzer(odFileName, labelFileName, instrumentation = instrumentation)
+		a.instrumentation.count("cacheMisses")
+		self.put(plateKey, a.plate.getArrays())
+		return a, plateKey
+
+
+	#Sets the bases of the Analyzer a (see Analyzer.findBase()) using the cache. plateKey is the key
+	#returned by loadAnalyzer(). The starting timepoints must be set first. Returns the key of the bases
+	def findBase(self, a, plateKey, estimator = "min", percentile = BASE_PERCENTILE, trimFraction = BASE_TRIM_FRACTION):
+		basesKey = self.makeKey("bases", plateKey, a.plate.startTimepoints)
+		if estimator != "min":
+			basesKey = self.makeKey("bases", plateKey, a.plate.startTimepoints, estimator, percentile, trimFraction)
+
+		arrays = self.get(basesKey)
+		if arrays is not None:
+			a.plate.bases[:] = arrays["bases"]
+			a.instrumentation.count("cacheHits")
+		else:
+			a.findBase(estimator, percentile, trimFraction)
+			a.instrumentation.count("cacheMisses")
+			self.put(basesKey, {"bases": a.plate.bases})
+		return basesKey
+
+
+	#Sets the doubling times of the Analyzer a (see Analyzer.findDoublingTimes()) using the cache.
+	#basesKey is the key returned by findBase(). Returns the doubling times dictionary
+	def findDoublingTimes(self, a, basesKey, windowSize):
+		doublingsKey = self.makeKey("doublings", basesKey, windowSize, *([a.smoothing] if a.smoothing is not None else []))
+
+		arrays = self.get(doublingsKey)
+		if arrays is not None:
+			a.instrumentation.count("cacheHits")
+			return a.setDoublingTimes(arrays["doublings"])
+
+		doublings = a.findDoublingTimes(windowSize)
+		a.instrumentation.count("cacheMisses")
+		self.put(doublingsKey, {"doublings": a.doublingMatrix})
+		return doublings
+
+
+
+#How long a ResultsStore waits for another process to finish writing before giving up, in seconds
+STORE_TIMEOUT = 600.0
+
+
+class ResultsStore:
+
+	"""A ResultsStore keeps the results of many plates in one SQLite database, so that they can
+	be compared across experiments without reading every doubling time file again. It has the
+	tables:
+	plates		id, name, windowSize, numWells, numWindows, added (seconds since the epoch)
+	wells		plateId, wellIndex, label, strain, dilution, startTimepoint, base, and the summaries of
+				Analyzer.findWellSummaries() if they were found (minDoublingTime, maxGrowthRate, bestWindow,
+				lag, thresholdHrs), otherwise NULL
+	windows		plateId, window, startHrs, endHrs
+	doublingTimes		plateId, wellIndex, window, doublingTime
+	with indexes on the plate, well, strain, dilution and window. Dilutions that are numbers are
+	stored as numbers (see dilutionKey()), and NaN is stored as NULL.
+
+	Several processes can add plates to the same database, each waits its turn for up to timeout seconds."""
+
+	def __init__(self, fileName, timeout = STORE_TIMEOUT):
+		self.fileName = fileName
+		self.connection = sqlite3.connect(fileName, timeout)
+		self.connection.execute("PRAGMA journal_mode = WAL")
+		self.connection.execute("PRAGMA synchronous = NORMAL")
+		with self.connection:
+			self.connection.executescript("""
+				CREATE TABLE IF NOT EXISTS plates (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL,
+					windowSize INTEGER, numWells INTEGER, numWindows INTEGER, added REAL);
+				CREATE TABLE IF NOT EXISTS wells (plateId INTEGER NOT NULL, wellIndex INTEGER NOT NULL, label TEXT,
+					strain TEXT, dilution, startTimepoint INTEGER, base REAL, minDoublingTime REAL, maxGrowthRate REAL,
+					bestWindow INTEGER, lag REAL, thresholdHrs REAL, PRIMARY KEY (plateId, wellIndex));
+				CREATE TABLE IF NOT EXISTS windows (plateId INTEGER NOT NULL, window INTEGER NOT NULL,
+					startHrs REAL, endHrs REAL, PRIMARY KEY (plateId, window));
+				CREATE TABLE IF NOT EXISTS doublingTimes (plateId INTEGER NOT NULL, wellIndex INTEGER NOT NULL,
+					window INTEGER NOT NULL, doublingTime REAL, PRIMARY KEY (plateId, wellIndex, window)) WITHOUT ROWID;
+				CREATE INDEX IF NOT EXISTS wellsByStrain ON wells (strain, dilution);
+				CREATE INDEX IF NOT EXISTS wellsByLabel ON wells (label);
+				CREATE INDEX IF NOT EXISTS doublingTimesByWindow ON doublingTimes (window);
+			""")
+
+
+	def close(self):
+		self.connection.close()
+
+
+	#Removes the plate named plateName and all of its results, if there is one
+	def removePlate(self, plateName):
+		with self.connection:
+			self.deletePlate(plateName)
+
+
+	#Deletes the plate named plateName and its results within the current transaction
+	def deletePlate(self, plateName):
+		for (plateId,) in self.connection.execute("SELECT id FROM plates WHERE name = ?", (plateName,)).fetchall():
+			for table in ("doublingTimes", "windows", "wells"):
+				self.connection.execute("DELETE FROM " + table + " WHERE plateId = ?", (plateId,))
+			self.connection.execute("DELETE FROM plates WHERE id = ?", (plateId,))
+
+
+	#Stores the results of the Analyzer a (whose doubling times have been found for windowSize) as the
+	#plate plateName, in one transaction, replacing any plate of the same name. Returns the id of the plate
+	def addPlate(self, plateName, a, windowSize):
+		doublingMatrix = a.getDoublingMatrix()
+		numWells, numWindows = doublingMatrix.shape
+		plate = a.plate
+		
+		summaryColumns = [[None] * numWells] * 5
+		summaries = a.wellSummaries
+		if a.isCurrent(summaries, windowSize):
+			summaryColumns = [summaries[name].tolist() for name in ("minDoublingTimes", "maxGrowthRates", "bestWindows", "lags", "thresholdHrs")]
+			summaryColumns[2] = [window if window >= 0 else None for window in summaryColumns[2]]
+		
+		with self.connection:
+			self.deletePlate(plateName)
+			plateId = self.connection.execute("INSERT INTO plates (name, windowSize, numWells, numWindows, added) VALUES (?, ?, ?, ?, ?)",
+				(plateName, windowSize, numWells, numWindows, time.time())).lastrowid
+			
+			wellRows = zip([plateId] * numWells, range(numWells), plate.labels, plate.strainNames, [dilutionKey(dilution) for dilution in plate.dilutions],
+				plate.startTimepoints.tolist(), plate.bases.tolist(), *summaryColumns)
+			self.connection.executemany("INSERT INTO wells VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", wellRows)
+			
+			windowRows = zip([plateId] * numWindows, range(numWindows), a.timesHrs[:numWindows].tolist(), a.timesHrs[windowSize:(windowSize + numWindows)].tolist())
+			self.connection.executemany("INSERT INTO windows VALUES (?, ?, ?, ?)", windowRows)
+			
+			windows = range(numWindows)
+			for wellIndex in range(numWells):
+				self.connection.executemany("INSERT INTO doublingTimes VALUES (?, ?, ?, ?)",
+					zip([plateId] * numWindows, [wellIndex] * numWindows, windows, doublingMatrix[wellIndex].tolist()))
+		
+		return plateId
+
+
+	#Returns (name, windowSize, numWells, numWindows, added) for every plate, in the order they were added
+	def getPlates(self):
+		return self.connection.execute("SELECT name, windowSize, numWells, numWindows, added FROM plates ORDER BY id").fetchall()
+
+
+	#Builds the WHERE clause and its parameters for the strain name, dilution and plate name that are not None
+	def makeConditions(self, strainName, dilution, plateName):
+		conditions = []
+		parameters = []
+		for column, value in (("wells.strain", strainName), ("wells.dilution", dilution), ("plates.name", plateName)):
+			if value is not None:
+				conditions.append(column + " = ?")
+				parameters.append(dilutionKey(value) if column == "wells.dilution" else value)
+		return (" WHERE " + " AND ".join(conditions) if conditions else ""), parameters
+
+
+	#Returns (plate name, label, strain, dilution, startTimepoint, base, minDoublingTime, maxGrowthRate, bestWindow,
+	#lag, thresholdHrs) for every well with the given strain name, dilution and plate name (any that are None match everything)
+	def getWells(self, strainName = None, dilution = None, plateName = None):
+		where, parameters = self.makeConditions(strainName, dilution, plateName)
+		return self.connection.execute("SELECT plates.name, label, strain, dilution, startTimepoint, base, minDoublingTime, "
+			"maxGrowthRate, bestWindow, lag, thresholdHrs FROM wells JOIN plates ON plates.id = wells.plateId" + where +
+			" ORDER BY plates.id, wells.wellIndex", parameters).fetchall()
+
+
+	#Returns (plate name, label, window, startHrs, endHrs, doublingTime) for every window of every well with the given
+	#strain name, dilution and plate name (any that are None match everything), only the window window if it is given
+	def getDoublingTimes(self, strainName = None, dilution = None, plateName = None, window = None):
+		where, parameters = self.makeConditions(strainName, dilution, plateName)
+		if window is not None:
+			where += (" AND" if where else " WHERE") + " doublingTimes.window = ?"
+			parameters.append(window)
+		return self.connection.execute("SELECT plates.name, wells.label, doublingTimes.window, windows.startHrs, windows.endHrs, doublingTime "
+			"FROM wells JOIN plates ON plates.id = wells.plateId "
+			"JOIN doublingTimes ON doublingTimes.plateId = wells.plateId AND doublingTimes.wellIndex = wells.wellIndex "
+			"JOIN windows ON windows.plateId = doublingTimes.plateId AND windows.window = doublingTimes.window" + where +
+			" ORDER BY plates.id, wells.wellIndex, doublingTimes.window", parameters).fetchall()
+
+
+
+#######################################################################################################################################
+#Batch processing of many plates from the command line
+#######################################################################################################################################
+
+#File name endings of the files that go with an export <name>.txt:
+#<name>_labels.txt, the well labels (unless one label file is given for all plates)
+#<name>_starts.txt, the starting timepoints (found automatically if the file does not exist)
+#<name>_doubling.txt, the doubling times written by the analysis
+#<name>_report.json, the time taken by each stage of the analysis (see Instrumentation)
+#<name>_overview.png (or .pdf), the figure of the whole plate (see Analyzer.saveOverview())
+#<name>_wells.txt, the summary of each well (see Analyzer.findWellSummaries())
+#<name>_replicates.txt and <name>_replicate_curves.txt, the statistics of each group of replicates (see Analyzer.findReplicateStatistics())
+LABEL_FILE_SUFFIX = "_labels.txt"
+START_FILE_SUFFIX = "_starts.txt"
+DOUBLING_FILE_SUFFIX = "_doubling.txt"
+REPORT_FILE_SUFFIX = "_report.json"
+OVERVIEW_FILE_SUFFIX = "_overview"
+WELL_SUMMARY_FILE_SUFFIX = "_wells.txt"
+REPLICATE_FILE_SUFFIX = "_replicates.txt"
+REPLICATE_CURVE_FILE_SUFFIX = "_replicate_curves.txt"
+
+
+#Runs the whole analysis on one plate without any user input and writes the doubling times
+#to outputFileName. Returns the number of wells and the number of windows per well.
+#If a cache directory is given, the plate, the bases and the doubling times are taken from the
+#PlateCache there whenever the files and parameters they come from are unchanged.
+#With saveBinary = True the results are also saved with saveToBinary(), next to outputFileName
+#with the extension .npz. If reportFileName is given, the Instrumentation report of the analysis
+#is written to it, with a profile of each stage if profile = True.
+#If memmapDirectory is given, the plate is kept on disk as float32 in a directory of memmapDirectory
+#named after the export and a digest of its full path, so that exports with the same name in different
+#directories do not share it, and analyzed a chunk of wells at a time (see openMemmapAnalyzer()).
+#baseEstimator is passed on to Analyzer.findBase(). If fitModel is given, that growth model is fitted
+#to every well and the results are saved with the doubling times (see Analyzer.findGrowthParameters()).
+#If overviewFileName is given, the figure of the plate is saved to it (see Analyzer.saveOverview()).
+#If blockName is given, the export is a whole TECAN export and that block of it is analyzed (see readPlateBlocks())
+#If wellSummaryFileName is given, the summary of each well is saved to it, with the threshold and minRSquared
+#passed on to Analyzer.findWellSummaries()
+#If replicateFileName is given, the statistics of each group of replicates are saved to it and their curves to
+#replicateCurveFileName, with numSamples bootstrap resamples spread over numWorkers processes
+#(see Analyzer.findReplicateStatistics())
+#If storeFileName is given, the results are also added to the SQLite database there (see ResultsStore), as the
+#plate named after the export (and the block, if there is one)
+#If smoothMethod is given, the measurements less the base are smoothed with it over smoothWidth timepoints
+#before the doubling times are found (see Analyzer.setSmoothing())
+def analyzePlate(odFileName, labelFileName, startFileName, outputFileName, windowSize, minDrop = DROP_MIN_MAGNITUDE,
+		cacheDirectory = None, cacheSize = PLATE_CACHE_SIZE, saveBinary = False, reportFileName = None, profile = False,
+		memmapDirectory = None, baseEstimator = "min", fitModel = None, overviewFileName = None, blockName = None,
+		wellSummaryFileName = None, threshold = SUMMARY_OD_THRESHOLD, minRSquared = BEST_WINDOW_MIN_R_SQUARED,
+		replicateFileName = None, replicateCurveFileName = None, numSamples = BOOTSTRAP_SAMPLES, numWorkers = 1, storeFileName = None,
+		smoothMethod = None, smoothWidth = None):
+	instrumentation = Instrumentation(profile)
+	if memmapDirectory is not None:
+		pathDigest = hashlib.sha1(os.path.realpath(odFileName)).hexdigest()[:12]
+		plateDirectory = os.path.join(memmapDirectory, os.path.splitext(os.path.basename(odFileName))[0] + "_" + pathDigest)
+		a = openMemmapAnalyzer(odFileName, labelFileName, plateDirectory, instrumentation = instrumentation)
+		a.loadStartTimepoints(startFileName, False, minDrop)
+		a.findBase(baseEstimator)
+		a.setSmoothing(smoothMethod, smoothWidth)
+		a.findDoublingTimes(windowSize)
+	elif cacheDirectory is None:
+		plate = None
+		if blockName is not None:
+			plate = readPlateBlock(odFileName, labelFileName, blockName)
+		a = Analyzer(odFileName, labelFileName, plate, instrumentation)
+		a.loadStartTimepoints(startFileName, False, minDrop)
+		a.findBase(baseEstimator)
+		a.setSmoothing(smoothMethod, smoothWidth)
+		a.findDoublingTimes(windowSize)
+	else:
+		cache = PlateCache(cacheDirectory, cacheSize)
+		a, plateKey = cache.loadAnalyzer(odFileName, labelFileName, instrumentation, blockName)
+		a.loadStartTimepoints(startFileName, False, minDrop)
+		basesKey = cache.findBase(a, plateKey, baseEstimator)
+		a.setSmoothing(smoothMethod, smoothWidth)
+		cache.findDoublingTimes(a, basesKey, windowSize)
+
+	if fitModel is not None:
+		a.findGrowthParameters(fitModel)
+	if wellSummaryFileName is not None or replicateFileName is not None:
+		a.findWellSummaries(windowSize, threshold, minRSquared)
+	if wellSummaryFileName is not None:
+		a.saveWellSummaries(wellSummaryFileName)
+	if replicateFileName is not None:
+		a.findReplicateStatistics(numSamples, numWorkers = numWorkers)
+		a.saveReplicateStatistics(replicateFileName)
+		a.saveReplicateCurves(replicateCurveFileName, windowSize)
+	a.saveToFile(outputFileName, windowSize)
+	if saveBinary:
+		a.saveToBinary(os.path.splitext(outputFileName)[0] + ".npz", windowSize)
+	if overviewFileName is not None:
+		a.saveOverview(overviewFileName, windowSize, os.path.basename(odFileName))
+	if storeFileName is not None:
+		plateName = os.path.splitext(os.path.basename(odFileName))[0]
+		if blockName is not None:
+			plateName += ":" + blockName
+		a.saveToStore(storeFileName, plateName, windowSize)
+	if reportFileName is not None:
+		instrumentation.saveReport(reportFileName)
+
+	return a.plate.getNumWells(), max(a.plate.getNumTimepoints() - windowSize, 0)
+
+
+#Runs analyzePlate() for one plate of a batch. Any error is caught and returned so that
+#one bad plate does not stop the others. job is a tuple of the arguments of analyzePlate().
+#Returns (export file name, error message or None, number of wells, number of windows, seconds taken)
+def analyzePlateJob(job):
+	startTime = time.time()
+	try:
+		numWells, numWindows = analyzePlate(*job)
+		return job[0], None, numWells, numWindows, time.time() - startTime
+	except Exception:
+		return job[0], traceback.format_exc().strip(), 0, 0, time.time() - startTime
+
+
+#Returns why the file fileName is not an export (a message), or None if it looks like one: it must have a
+#'Time' row of numbers and rows of wells. Only the names of the rows are looked at, and the numbers of the
+#'Time' rows, so this is much quicker than reading the export. It is meant to pass over the other text
+#files in a directory of exports, i.e. a label file given with -l
+def findExportProblem(fileName):
+	try:
+		f = open(fileName)
+		try:
+			hasTimeRow = False
+			hasWellRows = False
+			for line in f:
+				name, sep, rest = line.partition("\t")
+				name = name.strip()
+				if name.startswith("Time") and not hasTimeRow:
+					hasTimeRow = _isNumberRow([name] + [field.strip() for field in rest.split("\t")])
+				elif WELL_LABEL_PATTERN.match(name):
+					hasWellRows = True
+				if hasTimeRow and hasWellRows:
+					return None
+		finally:
+			f.close()
+	except IOError as e:
+		return str(e)
+
+	if not hasTimeRow:
+		return "no 'Time [s]' row"
+	return "no rows of wells"
+
+
+#Finds the exports named by inputs, a list of directories (every .txt file in it that is not a
+#label, start, doubling time, well summary or replicate file) and file names or glob patterns. The files in
+#excluded (i.e. the batch summary and the label file given with -l) are left out. Returns a sorted list of
+#the export file names
+def findExports(inputs, excluded = ()):
+	excludedPaths = set([os.path.abspath(fileName) for fileName in excluded])
+	exports = set()
+	for currInput in inputs:
+		if os.path.isdir(currInput):
+			currFiles = glob.glob(os.path.join(currInput, "*.txt"))
+		else:
+			currFiles = glob.glob(currInput)
+
+		for currFile in currFiles:
+			if not currFile.endswith((LABEL_FILE_SUFFIX, START_FILE_SUFFIX, DOUBLING_FILE_SUFFIX, WELL_SUMMARY_FILE_SUFFIX,
+					REPLICATE_FILE_SUFFIX, REPLICATE_CURVE_FILE_SUFFIX)) and os.path.abspath(currFile) not in excludedPaths:
+				exports.add(currFile)
+
+	return sorted(exports)
+
+
+#Builds the analyzePlate() arguments for each export. The label file is labelFileName if it is
+#given, otherwise <name>_labels.txt next to the export. Results go to outputDirectory, or next
+#to the export if it is None. With saveReport = True a report of each plate is written next to
+#its results as <name>_report.json, and with an overviewFormat ('png' or 'pdf') the figure of each plate
+#as <name>_overview.png or .pdf. With saveWellSummaries = True the summary of each well is written
+#as <name>_wells.txt, and with saveReplicates = True the statistics of the replicates as <name>_replicates.txt
+#and <name>_replicate_curves.txt, their bootstrap spread over numWorkers processes. If storeFileName is
+#given, every plate is also added to the SQLite database there. smoothMethod and smoothWidth are passed on to
+#analyzePlate(). The starting timepoints are read from <name>_starts.txt next to the export if there is one,
+#and otherwise found and saved as <name>_starts.txt next to the results
+def makePlateJobs(exports, labelFileName, outputDirectory, windowSize, minDrop, cacheDirectory = None, cacheSize = PLATE_CACHE_SIZE,
+		saveBinary = False, saveReport = False, profile = False, memmapDirectory = None, baseEstimator = "min",
+		fitModel = None, overviewFormat = None, blockName = None, saveWellSummaries = False, threshold = SUMMARY_OD_THRESHOLD,
+		minRSquared = BEST_WINDOW_MIN_R_SQUARED, saveReplicates = False, numSamples = BOOTSTRAP_SAMPLES, numWorkers = 1,
+		storeFileName = None, smoothMethod = None, smoothWidth = None):
+	jobs = []
+	for currExport in exports:
+		currStem = os.path.splitext(currExport)[0]
+		currLabels = labelFileName or (currStem + LABEL_FILE_SUFFIX)
+
+		currOutput = currStem + DOUBLING_FILE_SUFFIX
+		if outputDirectory is not None:
+			currOutput = os.path.join(outputDirectory, os.path.basename(currOutput))
+
+		currReport = None
+		if saveReport:
+			currReport = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + REPORT_FILE_SUFFIX
+
+		currOverview = None
+		if overviewFormat is not None:
+			currOverview = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + OVERVIEW_FILE_SUFFIX + "." + overviewFormat
+
+		currWellSummary = None
+		if saveWellSummaries:
+			currWellSummary = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + WELL_SUMMARY_FILE_SUFFIX
+
+		currReplicates = None
+		currReplicateCurves = None
+		if saveReplicates:
+			currReplicates = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + REPLICATE_FILE_SUFFIX
+			currReplicateCurves = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + REPLICATE_CURVE_FILE_SUFFIX
+
+		#The starting timepoints are read from next to the export if they are there, otherwise they are
+		#found and saved next to the results, so nothing is written into the input directories when -o is given
+		currStarts = currStem + START_FILE_SUFFIX
+		if not os.path.exists(currStarts):
+			currStarts = currOutput[:-len(DOUBLING_FILE_SUFFIX)] + START_FILE_SUFFIX
+
+		jobs.append((currExport, currLabels, currStarts, currOutput, windowSize, minDrop, cacheDirectory, cacheSize, saveBinary,
+			currReport, profile, memmapDirectory, baseEstimator, fitModel, currOverview, blockName, currWellSummary, threshold, minRSquared,
+			currReplicates, currReplicateCurves, numSamples, numWorkers, storeFileName,
+			smoothMethod, smoothWidth))
+	return jobs
+
+
+#Analyzes all of the plates in jobs (see makePlateJobs()) across a pool of numWorkers processes
+#and returns the results of analyzePlateJob() in the order of jobs. With one worker the plates
+#are analyzed in this process
+def analyzePlates(jobs, numWorkers):
+	if numWorkers <= 1 or len(jobs) <= 1:
+		return [analyzePlateJob(job) for job in jobs]
+
+	pool = multiprocessing.Pool(min(numWorkers, len(jobs)))
+	try:
+		results = pool.map(analyzePlateJob, jobs, 1)
+	finally:
+		pool.close()
+		pool.join()
+	return results
+
+
+#Follows one export that is still being written (see StreamingAnalyzer), rewriting the doubling
+#time file whenever there are new windows. job is a tuple of the arguments of analyzePlate()
+def followPlate(job, interval, idleTimeout = None):
+	odFileName, labelFileName, startFileName, outputFileName, windowSize, minDrop = job[:6]
+	a = StreamingAnalyzer(odFileName, labelFileName, windowSize, startFileName, minDrop)
+
+	def saveNewWindows(firstWindow, newDoublings):
+		a.saveToFile(outputFileName, windowSize)
+		print "Windows", firstWindow, "to", firstWindow + newDoublings.shape[1] - 1, "written to", outputFileName
+
+	a.follow(saveNewWindows, interval, idleTimeout)
+
+
+#How often an IngestDaemon looks for new exports, how long an export must stay the same before it is
+#analyzed (in seconds), and how many exports can wait for a worker before it stops looking for more
+WATCH_INTERVAL = 2.0
+WATCH_SETTLE_SECONDS = 10.0
+WATCH_QUEUE_SIZE = 16
+
+
+#Makes a worker process of an IngestDaemon leave Ctrl-C to the daemon, which finishes the plates already queued
+def _ignoreInterrupts():
+	signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class IngestDaemon:
+
+	"""An IngestDaemon watches directories for exports that plate readers write into them and analyzes
+	each new or changed export with analyzePlateJob() in a pool of numWorkers processes, so the results
+	are written just as by a batch. makeJob(export file name) returns the job of an export (see makePlateJobs()).
+
+	A thread looks through the directories every interval seconds (see findExports()). An export is only
+	queued once its label file is there and neither of them has changed for settleSeconds, so files that are still being
+	written are left alone, and again whenever either of them changes later. At most numWorkers exports
+	are analyzed at once, and at most queueSize wait for a worker. While the queue is full the directories
+	are not looked through, so a burst of exports is taken in as the workers get to it.
+
+	Each finished plate is printed and added to the batch summary in summaryFileName, if it is given. The files
+	in excluded are passed over, and so are files that do not look like exports (see findExportProblem()),
+	with a warning, until they change.
+	run() watches until it is interrupted, or until no export has changed, been queued or been analyzed for idleTimeout seconds."""
+
+	def __init__(self, directories, makeJob, numWorkers = 1, interval = WATCH_INTERVAL, settleSeconds = WATCH_SETTLE_SECONDS,
+			queueSize = WATCH_QUEUE_SIZE, summaryFileName = None, excluded = ()):
+		self.directories = directories
+		self.excluded = list(excluded) + ([summaryFileName] if summaryFileName is not None else [])
+		self.makeJob = makeJob
+		self.numWorkers = max(numWorkers, 1)
+		self.interval = interval
+		self.settleSeconds = settleSeconds
+		self.summaryFileName = summaryFileName
+
+		self.queue = Queue.Queue(queueSize)
+		self.freeWorkers = threading.Semaphore(self.numWorkers)
+		self.stopping = threading.Event()
+		self.lock = threading.Lock()
+		self.seen = {} #Export -> (signature, time it was first seen with it)
+		self.queued = {} #Export -> signature when it was last queued
+		self.results = [] #The results of analyzePlateJob(), in the order they finished
+		self.running = 0 #The number of exports queued or being analyzed
+		self.lastActivity = time.time()
+
+
+	#Returns the job of the export and a signature of the export and its label file, which changes
+	#whenever either of them does. Raises OSError if either of them does not exist
+	def getJobSignature(self, export):
+		job = self.makeJob(export)
+		return job, fileSignature(job[0]) + "|" + fileSignature(job[1])
+
+
+	#Looks through the directories once and returns (job, signature) for every export that is new or has
+	#changed since it was last queued, and has stayed the same for settleSeconds. Exports whose label
+	#file is not there yet are left until it is
+	def findSettledExports(self):
+		now = time.time()
+		settled = []
+		for export in findExports(self.directories, self.excluded):
+			try:
+				job, signature = self.getJobSignature(export)
+			except OSError:
+				continue
+			if self.queued.get(export) == signature:
+				continue
+
+			seen = self.seen.get(export)
+			if seen is None or seen[0] != signature:
+				self.seen[export] = (signature, now)
+				with self.lock:
+					self.lastActivity = now
+			elif now - seen[1] >= self.settleSeconds:
+				problem = findExportProblem(export)
+				if problem is not None:
+					sys.stderr.write("Skipping " + export + ", it is not an export: " + problem + "\n")
+					self.queued[export] = signature
+					continue
+				settled.append((job, signature))
+		return settled
+
+
+	#Looks for settled exports and queues them until stop() is called. Waits while the queue is full
+	def watch(self):
+		while not self.stopping.is_set():
+			for job, signature in self.findSettledExports():
+				with self.lock:
+					self.running += 1
+					self.lastActivity = time.time()
+				self.queued[job[0]] = signature
+
+				while not self.stopping.is_set():
+					try:
+						self.queue.put(job, True, self.interval)
+						print "Queued", job[0]
+						break
+					except Queue.Full:
+						pass
+				if self.stopping.is_set():
+					with self.lock:
+						self.running -= 1
+					break
+
+			self.stopping.wait(self.interval)
+
+
+	#Hands the queued jobs to the pool as workers become free, until it takes None from the queue
+	def dispatch(self, pool):
+		while True:
+			job = self.queue.get()
+			if job is None:
+				return
+			self.freeWorkers.acquire()
+			pool.apply_async(analyzePlateJob, (job,), callback = self.finishJob)
+
+
+	#Called with the result of analyzePlateJob() when a plate is done
+	def finishJob(self, result):
+		plateName, error, numWells, numWindows, seconds = result
+		with self.lock:
+			self.results.append(result)
+			self.running -= 1
+			self.lastActivity = time.time()
+			if error is None:
+				print "Analyzed", plateName, "(%d wells, %d windows) in %.1f seconds" % (numWells, numWindows, seconds)
+			else:
+				sys.stderr.write("Failed to analyze " + plateName + "\n" + error + "\n")
+			if self.summaryFileName is not None:
+				saveBatchSummary(self.summaryFileName, self.results)
+		self.freeWorkers.release()
+
+
+	#Stops looking for new exports. The exports already queued are still analyzed before run() returns
+	def stop(self):
+		self.stopping.set()
+
+
+	#Watches the directories and analyzes the exports until stop() is called, the user interrupts it
+	#(Ctrl-C) or, if idleTimeout is given, no export has changed, been queued or been analyzed for idleTimeout seconds.
+	#Returns the results of every plate analyzed, as analyzePlates() does
+	def run(self, idleTimeout = None):
+		pool = multiprocessing.Pool(self.numWorkers, _ignoreInterrupts)
+		watcher = threading.Thread(target = self.watch)
+		dispatcher = threading.Thread(target = self.dispatch, args = (pool,))
+		for thread in (watcher, dispatcher):
+			thread.daemon = True
+			thread.start()
+
+		try:
+			while not self.stopping.is_set():
+				time.sleep(min(self.interval, 1.0))
+				with self.lock:
+					idle = idleTimeout is not None and self.running == 0 and time.time() - self.lastActivity >= idleTimeout
+				if idle:
+					self.stop()
+		except KeyboardInterrupt:
+			self.stop()
+
+		watcher.join()
+		self.queue.put(None)
+		dispatcher.join()
+		pool.close()
+		pool.join()
+		return self.results
+
+
+#Writes one line per plate to the tab delimited file fileName:
+#Plate		Status		Wells		Windows		Seconds		Error
+def saveBatchSummary(fileName, results):
+	f = open(fileName, "w")
+	f.write("Plate\tStatus\tWells\tWindows\tSeconds\tError\n")
+	for plateName, error, numWells, numWindows, seconds in results:
+		status = "ok" if error is None else "failed"
+		message = "" if error is None else error.splitlines()[-1]
+		f.write("%s\t%s\t%d\t%d\t%.3f\t%s\n" % (plateName, status, numWells, numWindows, seconds, message))
+	f.close()
+
+
+#The command line entry point. Run with -h for the options. Returns 0 if every plate was
+#analyzed and 1 otherwise
+def main(argv = None):
+	parser = argparse.ArgumentParser(description = "Calculate doubling times for TECAN OD600 exports. "
+		"For an export <name>.txt the well labels are read from <name>" + LABEL_FILE_SUFFIX + " and the starting timepoints from "
+		"<name>" + START_FILE_SUFFIX + " (found automatically if it does not exist). "
+		"The doubling times are written to <name>" + DOUBLING_FILE_SUFFIX + ".")
+	parser.add_argument("inputs", nargs = "+", help = "export files, glob patterns or directories of exports")
+	parser.add_argument("-l", "--labels", help = "one well label file for every plate")
+	parser.add_argument("-o", "--output-dir", help = "directory for the results (default: next to each export)")
+	parser.add_argument("-w", "--window", type = int, default = 40, help = "window size for the doubling times (default: %(default)s)")
+	parser.add_argument("-j", "--workers", type = int, default = multiprocessing.cpu_count(), help = "number of worker processes (default: %(default)s)")
+	parser.add_argument("--min-drop", type = float, default = DROP_MIN_MAGNITUDE, help = "smallest OD drop taken as the artifact (default: %(default)s)")
+	parser.add_argument("--base", default = "min", choices = BASE_ESTIMATORS, help = "how the base OD of each well is found from the "
+		+ str(BASE_NUM_POINTS) + " measurements after its starting timepoint (default: %(default)s)")
+	parser.add_argument("--smooth", choices = SMOOTHING_METHODS, help = "smooth the measurements less the base of every well over time "
+		"before the log transform, with a Savitzky-Golay filter, a moving median or an exponential moving average")
+	parser.add_argument("--smooth-width", type = int, default = 5, metavar = "TIMEPOINTS", help = "width of the --smooth window, odd for savgol and median (default: %(default)s)")
+	parser.add_argument("--fit", choices = GROWTH_MODELS, help = "also fit this growth model to every well and save its lag, maximum rate and capacity with the doubling times")
+	parser.add_argument("--overview", choices = ("png", "pdf"), help = "also draw the curves of every well of each plate, with the starting timepoints and "
+		"the fastest doubling window marked, to <name>" + OVERVIEW_FILE_SUFFIX + ".png or .pdf")
+	parser.add_argument("--block", metavar = "NAME", help = "the exports are whole TECAN exports with several blocks of measurements (i.e. OD600 and GFP), analyze the block NAME")
+	parser.add_argument("--wells", action = "store_true", help = "also save the shortest doubling time, its window, the lag and the time to reach --threshold "
+		"of every well to <name>" + WELL_SUMMARY_FILE_SUFFIX)
+	parser.add_argument("--threshold", type = float, default = SUMMARY_OD_THRESHOLD, help = "OD above the base for the time to threshold of --wells (default: %(default)s)")
+	parser.add_argument("--min-r-squared", type = float, default = BEST_WINDOW_MIN_R_SQUARED, help = "smallest R squared of the window of --wells (default: %(default)s)")
+	parser.add_argument("--replicates", action = "store_true", help = "also save the mean and median doubling times and well summaries of each "
+		"(strain, dilution), with bootstrap confidence intervals, to <name>" + REPLICATE_FILE_SUFFIX + " and <name>" + REPLICATE_CURVE_FILE_SUFFIX)
+	parser.add_argument("--bootstrap", type = int, default = BOOTSTRAP_SAMPLES, metavar = "SAMPLES", help = "number of bootstrap resamples of --replicates (default: %(default)s)")
+	parser.add_argument("--store", metavar = "DATABASE", help = "also add the results of every plate to the SQLite database DATABASE, "
+		"replacing earlier results of plates with the same name")
+	parser.add_argument("--summary", help = "file for the summary of all plates (default: summary.txt in the output directory)")
+	parser.add_argument("--binary", action = "store_true", help = "also save the results of each plate as <name>" + os.path.splitext(DOUBLING_FILE_SUFFIX)[0] + ".npz")
+	parser.add_argument("--cache", metavar = "DIRECTORY", help = "keep parsed plates and results in DIRECTORY and reuse them when nothing they depend on has changed")
+	parser.add_argument("--cache-size", type = float, default = PLATE_CACHE_SIZE / 1e6, metavar = "MB", help = "largest size of the cache, the least recently used entries are removed beyond it (default: %(default)s)")
+	parser.add_argument("--report", action = "store_true", help = "also save the time taken by each stage and the amount of work done for each plate as <name>" + REPORT_FILE_SUFFIX)
+	parser.add_argument("--profile", action = "store_true", help = "also profile each stage and list the functions that took the most time in the report (implies --report)")
+	parser.add_argument("--memmap", metavar = "DIRECTORY", help = "convert each export once into a float32 file in DIRECTORY and analyze it from there a few wells at a time, "
+		"so that plates too large for memory can be analyzed")
+	parser.add_argument("--follow", type = float, metavar = "SECONDS", help = "follow one export that is still being written, checking it every SECONDS")
+	parser.add_argument("--watch", type = float, metavar = "SECONDS", help = "keep watching the input directories, checking them every SECONDS, "
+		"and analyze every export that is new or has changed once it has stopped changing")
+	parser.add_argument("--settle", type = float, default = WATCH_SETTLE_SECONDS, metavar = "SECONDS", help = "with --watch, how long an export and "
+		"its labels must stay the same before it is analyzed (default: %(default)s)")
+	parser.add_argument("--queue-size", type = int, default = WATCH_QUEUE_SIZE, help = "with --watch, the most exports waiting for a worker "
+		"before the directories are no longer looked through (default: %(default)s)")
+	parser.add_argument("--idle-timeout", type = float, metavar = "SECONDS", help = "with --follow, stop once the export has not changed for SECONDS; "
+		"with --watch, once no export has changed or been analyzed for SECONDS")
+	args = parser.parse_args(argv)
+	setHeadless()
+
+	summaryFileName = args.summary or os.path.join(args.output_dir or ".", "summary.txt")
+	excluded = [summaryFileName] + ([args.labels] if args.labels is not None else [])
+	if args.watch is not None:
+		if args.follow is not None:
+			parser.error("--watch and --follow can not be used together")
+		for currInput in args.inputs:
+			if not os.path.isdir(currInput):
+				parser.error("--watch needs directories, " + currInput + " is not one")
+		exports = []
+	else:
+		exports = []
+		for export in findExports(args.inputs, excluded):
+			problem = findExportProblem(export)
+			if problem is not None:
+				sys.stderr.write("Skipping " + export + ", it is not an export: " + problem + "\n")
+			else:
+				exports.append(export)
+		if not exports:
+			parser.error("no exports found")
+
+	if args.output_dir is not None and not os.path.isdir(args.output_dir):
+		os.makedirs(args.output_dir)
+
+	if args.cache is not None and args.memmap is not None:
+		parser.error("--cache and --memmap can not be used together")
+	if args.block is not None and args.memmap is not None:
+		parser.error("--block and --memmap can not be used together")
+	if args.smooth is not None:
+		if args.follow is not None:
+			parser.error("--smooth and --follow can not be used together")
+		try:
+			smoothMeasurements(numpy.zeros((1, 0)), args.smooth, args.smooth_width)
+		except ValueError as e:
+			parser.error(str(e))
+
+	cacheSize = int(args.cache_size * 1e6)
+	if args.cache is not None:
+		PlateCache(args.cache, cacheSize).evict()
+	def makeJobs(exports, numBootstrapWorkers):
+		return makePlateJobs(exports, args.labels, args.output_dir, args.window, args.min_drop, args.cache, cacheSize, args.binary,
+			args.report or args.profile, args.profile, args.memmap, args.base, args.fit, args.overview, args.block,
+			args.wells, args.threshold, args.min_r_squared, args.replicates, args.bootstrap, numBootstrapWorkers,
+			args.store, args.smooth, args.smooth_width)
+
+	if args.watch is not None:
+		daemon = IngestDaemon(args.inputs, lambda export: makeJobs([export], 1)[0], args.workers, args.watch, args.settle,
+			args.queue_size, summaryFileName, [args.labels] if args.labels is not None else [])
+		print "Watching", ", ".join(args.inputs), "for exports, press Ctrl-C to stop"
+		results = daemon.run(args.idle_timeout)
+		return 1 if [result for result in results if result[1] is not None] else 0
+
+	jobs = makeJobs(exports, args.workers if len(exports) == 1 else 1)
+
+	if args.follow is not None:
+		if len(jobs) != 1:
+			parser.error("--follow needs exactly one export, found %d" % len(jobs))
+		followPlate(jobs[0], args.follow, args.idle_timeout)
+		return 0
+
+	results = analyzePlates(jobs, args.workers)
+
+	saveBatchSummary(summaryFileName, results)
+
+	failures = [result for result in results if result[1] is not None]
+	for plateName, error, numWells, numWindows, seconds in failures:
+		sys.stderr.write("Failed to analyze " + plateName + "\n" + error + "\n")
+	print len(results) - len(failures), "of", len(results), "plates analyzed, summary written to", summaryFileName
+
+	return 1 if failures else 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
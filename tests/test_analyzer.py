@@ -0,0 +1,332 @@
+#Tests of TECANWellAnalyzer, run from the top directory with
+#	python -m unittest discover tests
+#The expected doubling times of the EXAMPLE plate were written by the first version of the script
+#(run() on EXAMPLE with a window size of 40, one scipy.stats.linregress per window) and are kept in
+#data/EXAMPLE_Doubling_time_40.txt.gz. Everything else is checked against another way of getting
+#the same results: a run on the whole export, a plate kept in memory, or the values that were stored.
+
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy
+
+TEST_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TEST_DIRECTORY))
+import TECANWellAnalyzer
+
+EXAMPLE_DIRECTORY = os.path.join(os.path.dirname(TEST_DIRECTORY), "EXAMPLE")
+OD_FILE_NAME = os.path.join(EXAMPLE_DIRECTORY, "OD600_Values.txt")
+LABEL_FILE_NAME = os.path.join(EXAMPLE_DIRECTORY, "well-labels_7-14-11.txt")
+START_FILE_NAME = os.path.join(EXAMPLE_DIRECTORY, "Starts_After_Drops.txt")
+BASELINE_FILE_NAME = os.path.join(TEST_DIRECTORY, "data", "EXAMPLE_Doubling_time_40.txt.gz")
+
+WINDOW_SIZE = 40
+
+#How far the doubling times may be from those of the first version, relative to them. The running sums
+#round differently from linregress, and the doubling times of nearly flat windows magnify that
+BASELINE_TOLERANCE = 1e-8
+
+#How far the slopes (doublings per hour) of a plate kept on disk as float32 may be from those of the same
+#plate kept in memory, see --memmap in the README
+MEMMAP_SLOPE_TOLERANCE = 1e-5
+
+
+#Returns an Analyzer of the EXAMPLE plate with its starting timepoints and bases
+def makeExampleAnalyzer():
+	a = TECANWellAnalyzer.Analyzer(OD_FILE_NAME, LABEL_FILE_NAME)
+	a.loadStartTimepoints(START_FILE_NAME, False)
+	a.findBase()
+	return a
+
+
+#Reads a doubling time file written by Analyzer.saveToFile() into its three heading lines and a
+#dictionary of the well label and (the fields before the doubling times, the doubling times as an array)
+def readDoublingFile(f):
+	lines = f.read().splitlines()
+	wells = {}
+	for line in lines[3:]:
+		fields = line.split("\t")
+		wells[fields[0]] = (fields[:5], numpy.array([float(field) for field in fields[5:] if field.strip()]))
+	return lines[:3], wells
+
+
+#Returns the times of the EXAMPLE export in seconds
+def readExampleTimes():
+	return TECANWellAnalyzer.readODExport(OD_FILE_NAME)[2]
+
+
+#Writes the first numTimepoints timepoints of the EXAMPLE export to fileName, as the TECAN would have
+#written it part of the way through the run
+def writePartialExport(fileName, numTimepoints):
+	f = open(OD_FILE_NAME)
+	lines = f.read().splitlines()
+	f.close()
+
+	out = open(fileName, "w")
+	for line in lines:
+		fields = line.split("\t")
+		out.write("\t".join(fields[:(numTimepoints + 1)]) + "\n")
+	out.close()
+
+
+#Takes the last measurement off the row on line lineNumber (from 1) of the export fileName, and adds one
+#to the row after it if lengthenNext is True
+def shortenRow(fileName, lineNumber, lengthenNext = True):
+	f = open(fileName)
+	lines = f.read().splitlines()
+	f.close()
+
+	lines[lineNumber - 1] = lines[lineNumber - 1].rstrip().rsplit("\t", 1)[0]
+	if lengthenNext:
+		lines[lineNumber] = lines[lineNumber].rstrip() + "\t0.5"
+	f = open(fileName, "w")
+	f.write("\n".join(lines) + "\n")
+	f.close()
+
+
+class AnalyzerTestCase(unittest.TestCase):
+
+	"""Makes a temporary directory for each test, and hides what the Analyzer prints while it runs"""
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.stdout = sys.stdout
+		sys.stdout = open(os.devnull, "w")
+
+	def tearDown(self):
+		sys.stdout.close()
+		sys.stdout = self.stdout
+		shutil.rmtree(self.directory)
+
+
+class DoublingTimesTest(AnalyzerTestCase):
+
+	def testMatchesFirstVersion(self):
+		a = makeExampleAnalyzer()
+		a.findDoublingTimes(WINDOW_SIZE)
+		fileName = os.path.join(self.directory, "Doubling_time.txt")
+		a.saveToFile(fileName, WINDOW_SIZE)
+
+		f = gzip.open(BASELINE_FILE_NAME)
+		expectedHeadings, expectedWells = readDoublingFile(f)
+		f.close()
+		f = open(fileName)
+		headings, wells = readDoublingFile(f)
+		f.close()
+
+		self.assertEqual(headings, expectedHeadings)
+		self.assertEqual(sorted(wells), sorted(expectedWells))
+		for label in expectedWells:
+			expectedFields, expectedDoublings = expectedWells[label]
+			fields, doublings = wells[label]
+			self.assertEqual(fields, expectedFields)
+			self.assertEqual(doublings.shape, expectedDoublings.shape)
+			numpy.testing.assert_allclose(doublings, expectedDoublings, rtol = BASELINE_TOLERANCE, err_msg = label)
+
+
+class StreamingTest(AnalyzerTestCase):
+
+	#Following the export as it grows must give exactly the doubling times of a run on the whole export
+	def testSameAsFullRun(self):
+		fileName = os.path.join(self.directory, "OD600_Values.txt")
+		numTimepoints = len(readExampleTimes())
+		writePartialExport(fileName, 150)
+		s = TECANWellAnalyzer.StreamingAnalyzer(fileName, LABEL_FILE_NAME, WINDOW_SIZE, START_FILE_NAME)
+		s.analyzeNewTimepoints()
+		for currNumTimepoints in range(170, numTimepoints, 23) + [numTimepoints]:
+			writePartialExport(fileName, currNumTimepoints)
+			s.update()
+
+		a = makeExampleAnalyzer()
+		doublings = a.findDoublingTimes(WINDOW_SIZE)
+		self.assertEqual(s.plate.getNumTimepoints(), numTimepoints)
+		for label in a.plate.labels:
+			numpy.testing.assert_array_equal(numpy.array(s.doublingTimes[label]), numpy.array(doublings[label]), err_msg = label)
+
+
+class MemmapTest(AnalyzerTestCase):
+
+	def testWithinTolerance(self):
+		m = TECANWellAnalyzer.openMemmapAnalyzer(OD_FILE_NAME, LABEL_FILE_NAME, os.path.join(self.directory, "plate"), 16)
+		m.loadStartTimepoints(START_FILE_NAME, False)
+		m.findBase()
+		m.findDoublingTimes(WINDOW_SIZE)
+		slopes = 1 / numpy.array(m.getDoublingMatrix())
+
+		a = makeExampleAnalyzer()
+		a.findDoublingTimes(WINDOW_SIZE)
+		expectedSlopes = 1 / a.getDoublingMatrix()
+
+		self.assertEqual(m.plate.labels, a.plate.labels)
+		numpy.testing.assert_array_equal(m.plate.startTimepoints, a.plate.startTimepoints)
+		numpy.testing.assert_allclose(slopes, expectedSlopes, rtol = 0, atol = MEMMAP_SLOPE_TOLERANCE)
+
+	#The plate is only converted again once the export changes
+	def testConvertedOnce(self):
+		directory = os.path.join(self.directory, "plate")
+		TECANWellAnalyzer.openMemmapAnalyzer(OD_FILE_NAME, LABEL_FILE_NAME, directory)
+		self.assertTrue(TECANWellAnalyzer.isMemmapCurrent(OD_FILE_NAME, LABEL_FILE_NAME, directory))
+
+		fileName = os.path.join(self.directory, "OD600_Values.txt")
+		writePartialExport(fileName, 100)
+		self.assertFalse(TECANWellAnalyzer.isMemmapCurrent(fileName, LABEL_FILE_NAME, directory))
+
+
+class ExportBlocksTest(AnalyzerTestCase):
+
+	HEADER = ["Application:\tTecan i-control", "Date:\t7/14/2011", "Time:\t5:30:19 PM", "Temperature:\t37 C", "",
+		"Start Time:\t7/14/2011 10:00", ""]
+
+	#Writes an export of the first numTimepoints timepoints of the EXAMPLE plate, as an OD600 block and a GFP
+	#block of twice the OD600 that is one timepoint shorter, after the header lines of a whole export
+	def writeExport(self, numTimepoints):
+		labels, measurements, timesSecs, temperatures = TECANWellAnalyzer.readODExport(OD_FILE_NAME)
+		lines = list(self.HEADER)
+		for name, factor, numColumns in (("OD600", 1, numTimepoints), ("Label: GFP", 2, numTimepoints - 1)):
+			lines.append(name)
+			lines.append("Cycle Nr.\t" + "\t".join(str(n + 1) for n in range(numColumns)))
+			lines.append("Time [s]\t" + "\t".join(repr(value) for value in timesSecs[:numColumns]))
+			lines.append("Temp. [C]\t" + "\t".join(repr(value) for value in temperatures[:numColumns]))
+			for label, row in zip(labels, measurements):
+				lines.append(label + "\t" + "\t".join(repr(value) for value in factor * row[:numColumns]))
+			lines.append("")
+
+		fileName = os.path.join(self.directory, "export.txt")
+		f = open(fileName, "w")
+		f.write("\n".join(lines) + "\n")
+		f.close()
+		return fileName, labels, measurements, timesSecs
+
+	def testBlocks(self):
+		fileName, labels, measurements, timesSecs = self.writeExport(30)
+		blocks = TECANWellAnalyzer.readExportBlocks(fileName)
+
+		self.assertEqual([block[0] for block in blocks], ["OD600", "GFP"])
+		for (name, blockLabels, blockMeasurements, blockTimesSecs, temperatures), factor, numColumns in zip(blocks, (1, 2), (30, 29)):
+			self.assertEqual(blockLabels, labels)
+			numpy.testing.assert_array_equal(blockTimesSecs, timesSecs[:numColumns])
+			numpy.testing.assert_array_equal(blockMeasurements, factor * measurements[:, :numColumns])
+			self.assertEqual(len(temperatures), numColumns)
+
+	def testPlates(self):
+		fileName, labels, measurements, timesSecs = self.writeExport(30)
+		plates = TECANWellAnalyzer.readPlateBlocks(fileName, LABEL_FILE_NAME)
+
+		self.assertEqual(plates.keys(), ["OD600", "GFP"])
+		for plate in plates.values():
+			self.assertEqual(plate.getNumTimepoints(), 29)
+			self.assertEqual(plate.labels, labels)
+		numpy.testing.assert_array_equal(plates["GFP"].measurements, 2 * plates["OD600"].measurements)
+
+	#A row one short next to a row one long has the right number of measurements in all, but must not be read
+	def testRaggedRows(self):
+		fileName, labels, measurements, timesSecs = self.writeExport(30)
+		lineNumber = len(self.HEADER) + 6
+		shortenRow(fileName, lineNumber)
+		try:
+			TECANWellAnalyzer.readExportBlocks(fileName)
+		except ValueError, e:
+			self.assertTrue(str(e).startswith("Line %d of" % lineNumber), str(e))
+		else:
+			self.fail("readExportBlocks() read an export with rows of different lengths")
+
+
+class ODExportTest(AnalyzerTestCase):
+
+	def testRaggedRows(self):
+		fileName = os.path.join(self.directory, "OD600_Values.txt")
+		shutil.copy(OD_FILE_NAME, fileName)
+		shortenRow(fileName, 8)
+		try:
+			TECANWellAnalyzer.readODExport(fileName)
+		except ValueError, e:
+			self.assertTrue(str(e).startswith("Line 8 of"), str(e))
+		else:
+			self.fail("readODExport() read an export with rows of different lengths")
+
+	#The rows of an export that is still being written are cut to the timepoints they all have
+	def testPartial(self):
+		fileName = os.path.join(self.directory, "OD600_Values.txt")
+		shutil.copy(OD_FILE_NAME, fileName)
+		shortenRow(fileName, 8, False)
+		labels, measurements, timesSecs, temperatures = TECANWellAnalyzer.readODExport(fileName, 10, True)
+		expectedMeasurements = TECANWellAnalyzer.readODExport(OD_FILE_NAME)[1]
+		numpy.testing.assert_array_equal(measurements, expectedMeasurements[:, 10:-1])
+		self.assertEqual(len(timesSecs), len(temperatures))
+
+
+class PlateCacheTest(AnalyzerTestCase):
+
+	def testRoundTrip(self):
+		cache = TECANWellAnalyzer.PlateCache(os.path.join(self.directory, "cache"))
+		results = []
+		for run in range(2):
+			a, plateKey = cache.loadAnalyzer(OD_FILE_NAME, LABEL_FILE_NAME)
+			a.loadStartTimepoints(START_FILE_NAME, False)
+			basesKey = cache.findBase(a, plateKey)
+			cache.findDoublingTimes(a, basesKey, WINDOW_SIZE)
+			results.append(a)
+
+		self.assertEqual(results[0].instrumentation.counters.get("cacheMisses"), 3)
+		self.assertEqual(results[1].instrumentation.counters.get("cacheHits"), 3)
+		self.assertEqual(results[1].instrumentation.counters.get("cacheMisses"), None)
+
+		expected = makeExampleAnalyzer()
+		expected.findDoublingTimes(WINDOW_SIZE)
+		for a in results:
+			self.assertEqual(a.plate.labels, expected.plate.labels)
+			self.assertEqual(a.plate.strainNames, expected.plate.strainNames)
+			self.assertEqual(a.plate.dilutions, expected.plate.dilutions)
+			numpy.testing.assert_array_equal(a.plate.measurements, expected.plate.measurements)
+			numpy.testing.assert_array_equal(a.plate.timesSecs, expected.plate.timesSecs)
+			numpy.testing.assert_array_equal(a.plate.bases, expected.plate.bases)
+			numpy.testing.assert_array_equal(a.getDoublingMatrix(), expected.getDoublingMatrix())
+
+	def testEntries(self):
+		cache = TECANWellAnalyzer.PlateCache(os.path.join(self.directory, "cache"))
+		key = cache.makeKey("test", numpy.arange(3))
+		self.assertEqual(cache.get(key), None)
+		cache.put(key, {"values": numpy.arange(3.0)})
+		numpy.testing.assert_array_equal(cache.get(key)["values"], numpy.arange(3.0))
+		self.assertNotEqual(cache.makeKey("test", numpy.arange(4)), key)
+
+
+class ResultsStoreTest(AnalyzerTestCase):
+
+	def testRoundTrip(self):
+		a = makeExampleAnalyzer()
+		a.findDoublingTimes(WINDOW_SIZE)
+		summaries = a.findWellSummaries(WINDOW_SIZE)
+		doublingMatrix = a.getDoublingMatrix()
+
+		store = TECANWellAnalyzer.ResultsStore(os.path.join(self.directory, "results.db"))
+		store.addPlate("example", a, WINDOW_SIZE)
+		store.addPlate("example", a, WINDOW_SIZE)
+		self.assertEqual([plate[:4] for plate in store.getPlates()], [("example", WINDOW_SIZE, 96, doublingMatrix.shape[1])])
+
+		wells = store.getWells(plateName = "example")
+		self.assertEqual([well[1] for well in wells], a.plate.labels)
+		self.assertEqual([well[2] for well in wells], a.plate.strainNames)
+		for well, base, minDoublingTime in zip(wells, a.plate.bases, summaries["minDoublingTimes"]):
+			self.assertEqual(well[5], base)
+			if numpy.isnan(minDoublingTime):
+				self.assertEqual(well[6], None)
+			else:
+				self.assertEqual(well[6], minDoublingTime)
+
+		rows = store.getDoublingTimes(plateName = "example")
+		stored = numpy.array([numpy.nan if row[5] is None else row[5] for row in rows]).reshape(doublingMatrix.shape)
+		numpy.testing.assert_array_equal(stored, doublingMatrix)
+
+		label, strainName, dilution = a.plate.labels[0], a.plate.strainNames[0], a.plate.dilutions[0]
+		self.assertTrue(label in [well[1] for well in store.getWells(strainName, dilution)])
+		self.assertEqual(len(store.getDoublingTimes(window = 0)), 96)
+		store.close()
+
+
+if __name__ == "__main__":
+	unittest.main()